@@ -1,20 +1,138 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g, has_request_context, \
+    Response, stream_with_context, make_response, before_render_template, template_rendered, send_from_directory, abort, \
+    send_file
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, text, func, DDL, select, case, tuple_, literal, table as sa_table, column as sa_column
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.http import is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor
+import click
+import gzip
+import hmac
+import io
+import mimetypes
 import os
 import ast
-from datetime import datetime, timedelta
-from functools import wraps
+import base64
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict, Counter
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
 import random
+import secrets
+import shutil
+import sys
+import traceback
 import time
 
+try:
+    import brotli  # isteğe bağlı: yoksa sadece gzip üretilir
+except ImportError:
+    brotli = None
+
+try:
+    import numpy as np  # isteğe bağlı: sadece öneri derlemesi (flask build-recommendations) için
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+try:
+    from PIL import Image, ImageOps  # isteğe bağlı: yoksa görsel proxy'si orijinali küçültmeden sunar
+except ImportError:
+    Image = ImageOps = None
+
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Bağlantı havuzu worker modeline göre: her thread en fazla bir bağlantı tutar
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))
+if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_POOL_SIZE'],
+        'pool_timeout': 10
+    }
+# Her SQLite bağlantısında uygulanır (WAL: okuyucular yazıcıları beklemez)
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,  # KiB cinsinden (~64 MB)
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY'
+}
 app.config['SECRET_KEY'] = 'omimas-secret-key-2024'
+app.config['CATALOG_API_URL'] = 'https://dummyjson.com/products'
+app.config['CATALOG_API_TIMEOUT'] = 10
+app.config['SQL_QUERY_COUNT_HEADER'] = False  # True: her yanıta X-SQL-Query-Count eklenir
+app.config['ORDER_EVENTS_POLL_SECONDS'] = 15  # diğer worker'lardaki değişiklikler için DB kontrol aralığı
+app.config['GUEST_CART_COOKIE'] = 'guest_cart_id'
+app.config['CART_RESERVATION_TTL'] = 15 * 60  # saniye; sepetteki ürünler bu süre boyunca ayrılır
+app.config['RESERVATION_SWEEP_INTERVAL'] = 30  # süresi dolan rezervasyonları stoğa iade aralığı
+app.config['GUEST_CART_TTL'] = 30 * 24 * 3600  # terk edilmiş misafir sepetleri 30 gün sonra silinir
+app.config['GUEST_CART_EVICT_INTERVAL'] = 3600  # süpürücünün terk edilmiş misafir sepetlerini silme aralığı
+app.config['PAYMENT_GATEWAY_URL'] = os.environ.get('PAYMENT_GATEWAY_URL')  # boş: ödeme simülasyonu
+app.config['PAYMENT_GATEWAY_TIMEOUT'] = 10
+app.config['JOB_WORKER_THREADS'] = 2
+app.config['JOB_POLL_INTERVAL'] = 1.0
+app.config['JOB_RETRY_BASE_SECONDS'] = 2  # 2, 4, 8, ... saniye
+app.config['JOB_LOCK_TIMEOUT'] = 300  # bu süreyi aşan 'running' işler yeniden kuyruğa alınır
+app.config['IDEMPOTENCY_KEY_TTL'] = 24 * 3600  # saniye; kayıtlı yanıtlar bu süre boyunca tekrar oynatılır
+app.config['IDEMPOTENCY_WAIT'] = 5  # aynı anahtarlı eşzamanlı istek ilk isteğin bitmesini en fazla bu kadar bekler
+app.config['IDEMPOTENCY_LOCK_TIMEOUT'] = 60  # bu süreyi aşan 'in_progress' anahtar (çöken istek) devralınır
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED') == '1'
+app.config['SLOW_REQUEST_PROFILE'] = False  # True: eşiği aşan isteklerin örneklenmiş yığınları diske yazılır
+app.config['SLOW_REQUEST_THRESHOLD'] = 0.5  # saniye
+app.config['PROFILE_SAMPLE_INTERVAL'] = 0.005
+app.config['PROFILE_DIR'] = os.path.join(app.instance_path, 'profiles')  # sadece uygulama kullanıcısı (0700)
+# werkzeug yöntem dizesi ('scrypt' gibi kısa yazım da olur); farklı parametreli hash'ler girişte yenilenir
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 0: istek thread'inde
+app.config['PASSWORD_HASH_MAX_PENDING'] = 8  # havuzda bekleyen/çalışan en fazla hash
+app.config['PASSWORD_HASH_WAIT'] = 5  # saniye; dolu kuyrukta bekleme süresi
+app.config['LOGIN_IP_RATE'] = (20, 0.2)  # (kova kapasitesi, saniyede eklenen token) IP başına
+app.config['LOGIN_USER_RATE'] = (5, 1 / 60)  # kullanıcı adı başına
+# Uygulamanın önündeki güvenilir ters proxy sayısı (nginx, yük dengeleyici); 0: istemciler doğrudan bağlanır.
+# Yalnızca bu kadar X-Forwarded-For hop'una güvenilir, istemcinin kendi eklediği değerler atlanır.
+app.config['PROXY_FIX_HOPS'] = int(os.environ.get('PROXY_FIX_HOPS', 0))
+app.config['ASSET_DIST_DIR'] = os.path.join(app.static_folder, 'dist')  # flask build-assets çıktısı
+app.config['ASSET_MAX_AGE'] = 365 * 24 * 3600
+app.config['IMAGE_CACHE_DIR'] = os.path.join(app.instance_path, 'image-cache')  # sadece uygulama kullanıcısı (0700)
+app.config['IMAGE_CACHE_MAX_BYTES'] = 512 * 1024 * 1024  # aşılınca en uzun süredir kullanılmayan dosyalar silinir
+app.config['IMAGE_WORKERS'] = 2  # küçültme/kodlama thread havuzu (Pillow bu sırada GIL'i bırakır)
+app.config['IMAGE_FETCH_TIMEOUT'] = 10
+app.config['IMAGE_MAX_SOURCE_BYTES'] = 20 * 1024 * 1024
+app.config['IMAGE_MAX_AGE'] = 365 * 24 * 3600
+app.config['RECOMMENDATION_TOP_K'] = 12
+# Benzerlik karışımı: birlikte satın alma, sepette birlikte bulunma, ad/açıklama TF-IDF
+app.config['RECOMMENDATION_WEIGHTS'] = {'orders': 0.6, 'carts': 0.15, 'text': 0.25}
+app.config['RECOMMENDATION_MAX_DF'] = 0.05  # ürünlerin %5'inden fazlasında geçen kelimeler atılır
+app.config['RECOMMENDATION_BLOCK_SIZE'] = 2048  # aynı anda skorlanan ürün satırı
+app.config['ANALYTICS_API_TOKEN'] = os.environ.get('ANALYTICS_API_TOKEN')  # boş: /api/analytics kapalı
+app.config['ANALYTICS_BATCH_SIZE'] = 5000
+app.config['ANALYTICS_CURSOR_LAG'] = 60  # saniye; geç commit edilen siparişler için imleç geriden başlar
+app.config['PAGE_CACHE_BACKEND'] = 'memory'  # 'memory', 'file' veya None (kapalı)
+app.config['PAGE_CACHE_TTL'] = 300
+app.config['PAGE_CACHE_MAX_ENTRIES'] = 1024
+app.config['PAGE_CACHE_DIR'] = os.path.join(app.instance_path, 'page-cache')  # sadece uygulama kullanıcısı (0700)
 db = SQLAlchemy(app)
 
+# Proxy arkasında request.remote_addr (IP başına giriş sınırı) proxy'nin değil istemcinin adresi olsun
+if app.config['PROXY_FIX_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_HOPS'], x_proto=app.config['PROXY_FIX_HOPS'])
+
 # Kullanıcı Modeli
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -28,25 +146,45 @@ class User(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 # Ürün Modeli
 class Product(db.Model):
+    # Kategori listeleri (category_id, sıralama sütunu, id) indeksinden keyset ile okunur
+    __table_args__ = (
+        db.Index('ix_product_category_price', 'category_id', 'price', 'id'),
+        db.Index('ix_product_category_created', 'category_id', 'created_at', 'id'),
+        db.Index('ix_product_category_rating', 'category_id', 'rating_avg', 'id'),
+        db.CheckConstraint('stock >= 0', name='ck_product_stock'),  # son savunma hattı: eksi stok yok
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
+    external_id = db.Column(db.Integer, unique=True)  # DummyJSON ürün id'si
+    content_hash = db.Column(db.String(40))
     name = db.Column(db.String(200), nullable=False)
     price = db.Column(db.Float, nullable=False)
     currency = db.Column(db.String(10), default='PLN')
     image_url = db.Column(db.String(500))
-    category = db.Column(db.String(100))
+    category = db.Column(db.String(100), index=True)  # slug (API ve şablonlar için korunur)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
     description = db.Column(db.Text)
-    images = db.Column(db.Text)
+    images = db.Column(db.JSON)  # URL listesi
+    rating_avg = db.Column(db.Float, nullable=False, default=0)  # ProductRating'in sıralama için kopyası
+    stock = db.Column(db.Integer, nullable=False, default=0)  # satılabilir (rezerve edilmemiş) adet
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def image_list(self):
+        return self.images or [self.image_url]
 
 # Sepet Modeli
 class Cart(db.Model):
+    __table_args__ = (db.Index('uq_cart_user_product', 'user_id', 'product_id', unique=True),)
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -55,6 +193,20 @@ class Cart(db.Model):
     
     product = db.relationship('Product', backref='cart_items')
 
+# Misafir Sepeti Modeli (sunucu tarafı, opak çerez id'si ile)
+class GuestCart(db.Model):
+    token = db.Column(db.String(64), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# Stok rezervasyonu: sepet satırı kadar stok süreli olarak ayrılır (owner: 'user:<id>' / 'guest:<token>')
+class StockReservation(db.Model):
+    owner = db.Column(db.String(80), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
 # Kategori Modeli
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -63,6 +215,8 @@ class Category(db.Model):
 
 # Yorum Modeli
 class Review(db.Model):
+    __table_args__ = (db.Index('ix_review_product_approved', 'product_id', 'is_approved'),)
+    
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -74,8 +228,95 @@ class Review(db.Model):
     user = db.relationship('User', backref='reviews')
     product = db.relationship('Product', backref='reviews')
 
+# Ürün Puan Özeti Modeli (onaylı yorumlardan türetilir)
+class ProductRating(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    stars_1 = db.Column(db.Integer, default=0, nullable=False)
+    stars_2 = db.Column(db.Integer, default=0, nullable=False)
+    stars_3 = db.Column(db.Integer, default=0, nullable=False)
+    stars_4 = db.Column(db.Integer, default=0, nullable=False)
+    stars_5 = db.Column(db.Integer, default=0, nullable=False)
+    
+    @property
+    def average(self):
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+    
+    def distribution(self):
+        # Yıldız başına yüzde: {5: 60, 4: 20, ...}
+        return {
+            i: round(getattr(self, f'stars_{i}') / self.rating_count * 100) if self.rating_count else 0
+            for i in range(1, 6)
+        }
+
+# Benzer ürün önerileri (çevrimdışı derlenir, ürün sayfası tek indeksli sorguyla okur)
+class ProductRecommendation(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    recommended_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class RecommendationBuild(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    mode = db.Column(db.String(20), nullable=False)  # 'full' veya 'incremental'
+    products = db.Column(db.Integer, nullable=False)
+    seconds = db.Column(db.Float)
+
+# Analitik özet tabloları (günlük, artımlı güncellenir)
+class SalesDailyCategory(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)  # 0: kategorisiz
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+class SalesDailyProduct(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+class SalesDailyPayment(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    payment_method = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    paid_orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class OrderDailyStatus(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+class ReviewDailyRating(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+
+class AnalyticsOrderState(db.Model):
+    # Özetlere en son hangi haliyle yansıdığı; değişiklikte eski katkı çıkarılıp yenisi eklenir
+    order_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    payment_method = db.Column(db.String(50), nullable=False)
+    paid = db.Column(db.Boolean, nullable=False)
+    total = db.Column(db.Float, nullable=False)
+
+class AnalyticsCursor(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+
 # Sipariş Modeli
 class Order(db.Model):
+    __table_args__ = (
+        db.Index('ix_order_user_created', 'user_id', 'created_at'),
+        db.Index('ix_order_updated', 'updated_at'),  # analitik değişiklik imleci (rowid = id)
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(20), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -88,14 +329,24 @@ class Order(db.Model):
     billing_address = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1)  # durum her değiştiğinde artar
+    # Sipariş geçmişi listesi için özet (create_order'da yazılır, kalemler yüklenmez)
+    item_count = db.Column(db.Integer)
+    first_item_name = db.Column(db.String(200))
+    thumbnail_url = db.Column(db.String(500))
     
     user = db.relationship('User', backref='orders')
     items = db.relationship('OrderItem', backref='order')
 
+# Günlük sipariş numarası sayacı
+class OrderSequence(db.Model):
+    day = db.Column(db.String(8), primary_key=True)  # YYYYMMDD
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
 # Sipariş Ürünleri Modeli
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -105,7 +356,7 @@ class OrderItem(db.Model):
 # Kargo Takip Modeli
 class ShippingTracking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     tracking_number = db.Column(db.String(50), unique=True)
     carrier = db.Column(db.String(100))
     status = db.Column(db.String(100))
@@ -115,6 +366,909 @@ class ShippingTracking(db.Model):
     
     order = db.relationship('Order', backref='tracking')
 
+# Arka Plan İşi Modeli (kalıcı iş kuyruğu)
+class Job(db.Model):
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# İdempotency anahtarları: aynı Idempotency-Key ile tekrarlanan istek ilk isteğin yanıtını alır
+class IdempotencyKey(db.Model):
+    key = db.Column(db.String(300), primary_key=True)  # '<user_id>:<istemci anahtarı>'
+    request_hash = db.Column(db.String(64), nullable=False)  # aynı anahtar farklı istekle kullanılamaz
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress, completed
+    response_status = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    locked_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Arama indeksi (SQLite FTS5)
+SEARCH_PAGE_SIZE = 24
+
+# NFKD ile ayrışmayan Lehçe/Türkçe harfler
+SEARCH_FOLD_MAP = str.maketrans({'ł': 'l', 'Ł': 'L', 'ı': 'i', 'İ': 'I', 'ß': 'ss'})
+
+def fold_search_text(value):
+    value = (value or '').translate(SEARCH_FOLD_MAP)
+    value = unicodedata.normalize('NFKD', value)
+    return ''.join(c for c in value if not unicodedata.combining(c)).lower()
+
+event.listen(db.metadata, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+    "name, description, tokenize='unicode61 remove_diacritics 2')"
+).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop', DDL(
+    "DROP TABLE IF EXISTS product_search"
+).execute_if(dialect='sqlite'))
+
+def index_product(connection, product):
+    connection.execute(text("DELETE FROM product_search WHERE rowid = :id"), {'id': product.id})
+    connection.execute(
+        text("INSERT INTO product_search (rowid, name, description) VALUES (:id, :name, :description)"),
+        {'id': product.id, 'name': fold_search_text(product.name),
+         'description': fold_search_text(product.description)}
+    )
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+def _product_search_upsert(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        index_product(connection, target)
+
+@event.listens_for(Product, 'after_delete')
+def _product_search_delete(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DELETE FROM product_search WHERE rowid = :id"), {'id': target.id})
+
+# Ürün -> Kategori yabancı anahtarı, slug'dan çözülür
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def _resolve_product_category(mapper, connection, target):
+    if not target.category:
+        target.category_id = None
+    elif target.category_id is None or db.inspect(target).attrs.category.history.has_changes():
+        target.category_id = connection.execute(
+            select(Category.id).where(Category.slug == target.category)).scalar()
+
+def sync_product_categories():
+    # Toplu (Core) yazımlardan sonra: eksik kategorileri ekle, category_id'leri eşle
+    known = {slug for (slug,) in db.session.query(Category.slug)}
+    for (slug,) in db.session.query(Product.category).filter(Product.category.isnot(None)).distinct():
+        if slug not in known:
+            db.session.add(Category(name=slug.replace('-', ' ').title(), slug=slug))
+    db.session.flush()
+    db.session.execute(text(
+        "UPDATE product SET category_id = (SELECT id FROM category WHERE category.slug = product.category) "
+        "WHERE category_id IS NOT (SELECT id FROM category WHERE category.slug = product.category)"
+    ))
+
+def rebuild_search_index():
+    if db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as connection:
+        connection.execute(text("DELETE FROM product_search"))
+        for product in Product.query.yield_per(1000):
+            index_product(connection, product)
+
+def build_search_match(query):
+    # Her kelime önek (prefix) olarak aranır: "tel" -> telefon
+    tokens = re.findall(r'\w+', fold_search_text(query))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+product_search = sa_table('product_search', sa_column('rowid'))
+
+def search_base_query(query):
+    # Eşleşen ürünler; sıralama ve sayfalama çağırana bırakılır
+    match = build_search_match(query)
+    
+    if not match or db.engine.dialect.name != 'sqlite':
+        products_query = Product.query
+        if query:
+            products_query = products_query.filter(
+                (Product.name.ilike(f'%{query}%')) |
+                (Product.description.ilike(f'%{query}%'))
+            )
+        return products_query, False
+    
+    return Product.query.join(product_search, product_search.c.rowid == Product.id) \
+        .filter(text("product_search MATCH :match").bindparams(match=match)), True
+
+def search_by_relevance(products_query, fts, page=1, per_page=SEARCH_PAGE_SIZE):
+    # BM25 skoru indekslenemez; ilgi sıralaması sayfa numarasıyla kalır
+    # Ad sütunu açıklamadan 10 kat ağır sayılır
+    order = text("bm25(product_search, 10.0, 1.0)") if fts else Product.id
+    return products_query.order_by(order).offset((page - 1) * per_page).limit(per_page).all()
+
+# Kategori ve arama listeleri: keyset sayfalama, sunucu tarafı sıralama ve facet sayıları
+LISTING_PAGE_SIZE = 24
+
+# sıralama -> (sütun, azalan mı)
+LISTING_SORTS = {
+    'newest': (Product.created_at, True),
+    'price_asc': (Product.price, False),
+    'price_desc': (Product.price, True),
+    'rating': (Product.rating_avg, True),
+}
+
+# (anahtar, alt sınır, üst sınır) PLN
+PRICE_BUCKETS = (
+    ('0-50', 0, 50),
+    ('50-200', 50, 200),
+    ('200-1000', 200, 1000),
+    ('1000+', 1000, None),
+)
+
+def price_bucket_expression():
+    return case(*[(Product.price < upper, key) for key, _, upper in PRICE_BUCKETS if upper is not None],
+                else_=PRICE_BUCKETS[-1][0])
+
+def filter_listing(products_query, category_slug=None, price=None):
+    if category_slug:
+        products_query = products_query.filter(
+            Product.category_id == select(Category.id).where(Category.slug == category_slug).scalar_subquery())
+    for key, lower, upper in PRICE_BUCKETS:
+        if key == price:
+            products_query = products_query.filter(Product.price >= lower)
+            if upper is not None:
+                products_query = products_query.filter(Product.price < upper)
+    return products_query
+
+def encode_listing_cursor(value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode().rstrip('=')
+
+def decode_listing_cursor(cursor, column):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def paginate_listing(products_query, sort, after=None, per_page=LISTING_PAGE_SIZE):
+    # Son görülen (sıralama değeri, id) çiftinden devam edilir; OFFSET kullanılmaz
+    column, descending = LISTING_SORTS[sort]
+    position = decode_listing_cursor(after, column) if after else None
+    if position is not None:
+        key = tuple_(column, Product.id)
+        products_query = products_query.filter(key < position if descending else key > position)
+    
+    if descending:
+        products_query = products_query.order_by(column.desc(), Product.id.desc())
+    else:
+        products_query = products_query.order_by(column.asc(), Product.id.asc())
+    
+    products = products_query.limit(per_page + 1).all()
+    next_cursor = None
+    if len(products) > per_page:
+        products = products[:per_page]
+        last = products[-1]
+        next_cursor = encode_listing_cursor(getattr(last, column.key), last.id)
+    return products, next_cursor
+
+def listing_facets(products_query, category_slug=None, price=None):
+    # Tek GROUP BY sorgusu (kategori x fiyat aralığı); her facet diğer filtreye göre sayılır
+    bucket = price_bucket_expression()
+    rows = products_query.outerjoin(Category, Category.id == Product.category_id) \
+        .with_entities(Category.slug, Category.name, bucket, func.count(Product.id)) \
+        .group_by(Category.slug, Category.name, bucket).all()
+    
+    categories = {}
+    prices = {key: 0 for key, _, _ in PRICE_BUCKETS}
+    total = 0
+    for slug, name, bucket_key, count in rows:
+        in_category = not category_slug or slug == category_slug
+        in_price = not price or bucket_key == price
+        if slug and in_price:
+            entry = categories.setdefault(slug, {'slug': slug, 'name': name, 'count': 0})
+            entry['count'] += count
+        if in_category:
+            prices[bucket_key] += count
+        if in_category and in_price:
+            total += count
+    
+    return {
+        'categories': sorted(categories.values(), key=lambda c: (-c['count'], c['name'])),
+        'prices': [{'key': key, 'count': count} for key, count in prices.items()],
+        'total': total
+    }
+
+def listing_args(**args):
+    # Sayfa/facet linklerinde korunacak boş olmayan parametreler
+    return {key: value for key, value in args.items() if value}
+
+# SQLite bağlantı ayarları
+@event.listens_for(Engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+# Mevcut tablolara sonradan eklenen sütunları oluşturma (create_all var olan tabloya dokunmaz).
+# SQLite ADD COLUMN UNIQUE alamaz (ayrı benzersiz indeks oluşturulur), NOT NULL sütun ise
+# sabit bir varsayılan ister (modeldeki default kullanılır). Tekrar çalıştırmak güvenlidir.
+def ensure_columns():
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {row[1] for row in connection.execute(text(f'PRAGMA table_info("{table.name}")'))}
+            if not existing:
+                continue
+            checks = [str(constraint.sqltext) for constraint in table.constraints
+                      if isinstance(constraint, db.CheckConstraint)]
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(db.engine.dialect)}'
+                if column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg).compile(db.engine, compile_kwargs={'literal_binds': True})
+                    ddl += f' DEFAULT {default}' if column.nullable else f' NOT NULL DEFAULT {default}'
+                elif not column.nullable:
+                    raise RuntimeError(f'{table.name}.{column.name}: NOT NULL sütun için varsayılan değer gerekli')
+                for foreign_key in column.foreign_keys:
+                    ddl += f' REFERENCES "{foreign_key.column.table.name}" ("{foreign_key.column.name}")'
+                ddl += ''.join(f' CHECK ({check})' for check in checks if check.split()[0] == column.name)
+                connection.execute(text(ddl))
+                if column.unique:
+                    connection.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{table.name}_{column.name}" '
+                                            f'ON "{table.name}" ("{column.name}")'))
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+# Mevcut tablolara sonradan eklenen indeksleri oluşturma
+def ensure_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+# İstek başına SQL sorgu sayacı ve süresi. Başlangıç zamanı ifadenin yürütme bağlamında tutulur:
+# hata veren ifadenin bağlamı onunla birlikte atılır, bağlantıda artık kalmaz
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_sql_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_query_count = g.get('sql_query_count', 0) + 1
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_sql_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is not None and has_request_context():
+        g.sql_time = g.get('sql_time', 0.0) + time.perf_counter() - started
+
+def get_query_count():
+    return g.get('sql_query_count', 0)
+
+@app.after_request
+def add_query_count_header(response):
+    if app.config['SQL_QUERY_COUNT_HEADER']:
+        response.headers['X-SQL-Query-Count'] = str(get_query_count())
+    return response
+
+# Performans ölçümü (METRICS_ENABLED ile açılır), Prometheus formatında /metrics
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}  # endpoint -> [bucket sayıları..., toplam, adet]
+        self.lock = threading.Lock()
+    
+    def observe(self, endpoint, value):
+        with self.lock:
+            series = self.series.setdefault(endpoint, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for endpoint, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{endpoint="{endpoint}"}} {series[-2]}')
+                lines.append(f'{self.name}_count{{endpoint="{endpoint}"}} {series[-1]}')
+        return lines
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+REQUEST_METRICS = {
+    'duration': Histogram('omimas_request_duration_seconds', 'Request wall time', TIME_BUCKETS),
+    'sql_count': Histogram('omimas_sql_statements', 'SQL statements per request',
+                           (1, 2, 3, 5, 10, 20, 50, 100)),
+    'sql_time': Histogram('omimas_sql_duration_seconds', 'SQL time per request', TIME_BUCKETS),
+    'template_time': Histogram('omimas_template_render_seconds', 'Template render time per request', TIME_BUCKETS),
+    'session_bytes': Histogram('omimas_session_cookie_bytes', 'Session cookie size sent by the client',
+                               (0, 64, 128, 256, 512, 1024, 2048, 4096))
+}
+
+class StackSampler:
+    # İstek thread'inin yığınını belirli aralıklarla örnekler (yavaş istek profili)
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = ';'.join(f'{f.name} ({os.path.basename(f.filename)}:{f.lineno})'
+                             for f in traceback.extract_stack(frame))
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+    
+    def start(self):
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        return self.samples
+
+def dump_profile(endpoint, elapsed, samples):
+    # flamegraph.pl / speedscope ile açılabilen "collapsed stack" formatı
+    os.makedirs(app.config['PROFILE_DIR'], mode=0o700, exist_ok=True)
+    os.chmod(app.config['PROFILE_DIR'], 0o700)
+    path = os.path.join(app.config['PROFILE_DIR'],
+                        f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint}-{int(elapsed * 1000)}ms.txt')
+    with open(path, 'w') as f:
+        for stack, count in sorted(samples.items(), key=lambda item: -item[1]):
+            f.write(f'{stack} {count}\n')
+    return path
+
+@app.before_request
+def start_request_metrics():
+    if app.config['METRICS_ENABLED']:
+        g.request_started = time.perf_counter()
+        if app.config['SLOW_REQUEST_PROFILE']:
+            g.sampler = StackSampler(threading.get_ident(), app.config['PROFILE_SAMPLE_INTERVAL']).start()
+
+@before_render_template.connect_via(app)
+def _template_render_started(sender, template, context, **extra):
+    if 'request_started' in g:
+        g.template_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def _template_render_finished(sender, template, context, **extra):
+    if 'template_started' in g:
+        g.template_time = g.get('template_time', 0.0) + time.perf_counter() - g.pop('template_started')
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_METRICS['duration'].observe(endpoint, elapsed)
+    REQUEST_METRICS['sql_count'].observe(endpoint, g.get('sql_query_count', 0))
+    REQUEST_METRICS['sql_time'].observe(endpoint, g.get('sql_time', 0.0))
+    REQUEST_METRICS['template_time'].observe(endpoint, g.get('template_time', 0.0))
+    REQUEST_METRICS['session_bytes'].observe(
+        endpoint, len(request.cookies.get(app.config['SESSION_COOKIE_NAME'], '')))
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc):
+    # Hata ile biten istekler dahil örnekleyici her zaman durdurulur
+    sampler = g.pop('sampler', None)
+    if sampler is not None:
+        samples = sampler.stop()
+        elapsed = time.perf_counter() - g.request_started
+        if elapsed >= app.config['SLOW_REQUEST_THRESHOLD'] and samples:
+            dump_profile(request.endpoint or 'unknown', elapsed, samples)
+
+@app.route('/metrics')
+def metrics():
+    lines = []
+    for histogram in REQUEST_METRICS.values():
+        lines.extend(histogram.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# Sayfa başına sabit sayıda sorgu ile veri yükleme (N+1 önleme)
+def load_user_cart(user_id):
+    return Cart.query.options(joinedload(Cart.product)).filter_by(user_id=user_id).all()
+
+def load_guest_cart(guest_cart):
+    product_ids = [int(product_id) for product_id in guest_cart]
+    if not product_ids:
+        return []
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+    
+    cart_items = []
+    for product_id, quantity in guest_cart.items():
+        product = products.get(int(product_id))
+        if product:
+            cart_items.append({
+                'product': product,
+                'quantity': quantity,
+                'id': product_id
+            })
+    return cart_items
+
+ORDER_HISTORY_PAGE_SIZE = 20
+
+def load_order_history(user_id, after=None, per_page=ORDER_HISTORY_PAGE_SIZE):
+    # Tek sorgu: (user_id, created_at) indeksi üzerinden keyset, kalemler yerine özet sütunları
+    orders_query = Order.query.filter_by(user_id=user_id)
+    position = decode_listing_cursor(after, Order.created_at) if after else None
+    if position is not None:
+        orders_query = orders_query.filter(tuple_(Order.created_at, Order.id) < position)
+    
+    orders = orders_query.order_by(Order.created_at.desc(), Order.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(orders) > per_page:
+        orders = orders[:per_page]
+        next_cursor = encode_listing_cursor(orders[-1].created_at, orders[-1].id)
+    return orders, next_cursor
+
+def backfill_order_summaries():
+    # Özet sütunları eklenmeden önce oluşmuş siparişler
+    result = db.session.execute(text(
+        'UPDATE "order" SET '
+        "item_count = (SELECT coalesce(sum(quantity), 0) FROM order_item WHERE order_item.order_id = \"order\".id), "
+        "first_item_name = (SELECT product.name FROM order_item JOIN product ON product.id = order_item.product_id "
+        "WHERE order_item.order_id = \"order\".id ORDER BY order_item.id LIMIT 1), "
+        "thumbnail_url = (SELECT product.image_url FROM order_item JOIN product ON product.id = order_item.product_id "
+        "WHERE order_item.order_id = \"order\".id ORDER BY order_item.id LIMIT 1) "
+        "WHERE item_count IS NULL"
+    ))
+    db.session.commit()
+    return result.rowcount
+
+def load_order_detail(order_number, user_id):
+    return Order.query.options(
+        selectinload(Order.items).joinedload(OrderItem.product),
+        selectinload(Order.tracking)
+    ).filter_by(order_number=order_number, user_id=user_id).first_or_404()
+
+# Misafir sepeti deposu
+def get_guest_cart_token(create=False):
+    token = g.get('guest_cart_token') or request.cookies.get(app.config['GUEST_CART_COOKIE'])
+    if token is None and create:
+        token = secrets.token_urlsafe(32)
+        g.new_guest_cart_token = True
+    g.guest_cart_token = token
+    return token
+
+@app.after_request
+def set_guest_cart_cookie(response):
+    if g.get('clear_guest_cart_cookie'):
+        response.delete_cookie(app.config['GUEST_CART_COOKIE'])
+    elif g.get('new_guest_cart_token'):
+        response.set_cookie(app.config['GUEST_CART_COOKIE'], g.guest_cart_token,
+                            max_age=app.config['GUEST_CART_TTL'], httponly=True, samesite='Lax')
+    return response
+
+def touch_guest_cart(token):
+    GuestCart.query.filter_by(token=token).update({'updated_at': datetime.utcnow()})
+
+def migrate_legacy_guest_cart():
+    # Eski cookie tabanlı sepetler ilk erişimde tabloya taşınır
+    legacy_cart = session.pop('guest_cart', None)
+    if legacy_cart:
+        for product_id, quantity in legacy_cart.items():
+            add_guest_cart_item(int(product_id), quantity)
+        db.session.commit()
+
+def get_guest_cart():
+    # {product_id (str): quantity}
+    migrate_legacy_guest_cart()
+    token = get_guest_cart_token()
+    if token is None:
+        return {}
+    rows = db.session.query(GuestCart.product_id, GuestCart.quantity).filter_by(token=token).all()
+    return {str(product_id): quantity for product_id, quantity in rows}
+
+def add_guest_cart_item(product_id, quantity):
+    token = get_guest_cart_token(create=True)
+    table = GuestCart.__table__
+    stmt = sqlite_insert(table).values(token=token, product_id=product_id, quantity=quantity,
+                                       updated_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.token, table.c.product_id],
+        set_={'quantity': table.c.quantity + stmt.excluded.quantity}
+    )
+    db.session.execute(stmt)
+    touch_guest_cart(token)
+
+def set_guest_cart_quantity(product_id, quantity):
+    token = get_guest_cart_token()
+    if token is None:
+        return False
+    updated = GuestCart.query.filter_by(token=token, product_id=product_id).update({'quantity': quantity})
+    touch_guest_cart(token)
+    return updated > 0
+
+def remove_guest_cart_item(product_id):
+    token = get_guest_cart_token()
+    if token is None:
+        return False
+    deleted = GuestCart.query.filter_by(token=token, product_id=product_id).delete()
+    touch_guest_cart(token)
+    return deleted > 0
+
+def claim_guest_cart():
+    # {product_id: quantity}; satırlar tek DELETE ... RETURNING ile alınır, aynı sepetin eşzamanlı
+    # ikinci aktarımı boş sepet görür (sepet iki kez birleştirilmez)
+    migrate_legacy_guest_cart()
+    token = get_guest_cart_token()
+    if token is None:
+        return {}
+    table = GuestCart.__table__
+    rows = db.session.execute(
+        table.delete().where(table.c.token == token).returning(table.c.product_id, table.c.quantity)
+    ).all()
+    g.clear_guest_cart_cookie = True
+    return dict(rows)
+
+def clear_guest_cart():
+    token = get_guest_cart_token()
+    if token is not None:
+        GuestCart.query.filter_by(token=token).delete()
+        g.clear_guest_cart_cookie = True
+
+def evict_guest_carts():
+    # Son etkinliği TTL'den eski olan misafir sepetlerini sil; hâlâ tuttukları rezervasyonlar stoğa döner
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['GUEST_CART_TTL'])
+    stale_tokens = db.session.query(GuestCart.token).group_by(GuestCart.token) \
+        .having(func.max(GuestCart.updated_at) < cutoff)
+    table = GuestCart.__table__
+    rows = db.session.execute(
+        table.delete().where(table.c.token.in_(stale_tokens.scalar_subquery())).returning(table.c.token)
+    ).all()
+    
+    owners = sorted({f'guest:{token}' for (token,) in rows})
+    reservations = StockReservation.__table__
+    quantities = Counter()
+    for start in range(0, len(owners), 500):
+        for product_id, quantity in db.session.execute(
+            reservations.delete().where(reservations.c.owner.in_(owners[start:start + 500]))
+            .returning(reservations.c.product_id, reservations.c.quantity)
+        ):
+            quantities[product_id] += quantity
+    return_stock(quantities)
+    db.session.commit()
+    return len(rows)
+
+@app.cli.command('evict-guest-carts')
+def evict_guest_carts_command():
+    """Süresi dolmuş misafir sepetlerini siler."""
+    click.echo(f'{evict_guest_carts()} satır silindi')
+
+# Stok ve sepet rezervasyonları. Product.stock satılabilir adettir: sepete eklemek stoğu
+# koşullu bir UPDATE ile düşürüp süreli bir rezervasyon açar, checkout rezervasyonu satışa
+# çevirir, süresi dolan rezervasyonlar süpürücü tarafından stoğa iade edilir.
+# Stok asla okunup yazılmaz; her değişiklik tek bir koşullu UPDATE'tir.
+STOCK_TAKE_SQL = text("UPDATE product SET stock = stock - :quantity WHERE id = :product_id AND stock >= :quantity")
+STOCK_RETURN_SQL = text("UPDATE product SET stock = stock + :quantity WHERE id = :product_id")
+
+def stock_shortage_message(products):
+    return 'Not enough stock: ' + ', '.join(f'{product.name} ({product.stock} left)' for product in products)
+
+def cart_owner():
+    if 'user_id' in session:
+        return f"user:{session['user_id']}"
+    token = get_guest_cart_token()
+    return f'guest:{token}' if token else None
+
+def take_stock(product_id, quantity):
+    if db.session.execute(STOCK_TAKE_SQL, {'product_id': product_id, 'quantity': quantity}).rowcount != 1:
+        return False
+    mark_stock_changed([product_id])
+    return True
+
+def return_stock(quantities):
+    rows = [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in quantities.items() if quantity]
+    if rows:
+        db.session.execute(STOCK_RETURN_SQL, rows)
+        mark_stock_changed(row['product_id'] for row in rows)
+
+RESERVATION_QUANTITY_SQL = text(
+    "UPDATE stock_reservation SET quantity = :quantity WHERE owner = :owner AND product_id = :product_id"
+)
+
+def sync_reservations(owner, quantities):
+    # Rezervasyonları sepet miktarlarına ({product_id: quantity}) eşitler ve süresini uzatır; stoğu
+    # yetmeyen ürünlerin id'leri döner (onların rezervasyonu değişmez, çağıran karar verir).
+    # İlk ifade bir yazma olduğu için yazma kilidi alınır ve okunan miktarlar eşzamanlı isteklerle tutarlıdır.
+    # Miktarı değişmeyen satırlar bu tek UPDATE ile biter; sepet büyüdükçe ifade sayısı artmaz.
+    table = StockReservation.__table__
+    expires_at = datetime.utcnow() + timedelta(seconds=app.config['CART_RESERVATION_TTL'])
+    held = dict(db.session.execute(
+        table.update().where(table.c.owner == owner, table.c.product_id.in_(list(quantities)))
+        .values(expires_at=expires_at).returning(table.c.product_id, table.c.quantity)
+    ).all())
+    
+    short = [product_id for product_id, quantity in quantities.items()
+             if quantity > held.get(product_id, 0) and not take_stock(product_id, quantity - held.get(product_id, 0))]
+    return_stock({product_id: held[product_id] - quantity for product_id, quantity in quantities.items()
+                  if quantity < held.get(product_id, 0)})
+    
+    changed = {product_id: quantity for product_id, quantity in quantities.items()
+               if product_id not in short and quantity != held.get(product_id, 0)}
+    removed = [product_id for product_id, quantity in changed.items() if quantity <= 0]
+    updated = [{'owner': owner, 'product_id': product_id, 'quantity': quantity}
+               for product_id, quantity in changed.items() if quantity > 0 and product_id in held]
+    added = [{'owner': owner, 'product_id': product_id, 'quantity': quantity, 'expires_at': expires_at}
+             for product_id, quantity in changed.items() if quantity > 0 and product_id not in held]
+    if removed:
+        db.session.execute(table.delete().where(table.c.owner == owner, table.c.product_id.in_(removed)))
+    if updated:
+        db.session.execute(RESERVATION_QUANTITY_SQL, updated)
+    if added:
+        db.session.execute(table.insert(), added)
+    return short
+
+def set_reservation(owner, product_id, quantity):
+    # Tek ürün; stok yetmezse False (çağıran rollback yapar)
+    return not sync_reservations(owner, {product_id: quantity})
+
+def claim_reservations(owner):
+    # {product_id: quantity}; satırlar tek DELETE ... RETURNING ile alınır (süpürücüyle yarışmaz)
+    table = StockReservation.__table__
+    rows = db.session.execute(
+        table.delete().where(table.c.owner == owner).returning(table.c.product_id, table.c.quantity)
+    ).all()
+    return dict(rows)
+
+def release_reservations(owner):
+    if owner is not None:
+        return_stock(claim_reservations(owner))
+
+def transfer_reservations(source, target, max_quantity=None):
+    # Misafir rezervasyonları kullanıcıya geçer; birleşen miktar max_quantity'yi aşarsa fazlası stoğa iade
+    # edilir. claim ilk yazma olduğu için hedefin okunan rezervasyonları eşzamanlı isteklerle tutarlıdır.
+    held = claim_reservations(source)
+    if not held:
+        return
+    table = StockReservation.__table__
+    quantities = Counter(held)
+    quantities.update(dict(db.session.execute(
+        select(table.c.product_id, table.c.quantity).where(table.c.owner == target,
+                                                          table.c.product_id.in_(list(held)))
+    ).all()))
+    if max_quantity is not None:
+        return_stock({product_id: quantity - max_quantity for product_id, quantity in quantities.items()
+                      if quantity > max_quantity})
+        quantities = {product_id: min(quantity, max_quantity) for product_id, quantity in quantities.items()}
+    expires_at = datetime.utcnow() + timedelta(seconds=app.config['CART_RESERVATION_TTL'])
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.owner, table.c.product_id],
+        set_={'quantity': stmt.excluded.quantity, 'expires_at': stmt.excluded.expires_at}
+    )
+    db.session.execute(stmt, [{'owner': target, 'product_id': product_id, 'quantity': quantity,
+                               'expires_at': expires_at} for product_id, quantity in quantities.items()])
+
+def release_expired_reservations(limit=1000):
+    released = 0
+    while True:
+        rows = db.session.execute(text(
+            "DELETE FROM stock_reservation WHERE rowid IN "
+            "(SELECT rowid FROM stock_reservation WHERE expires_at < :now LIMIT :limit) "
+            "RETURNING product_id, quantity"
+        ), {'now': datetime.utcnow(), 'limit': limit}).all()
+        quantities = Counter()
+        for product_id, quantity in rows:
+            quantities[product_id] += quantity
+        return_stock(quantities)
+        db.session.commit()
+        released += len(rows)
+        if len(rows) < limit:
+            return released
+
+class ReservationSweeper:
+    # Süresi dolan rezervasyonları her turda, terk edilmiş misafir sepetlerini GUEST_CART_EVICT_INTERVAL'da bir
+    def __init__(self, interval=None):
+        self.interval = interval or app.config['RESERVATION_SWEEP_INTERVAL']
+        self.stopping = threading.Event()
+        self.thread = None
+        self.next_eviction = time.monotonic()
+    
+    def _loop(self):
+        while not self.stopping.wait(self.interval):
+            with app.app_context():
+                try:
+                    release_expired_reservations()
+                    if app.config['GUEST_CART_EVICT_INTERVAL'] and time.monotonic() >= self.next_eviction:
+                        self.next_eviction = time.monotonic() + app.config['GUEST_CART_EVICT_INTERVAL']
+                        evict_guest_carts()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Rezervasyon süpürücü hatası: {e}")
+                finally:
+                    db.session.remove()
+    
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+@app.cli.command('release-reservations')
+def release_reservations_command():
+    """Süresi dolmuş sepet rezervasyonlarını stoğa iade eder."""
+    click.echo(f'{release_expired_reservations()} rezervasyon iade edildi')
+
+@app.cli.command('restock')
+@click.argument('product_id', type=int)
+@click.argument('quantity', type=int)
+def restock_command(product_id, quantity):
+    """Ürün stoğuna adet ekler (eksi değer stoktan düşer)."""
+    if db.session.get(Product, product_id) is None:
+        raise click.ClickException('Ürün bulunamadı')
+    if quantity >= 0:
+        return_stock({product_id: quantity})
+    elif not take_stock(product_id, -quantity):
+        raise click.ClickException('Yetersiz stok')
+    db.session.commit()
+    click.echo(f'Stok: {db.session.get(Product, product_id).stock}')
+
+# Sepet rozeti sayacı: sadece sepeti değiştiren işlemlerde güncellenir,
+# layout bu değeri doğrudan session'dan okur (polling yok)
+def refresh_cart_count():
+    if 'user_id' in session:
+        count = Cart.query.filter_by(user_id=session['user_id']).count()
+        session['cart_count'] = count
+    else:
+        count = len(get_guest_cart())
+        if count:
+            session['cart_count'] = count
+        else:
+            # Boş misafir oturumu sayfa önbelleğinden yararlanabilsin
+            session.pop('cart_count', None)
+    return count
+
+# Sepete tek ifadeyle ekleme: satır varsa miktar artırılır (yarış durumu yok)
+def upsert_cart_items(user_id, items, max_quantity=None):
+    # max_quantity verilirse birleşen satır bu adette kesilir (add_to_cart sınırı aşmayı kendisi reddeder)
+    rows = [{'user_id': user_id, 'product_id': product_id,
+             'quantity': quantity if max_quantity is None else min(quantity, max_quantity)}
+            for product_id, quantity in items]
+    if not rows:
+        return
+    table = Cart.__table__
+    stmt = sqlite_insert(table)
+    quantity = table.c.quantity + stmt.excluded.quantity
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.product_id],
+        set_={'quantity': quantity if max_quantity is None else func.min(quantity, max_quantity)}
+    )
+    db.session.execute(stmt, rows)
+
+# Benzersiz indeks öncesi oluşmuş tekrar eden sepet satırlarını birleştirme
+def merge_duplicate_cart_rows():
+    db.session.execute(text(
+        "UPDATE cart SET quantity = (SELECT SUM(c2.quantity) FROM cart c2 "
+        "WHERE c2.user_id = cart.user_id AND c2.product_id = cart.product_id) "
+        "WHERE id IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1)"
+    ))
+    db.session.execute(text(
+        "DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id)"
+    ))
+    db.session.execute(text("DROP INDEX IF EXISTS ix_cart_user_product"))
+    db.session.commit()
+
+# Parola hash'leme: hashlib (pbkdf2/scrypt) GIL'i bıraktığı için sınırlı bir thread havuzu
+# yeterli; aynı anda en fazla PASSWORD_HASH_WORKERS çekirdek hash'e gider, kuyruk da sınırlı
+class PasswordHasherBusy(Exception):
+    pass
+
+password_hash_pool = None
+password_hash_slots = None
+password_hash_lock = threading.Lock()
+
+def get_password_hash_pool():
+    global password_hash_pool, password_hash_slots
+    with password_hash_lock:
+        if password_hash_pool is None:
+            password_hash_pool = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                                    thread_name_prefix='password-hash')
+            password_hash_slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_PENDING'])
+        return password_hash_pool, password_hash_slots
+
+def run_password_hash(fn, *args):
+    if not app.config['PASSWORD_HASH_WORKERS']:
+        return fn(*args)
+    
+    pool, slots = get_password_hash_pool()
+    if not slots.acquire(timeout=app.config['PASSWORD_HASH_WAIT']):
+        raise PasswordHasherBusy()
+    try:
+        return pool.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+def hash_password(password):
+    return run_password_hash(generate_password_hash, password, app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    return run_password_hash(check_password_hash, password_hash, password)
+
+@lru_cache(maxsize=8)
+def password_hash_prefix(method):
+    # Kısa yazımlar ('scrypt', 'pbkdf2') werkzeug'un varsayılanlarıyla tam öneke açılır
+    # ('scrypt:32768:8:1'); önek bir kez hash üretilerek alınır ve saklanır
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def password_needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != password_hash_prefix(app.config['PASSWORD_HASH_METHOD'])
+
+@app.cli.command('benchmark-password-hash')
+@click.option('--method', 'methods', multiple=True, help='Ölçülecek yöntem (örn. scrypt:32768:8:1); tekrarlanabilir')
+@click.option('--rounds', default=5, show_default=True, help='Yöntem başına hash sayısı')
+def benchmark_password_hash_command(methods, rounds):
+    """Parola hash parametrelerinin bu makinedeki süresini ölçer."""
+    methods = methods or (app.config['PASSWORD_HASH_METHOD'], 'pbkdf2:sha256:600000',
+                          'scrypt:32768:8:1', 'scrypt:65536:8:2', 'scrypt:131072:8:1')
+    for method in dict.fromkeys(methods):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            generate_password_hash('benchmark-password', method)
+        elapsed = (time.perf_counter() - started) / rounds
+        marker = ' (aktif)' if method == app.config['PASSWORD_HASH_METHOD'] else ''
+        click.echo(f'{method}: {elapsed * 1000:.1f} ms/hash{marker}')
+
+# Giriş denemesi sınırlama (hash'lemeden önce, bellek içi token kovası)
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second, max_keys=100000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # anahtar -> (token, son güncelleme)
+        self.lock = threading.Lock()
+    
+    def consume(self, key):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return allowed
+
+login_ip_limiter = TokenBucket(*app.config['LOGIN_IP_RATE'])
+login_user_limiter = TokenBucket(*app.config['LOGIN_USER_RATE'])
+
+def login_allowed(username):
+    # İki kova da her denemede harcanır; None verilen sınırlayıcı kapalıdır
+    allowed = True
+    if login_ip_limiter is not None:
+        allowed = login_ip_limiter.consume(request.remote_addr or '') and allowed
+    if login_user_limiter is not None:
+        allowed = login_user_limiter.consume(username.strip().lower()) and allowed
+    return allowed
+
 # Login gerektiren sayfalar için decorator
 def login_required(f):
     @wraps(f)
@@ -125,44 +1279,924 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# API'den ürün çekme fonksiyonu
-def fetch_products_from_api():
-    try:
-        response = requests.get('https://dummyjson.com/products?limit=20')
-        products_data = response.json()['products']
-        
-        for product_data in products_data:
-            price_pln = product_data['price'] * 4
-            
-            product = Product(
-                name=product_data['title'],
-                price=round(price_pln, 2),
-                currency='PLN',
-                image_url=product_data['thumbnail'],
-                category=product_data['category'],
-                description=product_data['description'],
-                images=str(product_data['images'])
-            )
-            db.session.add(product)
-        
-        db.session.commit()
-        print(f"{len(products_data)} ürün API'den başarıyla çekildi!")
+# Sayfa önbelleği (anonim istekler için)
+class MemoryCache:
+    # Süreç içi LRU + TTL
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def delete_path(self, path):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(path + '?')]:
+                del self.entries[key]
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class FileCache:
+    # Aynı makinedeki tüm worker süreçleri tarafından paylaşılır. Değer JSON olarak saklanır
+    # (pickle değil: dosyayı yazabilen biri kod çalıştıramaz), dizine sadece uygulama erişir.
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+    
+    def _path(self, key):
+        # Aynı sayfanın tüm sorgu varyantları tek alt dizinde (delete_path dizini siler)
+        page_dir = hashlib.sha1(key.split('?', 1)[0].encode()).hexdigest()
+        return os.path.join(self.directory, page_dir, hashlib.sha1(key.encode()).hexdigest())
+    
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires_at'] < time.time():
+            return None
+        return entry['body']
+    
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'expires_at': time.time() + ttl, 'body': value}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # dizin aynı anda delete_path/clear ile silindi
+    
+    def delete_path(self, path):
+        shutil.rmtree(os.path.join(self.directory, hashlib.sha1(path.encode()).hexdigest()), ignore_errors=True)
+    
+    def clear(self):
+        for name in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+def create_page_cache():
+    backend = app.config['PAGE_CACHE_BACKEND']
+    if backend == 'memory':
+        return MemoryCache(app.config['PAGE_CACHE_MAX_ENTRIES'])
+    if backend == 'file':
+        return FileCache(app.config['PAGE_CACHE_DIR'])
+    return None
+
+page_cache = create_page_cache()
+page_cache_stats = {'hits': 0, 'misses': 0}
+page_cache_stats_lock = threading.Lock()  # istekler farklı thread'lerde sayar
+
+def count_page_cache(outcome):
+    with page_cache_stats_lock:
+        page_cache_stats[outcome] += 1
+
+def invalidate_page_cache():
+    if page_cache is not None:
+        page_cache.clear()
+
+# Katalog verisi yazıldığında commit sonrası önbellek temizlenir
+@event.listens_for(db.session, 'before_flush')
+def _mark_page_cache_dirty(db_session, flush_context, instances):
+    for obj in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted):
+        if isinstance(obj, (Product, Category, Review, ProductRating)):
+            db_session.info['page_cache_dirty'] = True
+            return
+
+# Stok Core UPDATE'lerle değiştiği için (ORM flush yok) take_stock/return_stock değişen ürünleri
+# işaretler; commit sonrası sadece o ürünlerin sayfaları silinir
+def mark_stock_changed(product_ids):
+    db.session.info.setdefault('stock_changed', set()).update(product_ids)
+
+@event.listens_for(db.session, 'after_commit')
+def _clear_page_cache(db_session):
+    stock_changed = db_session.info.pop('stock_changed', ())
+    if db_session.info.pop('page_cache_dirty', False):
+        invalidate_page_cache()
+    elif page_cache is not None:
+        for product_id in stock_changed:
+            page_cache.delete_path(f'/product/{product_id}')
+
+def cached_page(f):
+    # Oturum verisi (kullanıcı, misafir sepeti, flash mesajı) olan istekler
+    # kişiselleştirilmiş içerik taşıdığı için önbelleğe alınmaz
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if page_cache is None or session:
+            return f(*args, **kwargs)
+        
+        key = request.path + '?' + '&'.join(
+            f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        body = page_cache.get(key)
+        if body is not None:
+            count_page_cache('hits')
+            response = make_response(body)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        count_page_cache('misses')
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200 and not session:
+            page_cache.set(key, response.get_data(as_text=True), app.config['PAGE_CACHE_TTL'])
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return decorated_function
+
+@app.route('/api/cache_stats')
+def api_cache_stats():
+    with page_cache_stats_lock:
+        stats = dict(page_cache_stats)
+    return jsonify(dict(stats, backend=app.config['PAGE_CACHE_BACKEND']))
+
+# Statik dosya derleme: sayfa CSS/JS'i birleştirilir, küçültülür, içerik hash'iyle adlandırılır
+# ve gzip/brotli ile önceden sıkıştırılır. Şablonlar url_for('asset', filename='site.css') kullanır.
+ASSET_BUNDLES = {
+    'site.css': ['style.css'],
+    'site.js': ['js/site.js'],
+    'account.css': ['css/account.css'],
+    'edit_review.css': ['css/edit_review.css'],
+    'order_history.css': ['css/order_history.css'],
+    'order_tracking.css': ['css/order_tracking.css'],
+    'order_tracking.js': ['js/order_tracking.js'],
+    'product.css': ['css/product.css'],
+    'product.js': ['js/product.js'],
+    'checkout.js': ['js/checkout.js'],
+}
+
+asset_manifest = None
+asset_lock = threading.Lock()
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+def minify_js(source):
+    # Güvenli küçültme: satır sonları korunur (ASI), girinti ve tam satır yorumlar atılır
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+def asset_sources():
+    return [os.path.join(app.static_folder, source) for sources in ASSET_BUNDLES.values() for source in sources]
+
+def build_assets():
+    dist_dir = app.config['ASSET_DIST_DIR']
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    
+    for name, sources in ASSET_BUNDLES.items():
+        content = '\n'.join(open(os.path.join(app.static_folder, source), encoding='utf-8').read()
+                            for source in sources)
+        data = (minify_css(content) if name.endswith('.css') else minify_js(content)).encode('utf-8')
+        stem, extension = os.path.splitext(name)
+        hashed_name = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        
+        path = os.path.join(dist_dir, hashed_name)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data))
+        manifest[name] = hashed_name
+    
+    # Eski hash'li dosyalar silinmez: önbellekteki eski sayfalar onlara başvurabilir
+    fd, tmp_path = tempfile.mkstemp(dir=dist_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(dist_dir, 'manifest.json'))
+    return manifest
+
+def get_asset_manifest():
+    # Manifest yoksa (veya debug modda kaynaklar değiştiyse) ilk kullanımda derlenir
+    global asset_manifest
+    manifest_path = os.path.join(app.config['ASSET_DIST_DIR'], 'manifest.json')
+    with asset_lock:
+        if asset_manifest is not None and not app.debug:
+            return asset_manifest
+        try:
+            built_at = os.path.getmtime(manifest_path)
+            stale = app.debug and any(os.path.getmtime(source) > built_at for source in asset_sources())
+        except OSError:
+            stale = True
+        if stale:
+            asset_manifest = build_assets()
+        elif asset_manifest is None:
+            with open(manifest_path) as f:
+                asset_manifest = json.load(f)
+        return asset_manifest
+
+@app.url_defaults
+def _hashed_asset_url(endpoint, values):
+    if endpoint == 'asset' and 'filename' in values:
+        values['filename'] = get_asset_manifest().get(values['filename'], values['filename'])
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    dist_dir = app.config['ASSET_DIST_DIR']
+    mimetype = mimetypes.guess_type(filename)[0]
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(dist_dir, filename + suffix)):
+            response = send_from_directory(dist_dir, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(dist_dir, filename, mimetype=mimetype)
+    
+    # Dosya adı içeriğin hash'i olduğundan yanıt hiç değişmez
+    response.headers['Cache-Control'] = f"public, max-age={app.config['ASSET_MAX_AGE']}, immutable"
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Statik CSS/JS paketlerini derler (küçültme, hash'li ad, gzip/brotli)."""
+    global asset_manifest
+    with asset_lock:
+        asset_manifest = build_assets()
+    for name, hashed_name in sorted(asset_manifest.items()):
+        click.echo(f'{name} -> {hashed_name}')
+    if brotli is None:
+        click.echo('brotli kurulu değil: sadece .gz dosyaları üretildi')
+
+# Ürün görselleri proxy'si: orijinal (DummyJSON CDN) bir kez çekilir, grid/detail/zoom boyutlarında
+# WebP veya JPEG varyantları thread havuzunda üretilir ve diskte önbelleğe alınır.
+# URL'ler SECRET_KEY ile imzalanır (açık proxy değil); şablonlar {{ url|image_variant('grid') }} kullanır.
+IMAGE_VARIANTS = {'grid': 300, 'detail': 600, 'zoom': 1200}  # en uzun kenar (px), büyütme yapılmaz
+IMAGE_QUALITY = {'webp': 80, 'jpeg': 82}
+IMAGE_MIMETYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+IMAGE_SIGNATURES = ((b'\xff\xd8\xff', 'image/jpeg'), (b'\x89PNG\r\n\x1a\n', 'image/png'), (b'GIF8', 'image/gif'))
+IMAGE_CACHE_TOUCH_INTERVAL = 60  # saniye; okumada mtime (LRU sırası) en fazla bu sıklıkta güncellenir
+
+class ImageSourceError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+class ImageCache:
+    # Dosya adı anahtarın SHA-256'sıdır ve içerik hiç değişmez. LRU sırası dosyanın mtime'ıdır
+    # (okumada güncellenir); toplam boyut sınırı aşınca en eski dosyalar sınırın %90'ına inene kadar
+    # silinir. Aynı makinedeki worker süreçleri dizini paylaşır, boyut her süreçte tahmini tutulur.
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+        self.max_bytes = max_bytes
+        self.size = None
+        self.lock = threading.Lock()
+    
+    def path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+    
+    def get(self, key):
+        path = self.path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > IMAGE_CACHE_TOUCH_INTERVAL:
+                os.utime(path)
+        except OSError:
+            return None
+        return path
+    
+    def set(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        with self.lock:
+            if self.size is not None:
+                self.size += len(data)
+            evict = self.size is None or self.size > self.max_bytes
+        if evict:
+            self.evict()
+        return path
+    
+    def evict(self):
+        # Diğer süreçlerin yazdıkları da dahil dizin taranır, tahmini boyut düzeltilir
+        with self.lock:
+            entries = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.startswith('.'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes * 0.9:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    removed += 1
+            self.size = total
+            return removed, total
+
+image_cache = None
+image_pool = None
+image_http = None
+image_lock = threading.Lock()
+image_inflight = {}  # anahtar -> Future; aynı dosya için eşzamanlı istekler tek işi bekler
+
+def get_image_cache():
+    global image_cache
+    with image_lock:
+        if image_cache is None:
+            image_cache = ImageCache(app.config['IMAGE_CACHE_DIR'], app.config['IMAGE_CACHE_MAX_BYTES'])
+        return image_cache
+
+def get_image_pool():
+    global image_pool, image_http
+    with image_lock:
+        if image_pool is None:
+            image_pool = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'], thread_name_prefix='image')
+            image_http = make_catalog_session(8)
+        return image_pool, image_http
+
+def single_flight(key, fn, *args):
+    # Süreç içinde aynı anahtar için ilk çağrı çalışır, eşzamanlı diğer çağrılar sonucunu paylaşır
+    with image_lock:
+        future = image_inflight.get(key)
+        owner = future is None
+        if owner:
+            future = image_inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        result = fn(*args)
+        future.set_result(result)
+        return result
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with image_lock:
+            del image_inflight[key]
+
+def image_signature(url):
+    return hmac.new(app.config['SECRET_KEY'].encode(), url.encode(), hashlib.sha256).hexdigest()[:16]
+
+@app.template_filter('image_variant')
+def image_variant_url(url, variant):
+    if not url or not url.startswith(('http://', 'https://')):
+        return url
+    return url_for('product_image', variant=variant, signature=image_signature(url), src=url)
+
+def sniff_image_mimetype(data):
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for prefix, mimetype in IMAGE_SIGNATURES:
+        if data.startswith(prefix):
+            return mimetype
+    return None
+
+def fetch_image_source(url):
+    cache = get_image_cache()
+    path = cache.get('source:' + url)
+    if path is not None:
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+    
+    _, http = get_image_pool()
+    max_bytes = app.config['IMAGE_MAX_SOURCE_BYTES']
+    try:
+        with http.get(url, timeout=app.config['IMAGE_FETCH_TIMEOUT'], stream=True) as response:
+            if response.status_code in (404, 410):
+                raise ImageSourceError(404)
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > max_bytes:
+                    raise ImageSourceError(502)
+    except requests.RequestException:
+        raise ImageSourceError(502)
+    
+    data = bytes(data)
+    if sniff_image_mimetype(data) is None:
+        raise ImageSourceError(502)
+    cache.set('source:' + url, data)
+    return data
+
+def render_image_variant(source, size, fmt):
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            image.draft(None, (size, size))  # JPEG: DCT ölçeklemesiyle doğrudan küçük çözülür
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.LANCZOS)
+            
+            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+                image = image.convert('RGBA')
+                if fmt == 'jpeg':
+                    background = Image.new('RGB', image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel('A'))
+                    image = background
+            else:
+                image = image.convert('RGB')
+            
+            output = io.BytesIO()
+            if fmt == 'webp':
+                image.save(output, 'WEBP', quality=IMAGE_QUALITY['webp'], method=4)
+            else:
+                image.save(output, 'JPEG', quality=IMAGE_QUALITY['jpeg'], optimize=True, progressive=True)
+            return output.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ImageSourceError(502)
+
+def build_image_variant(url, variant, fmt, key):
+    cache = get_image_cache()
+    path = cache.get(key)
+    if path is not None:
+        return path
+    source = single_flight('source:' + url, fetch_image_source, url)
+    pool, _ = get_image_pool()
+    return cache.set(key, pool.submit(render_image_variant, source, IMAGE_VARIANTS[variant], fmt).result())
+
+def image_variant_path(url, variant, fmt):
+    # fmt None: Pillow kurulu değil, orijinal dosya önbellekten olduğu gibi sunulur
+    cache = get_image_cache()
+    if fmt is None:
+        path = cache.get('source:' + url)
+        if path is None:
+            single_flight('source:' + url, fetch_image_source, url)
+            path = cache.path('source:' + url)
+        return path
+    key = f'{variant}:{fmt}:{url}'
+    return cache.get(key) or single_flight(key, build_image_variant, url, variant, fmt, key)
+
+def accepts_webp():
+    return any(value == 'image/webp' and quality > 0 for value, quality in request.accept_mimetypes)
+
+@app.route('/img/<variant>/<signature>')
+def product_image(variant, signature):
+    source_url = request.args.get('src', '')
+    if variant not in IMAGE_VARIANTS or not hmac.compare_digest(signature, image_signature(source_url)):
+        abort(404)
+    fmt = None if Image is None else ('webp' if accepts_webp() else 'jpeg')
+    
+    def send_variant():
+        path = image_variant_path(source_url, variant, fmt)
+        if fmt is None:
+            with open(path, 'rb') as f:
+                mimetype = sniff_image_mimetype(f.read(12))
+        else:
+            mimetype = IMAGE_MIMETYPES[fmt]
+        return send_file(path, mimetype=mimetype, etag=os.path.basename(path), max_age=app.config['IMAGE_MAX_AGE'])
+    
+    try:
+        try:
+            response = send_variant()
+        except FileNotFoundError:
+            response = send_variant()  # dosya gönderilmeden hemen önce LRU ile silindi: yeniden üretilir
+    except ImageSourceError as exc:
+        abort(exc.status)
+    
+    # İmza kaynak URL'sine bağlı, aynı URL hep aynı görseli verir
+    response.headers['Cache-Control'] = f"public, max-age={app.config['IMAGE_MAX_AGE']}, immutable"
+    if fmt is not None:
+        response.headers['Vary'] = 'Accept'
+    return response
+
+@app.cli.command('warm-image-cache')
+@click.option('--variant', 'variants', multiple=True, type=click.Choice(list(IMAGE_VARIANTS)),
+              default=('grid',), show_default=True)
+@click.option('--format', 'formats', multiple=True, type=click.Choice(list(IMAGE_MIMETYPES)),
+              default=('webp', 'jpeg'), show_default=True)
+@click.option('--workers', default=8, show_default=True, help='Eşzamanlı indirme sayısı')
+def warm_image_cache_command(variants, formats, workers):
+    """Ürün görsellerinin varyantlarını önceden üretir (ilk ziyaretçi beklemesin)."""
+    urls = [url for (url,) in db.session.query(Product.image_url).filter(Product.image_url.isnot(None)).distinct()]
+    formats = [None] if Image is None else formats
+    jobs = [(url, variant, fmt) for url in urls for variant in variants for fmt in formats]
+    
+    def warm(job):
+        try:
+            image_variant_path(*job)
+            return True
+        except ImageSourceError:
+            return False
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(warm, jobs))
+    click.echo(f'{sum(results)}/{len(jobs)} görsel hazır, {len(jobs) - sum(results)} hata')
+    if Image is None:
+        click.echo('Pillow kurulu değil: sadece orijinaller önbelleğe alındı')
+
+@app.cli.command('prune-image-cache')
+def prune_image_cache_command():
+    """Görsel önbelleğini IMAGE_CACHE_MAX_BYTES sınırına indirir (en uzun süredir kullanılmayanlar silinir)."""
+    removed, total = get_image_cache().evict()
+    click.echo(f'{removed} dosya silindi, önbellek {total / 1024 / 1024:.1f} MB')
+
+# API'den ürün çekme (katalog senkronizasyonu)
+CATALOG_PAGE_SIZE = 100
+CATALOG_SYNC_WORKERS = 4
+CATALOG_API_SELECT = 'title,price,thumbnail,category,description,images,stock'
+CATALOG_SYNC_COLUMNS = ('name', 'price', 'currency', 'image_url', 'category',
+                        'description', 'images', 'content_hash', 'updated_at')
+
+def make_catalog_session(workers):
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=3)
+    http.mount('http://', adapter)
+    http.mount('https://', adapter)
+    return http
+
+def fetch_catalog_page(http, skip, limit):
+    response = http.get(
+        app.config['CATALOG_API_URL'],
+        params={'limit': limit, 'skip': skip, 'select': CATALOG_API_SELECT},
+        timeout=app.config['CATALOG_API_TIMEOUT']
+    )
+    response.raise_for_status()
+    return response.json()
+
+def fetch_catalog(workers=CATALOG_SYNC_WORKERS, page_size=CATALOG_PAGE_SIZE):
+    # İlk sayfa toplam ürün sayısını verir, kalan sayfalar paralel çekilir
+    with make_catalog_session(workers) as http:
+        first_page = fetch_catalog_page(http, 0, page_size)
+        products_data = list(first_page['products'])
+        skips = range(page_size, first_page['total'], page_size)
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for page in pool.map(lambda skip: fetch_catalog_page(http, skip, page_size), skips):
+                products_data.extend(page['products'])
+    
+    return products_data
+
+def map_catalog_product(product_data):
+    price_pln = product_data['price'] * 4
+    values = {
+        'name': product_data['title'],
+        'price': round(price_pln, 2),
+        'currency': 'PLN',
+        'image_url': product_data['thumbnail'],
+        'category': product_data['category'],
+        'description': product_data['description'],
+        'images': product_data['images']
+    }
+    values['content_hash'] = hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()
+    values['external_id'] = product_data['id']
+    # Başlangıç stoğu: sadece yeni ürün eklenirken yazılır (CATALOG_SYNC_COLUMNS'ta yok)
+    values['stock'] = product_data.get('stock', 0)
+    return values
+
+def upsert_catalog(rows):
+    # Sadece yeni veya içeriği değişmiş ürünler yazılır
+    existing = dict(db.session.query(Product.external_id, Product.content_hash)
+                    .filter(Product.external_id.isnot(None)).all())
+    changed = [row for row in rows if existing.get(row['external_id']) != row['content_hash']]
+    
+    if changed:
+        now = datetime.utcnow()
+        for row in changed:
+            row['updated_at'] = now
+        
+        stmt = sqlite_insert(Product.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.__table__.c.external_id],
+            set_={column: stmt.excluded[column] for column in CATALOG_SYNC_COLUMNS}
+        )
+        db.session.execute(stmt, changed)
+        
+        # Core upsert mapper event'lerini tetiklemez; arama indeksini elle güncelle
+        if db.engine.dialect.name == 'sqlite':
+            external_ids = [row['external_id'] for row in changed]
+            connection = db.session.connection()
+            for start in range(0, len(external_ids), 500):
+                chunk = external_ids[start:start + 500]
+                for product in Product.query.filter(Product.external_id.in_(chunk)).all():
+                    index_product(connection, product)
+        
+        sync_product_categories()
+    
+    db.session.commit()
+    invalidate_page_cache()
+    inserted = sum(1 for row in changed if row['external_id'] not in existing)
+    return {'inserted': inserted, 'updated': len(changed) - inserted,
+            'unchanged': len(rows) - len(changed)}
+
+def sync_catalog(workers=CATALOG_SYNC_WORKERS, page_size=CATALOG_PAGE_SIZE):
+    started = time.perf_counter()
+    rows = [map_catalog_product(product_data) for product_data in fetch_catalog(workers, page_size)]
+    stats = upsert_catalog(rows)
+    
+    elapsed = time.perf_counter() - started
+    stats['fetched'] = len(rows)
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(len(rows) / elapsed, 1) if elapsed else 0
+    return stats
+
+def fetch_products_from_api():
+    try:
+        stats = sync_catalog()
+        print(f"{stats['fetched']} ürün API'den başarıyla çekildi! "
+              f"(yeni: {stats['inserted']}, güncellenen: {stats['updated']}, "
+              f"değişmeyen: {stats['unchanged']}, {stats['rows_per_second']} satır/sn)")
+    except Exception as e:
+        db.session.rollback()
+        print(f"API hatası: {e}")
+
+@app.cli.command('sync-catalog')
+@click.option('--workers', default=CATALOG_SYNC_WORKERS, show_default=True, help='Paralel istek sayısı')
+@click.option('--page-size', default=CATALOG_PAGE_SIZE, show_default=True, help='Sayfa başına ürün')
+def sync_catalog_command(workers, page_size):
+    """DummyJSON kataloğunu yerel veritabanına senkronize eder."""
+    stats = sync_catalog(workers, page_size)
+    click.echo(json.dumps(stats))
+
+# Yorum Ortalaması Hesaplama
+def get_product_rating(product_id):
+    summary = db.session.get(ProductRating, product_id)
+    if summary is None:
+        summary = ProductRating(product_id=product_id, rating_count=0, rating_sum=0,
+                                stars_1=0, stars_2=0, stars_3=0, stars_4=0, stars_5=0)
+    return summary
+
+def calculate_product_rating(product_id):
+    summary = get_product_rating(product_id)
+    return summary.average, summary.rating_count
+
+REVIEWS_PAGE_SIZE = 10
+
+# Sayfa numarası onaylı yorum sayısına göre sınırlanır (OFFSET SQLite'ın 64 bit sınırını aşmasın)
+def clamp_reviews_page(page, rating_count, per_page=REVIEWS_PAGE_SIZE):
+    return min(max(page, 1), max((rating_count + per_page - 1) // per_page, 1))
+
+# Onaylı yorumlar, yazarlarıyla tek sorguda (şablon her yorum için ayrıca User yüklemez)
+def load_product_reviews(product_id, page=1, per_page=REVIEWS_PAGE_SIZE):
+    reviews = Review.query.options(joinedload(Review.user)).filter_by(product_id=product_id, is_approved=True) \
+        .order_by(Review.created_at.desc(), Review.id.desc()) \
+        .offset((page - 1) * per_page).limit(per_page + 1).all()
+    # Bir fazlası okunur: sonraki sayfa olup olmadığı ayrıca COUNT gerektirmez
+    return reviews[:per_page], len(reviews) > per_page
+
+# Listeler puana göre sıralanabilsin diye ortalama Product satırına da yazılır
+PRODUCT_RATING_AVG_UPDATE = (
+    "UPDATE product SET rating_avg = coalesce((SELECT round(rating_sum * 1.0 / nullif(rating_count, 0), 1) "
+    "FROM product_rating WHERE product_rating.product_id = product.id), 0)"
+)
+
+# Puan özetini artımlı güncelleme (delta: +1 ekleme, -1 silme).
+# Günlük puan trendi (ReviewDailyRating) yorumun yazıldığı güne göre aynı anda güncellenir.
+def update_product_rating(product_id, rating, delta, reviewed_at):
+    if db.session.get(ProductRating, product_id) is None:
+        db.session.add(ProductRating(product_id=product_id))
+        db.session.flush()
+    
+    star_column = getattr(ProductRating, f'stars_{rating}')
+    ProductRating.query.filter_by(product_id=product_id).update({
+        ProductRating.rating_count: ProductRating.rating_count + delta,
+        ProductRating.rating_sum: ProductRating.rating_sum + rating * delta,
+        star_column: star_column + delta
+    }, synchronize_session='fetch')
+    db.session.execute(text(PRODUCT_RATING_AVG_UPDATE + " WHERE product.id = :id"), {'id': product_id})
+    apply_rollup_deltas(ReviewDailyRating, {
+        (reviewed_at.date(),): {'rating_count': delta, 'rating_sum': rating * delta}
+    })
+
+# Puan özetlerini Review tablosundan yeniden oluşturma
+def rebuild_product_ratings():
+    ProductRating.query.delete()
+    
+    summaries = {}
+    rows = db.session.query(Review.product_id, Review.rating, func.count(Review.id)) \
+        .filter(Review.is_approved == True) \
+        .group_by(Review.product_id, Review.rating).all()
+    
+    for product_id, rating, count in rows:
+        summary = summaries.setdefault(product_id, {
+            'product_id': product_id, 'rating_count': 0, 'rating_sum': 0,
+            'stars_1': 0, 'stars_2': 0, 'stars_3': 0, 'stars_4': 0, 'stars_5': 0
+        })
+        summary['rating_count'] += count
+        summary['rating_sum'] += rating * count
+        summary[f'stars_{rating}'] += count
+    
+    if summaries:
+        db.session.execute(ProductRating.__table__.insert(), list(summaries.values()))
+    db.session.execute(text(PRODUCT_RATING_AVG_UPDATE))
+    db.session.commit()
+    invalidate_page_cache()
+
+# Benzer ürün önerileri: çevrimdışı derleme (NumPy/SciPy seyrek matrisler)
+SIMILAR_PRODUCTS_LIMIT = 4
+RECOMMENDATION_TOKEN = re.compile(r'\w{3,}')
+
+def fetch_column_arrays(statement, dtypes, chunk_size=100000):
+    # Büyük sonuçlar parça parça okunup sütun başına NumPy dizisine çevrilir
+    parts = [[] for _ in dtypes]
+    result = db.session.connection().execute(statement.execution_options(yield_per=chunk_size))
+    for rows in result.partitions():
+        for i, values in enumerate(zip(*rows)):
+            parts[i].append(np.array(values, dtype=dtypes[i]))
+    return [np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype) for chunks, dtype in zip(parts, dtypes)]
+
+def basket_matrix(baskets, products, product_ids):
+    # Satır: sipariş/sepet, sütun: ürün; aynı ürün bir sepette bir kez sayılır
+    positions = np.minimum(np.searchsorted(product_ids, products), len(product_ids) - 1)
+    valid = product_ids[positions] == products
+    _, rows = np.unique(baskets[valid], return_inverse=True)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, positions[valid])),
+                               shape=(int(rows.max()) + 1 if len(rows) else 0, len(product_ids)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inverse = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(inverse.astype(np.float32)) @ matrix
+
+def text_matrix(product_ids):
+    # TF-IDF (ad iki kat ağırlıklı); tek üründe ya da çok fazla üründe geçen kelimeler atılır
+    vocabulary = {}
+    rows, columns, counts = [], [], []
+    result = db.session.connection().execute(select(Product.name, Product.description).order_by(Product.id))
+    for row, (name, description) in enumerate(result):
+        tokens = Counter(RECOMMENDATION_TOKEN.findall(fold_search_text(name)) * 2 +
+                         RECOMMENDATION_TOKEN.findall(fold_search_text(description)))
+        for token, count in tokens.items():
+            rows.append(row)
+            columns.append(vocabulary.setdefault(token, len(vocabulary)))
+            counts.append(count)
+    
+    n = len(product_ids)
+    matrix = sparse.csr_matrix((np.log1p(np.array(counts, dtype=np.float32)), (rows, columns)),
+                               shape=(n, len(vocabulary)))
+    df = np.bincount(matrix.indices, minlength=len(vocabulary))
+    keep = np.flatnonzero((df > 1) & (df <= max(app.config['RECOMMENDATION_MAX_DF'] * n, 2)))
+    idf = (np.log((1 + n) / (1 + df[keep])) + 1).astype(np.float32)
+    return normalize_rows(matrix[:, keep] @ sparse.diags(idf))
+
+def cooccurrence_scores(columns, matrix, inverse_sqrt, block):
+    # Blok x ürün kosinüs benzerliği: birlikte_görülme(i, j) / sqrt(n_i * n_j)
+    counts = columns[:, block].T @ matrix
+    return sparse.diags(inverse_sqrt[block]) @ counts @ sparse.diags(inverse_sqrt)
+
+def top_neighbours(scores, block, k):
+    scores = scores.tocsr()
+    for row, position in enumerate(block):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        columns, values = scores.indices[start:end], scores.data[start:end]
+        keep = (columns != position) & (values > 0)
+        columns, values = columns[keep], values[keep]
+        if len(values) > k:
+            best = np.argpartition(-values, k)[:k]
+            columns, values = columns[best], values[best]
+        order = np.lexsort((columns, -values))
+        yield position, columns[order], values[order]
+
+def changed_recommendation_products(since):
+    # Son derlemeden beri siparişte/sepette görülen, içeriği değişen ya da hiç önerisi olmayan ürünler
+    statements = [
+        select(OrderItem.product_id).join(Order, Order.id == OrderItem.order_id).where(Order.created_at >= since),
+        select(Cart.product_id).where(Cart.added_at >= since),
+        select(GuestCart.product_id).where(GuestCart.updated_at >= since),
+        select(Product.id).where(func.coalesce(Product.updated_at, Product.created_at) >= since),
+        select(Product.id).where(Product.id.notin_(select(ProductRecommendation.product_id))),
+    ]
+    changed = set()
+    for statement in statements:
+        changed.update(db.session.execute(statement).scalars())
+    return np.fromiter(changed, dtype=np.int64, count=len(changed))
+
+def build_recommendations(incremental=False):
+    # Artımlı modda sadece değişen ürünlerin komşu listeleri yeniden yazılır;
+    # diğer ürünlerin listeleri bir sonraki tam derlemeye kadar olduğu gibi kalır
+    if np is None:
+        raise RuntimeError('Öneri derlemesi için numpy ve scipy gerekli: pip install numpy scipy')
+    
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    weights = app.config['RECOMMENDATION_WEIGHTS']
+    k = app.config['RECOMMENDATION_TOP_K']
+    
+    product_ids = fetch_column_arrays(select(Product.id).order_by(Product.id), [np.int64])[0]
+    last_build = RecommendationBuild.query.order_by(RecommendationBuild.started_at.desc()).first()
+    incremental = incremental and last_build is not None
+    if incremental:
+        targets = np.flatnonzero(np.isin(product_ids, changed_recommendation_products(last_build.started_at)))
+    else:
+        targets = np.arange(len(product_ids))
+    
+    sources = []
+    if len(targets) and weights.get('orders'):
+        order_lines = fetch_column_arrays(select(OrderItem.order_id, OrderItem.product_id), [np.int64, np.int64])
+        sources.append((weights['orders'], basket_matrix(*order_lines, product_ids)))
+    if len(targets) and weights.get('carts'):
+        user_carts = fetch_column_arrays(select(Cart.user_id, Cart.product_id), [np.int64, np.int64])
+        guest_carts = fetch_column_arrays(select(GuestCart.token, GuestCart.product_id), [object, np.int64])
+        sources.append((weights['carts'], sparse.vstack([basket_matrix(*user_carts, product_ids),
+                                                         basket_matrix(*guest_carts, product_ids)]).tocsr()))
+    
+    prepared = []
+    for weight, matrix in sources:
+        counts = np.asarray(matrix.sum(axis=0)).ravel()
+        inverse_sqrt = np.divide(1, np.sqrt(counts), out=np.zeros_like(counts), where=counts > 0)
+        prepared.append((weight, matrix.tocsc(), matrix, inverse_sqrt.astype(np.float32)))
+    text = text_matrix(product_ids) if len(targets) and weights.get('text') else None
+    
+    table = ProductRecommendation.__table__
+    if incremental:
+        target_ids = [int(product_id) for product_id in product_ids[targets]]
+        for start in range(0, len(target_ids), 500):
+            db.session.execute(table.delete().where(table.c.product_id.in_(target_ids[start:start + 500])))
+    else:
+        db.session.execute(table.delete())
+    
+    written = 0
+    block_size = app.config['RECOMMENDATION_BLOCK_SIZE']
+    for start in range(0, len(targets), block_size):
+        block = targets[start:start + block_size]
+        scores = sparse.csr_matrix((len(block), len(product_ids)), dtype=np.float32)
+        for weight, columns, matrix, inverse_sqrt in prepared:
+            scores = scores + weight * cooccurrence_scores(columns, matrix, inverse_sqrt, block)
+        if text is not None:
+            scores = scores + weights['text'] * (text[block] @ text.T)
         
-    except Exception as e:
-        print(f"API hatası: {e}")
+        rows = [
+            {'product_id': int(product_ids[position]), 'rank': rank,
+             'recommended_id': int(product_ids[column]), 'score': float(value)}
+            for position, columns, values in top_neighbours(scores, block, k)
+            for rank, (column, value) in enumerate(zip(columns, values), 1)
+        ]
+        if rows:
+            db.session.execute(table.insert(), rows)
+            written += len(rows)
+    
+    seconds = round(time.perf_counter() - started, 3)
+    db.session.add(RecommendationBuild(started_at=started_at, mode='incremental' if incremental else 'full',
+                                       products=len(targets), seconds=seconds))
+    db.session.commit()
+    invalidate_page_cache()
+    return {'mode': 'incremental' if incremental else 'full', 'products': len(targets),
+            'rows': written, 'seconds': seconds}
 
-# Yorum Ortalaması Hesaplama
-def calculate_product_rating(product_id):
-    reviews = Review.query.filter_by(product_id=product_id, is_approved=True).all()
-    if not reviews:
-        return 0, 0
+@app.cli.command('build-recommendations')
+@click.option('--incremental', is_flag=True, help='Sadece son derlemeden beri değişen ürünler')
+def build_recommendations_command(incremental):
+    """Benzer ürün önerilerini (satın alma + sepet + metin benzerliği) derler."""
+    click.echo(json.dumps(build_recommendations(incremental)))
+
+def load_similar_products(product, limit=SIMILAR_PRODUCTS_LIMIT):
+    # (product_id, rank) birincil anahtarı üzerinden tek sorgu
+    similar = Product.query.join(ProductRecommendation, ProductRecommendation.recommended_id == Product.id) \
+        .filter(ProductRecommendation.product_id == product.id) \
+        .order_by(ProductRecommendation.rank).limit(limit).all()
+    if len(similar) >= limit:
+        return similar
     
-    total_rating = sum(review.rating for review in reviews)
-    average_rating = total_rating / len(reviews)
-    return round(average_rating, 1), len(reviews)
+    # Öneriler henüz derlenmediyse ya da az komşu varsa aynı kategoriden tamamlanır
+    exclude = [product.id] + [p.id for p in similar]
+    return similar + Product.query.filter(
+        Product.category_id == product.category_id,
+        Product.id.notin_(exclude)
+    ).limit(limit - len(similar)).all()
 
 # Ana Sayfa
 @app.route('/')
+@cached_page
 def index():
     products = Product.query.limit(12).all()
     categories = Category.query.all()
@@ -173,62 +2207,86 @@ def index():
 def search():
     query = request.args.get('q', '')
     category_filter = request.args.get('category', '')
+    price = request.args.get('price', '')
+    sort = request.args.get('sort', 'relevance')
+    if sort not in LISTING_SORTS:
+        sort = 'relevance'
     
-    products_query = Product.query
-    
-    if query:
-        products_query = products_query.filter(
-            (Product.name.ilike(f'%{query}%')) | 
-            (Product.description.ilike(f'%{query}%'))
-        )
-    
-    if category_filter:
-        products_query = products_query.filter(Product.category.ilike(f'%{category_filter}%'))
+    base_query, fts = search_base_query(query)
+    facets = listing_facets(base_query, category_filter, price)
+    products_query = filter_listing(base_query, category_filter, price)
+    total = facets['total']
     
-    products = products_query.all()
+    page, pages, next_cursor = 1, 1, None
+    if sort == 'relevance':
+        pages = max((total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE, 1)
+        # Son sayfadan büyük numaralar son sayfaya çekilir (OFFSET SQLite'ın 64 bit sınırını aşmasın)
+        page = min(max(request.args.get('page', 1, type=int), 1), pages)
+        products = search_by_relevance(products_query, fts, page)
+    else:
+        products, next_cursor = paginate_listing(products_query, sort, request.args.get('after'), SEARCH_PAGE_SIZE)
     categories = Category.query.all()
     
     return render_template('search.html', products=products, query=query, 
-                         categories=categories, category_filter=category_filter)
+                         categories=categories, category_filter=category_filter,
+                         price=price, sort=sort, facets=facets, next_cursor=next_cursor,
+                         args=listing_args(q=query, category=category_filter, price=price,
+                                           sort=sort if sort != 'relevance' else None),
+                         page=page, pages=pages, total=total)
 
 # Ürün Detay Sayfası
 @app.route('/product/<int:product_id>')
+@cached_page
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
     
-    # Benzer ürünler
-    similar_products = Product.query.filter(
-        Product.category == product.category,
-        Product.id != product.id
-    ).limit(4).all()
+    # Benzer ürünler (önceden derlenmiş öneri tablosundan)
+    similar_products = load_similar_products(product)
     
-    # Resimleri string'den listeye çevir
-    try:
-        product_images = ast.literal_eval(product.images)
-    except:
-        product_images = [product.image_url]
+    product_images = product.image_list
     
-    # Yorum ortalaması
-    product_rating = calculate_product_rating(product_id)
+    # Yorum ortalaması ve yıldız dağılımı (tek sorgu)
+    rating_summary = get_product_rating(product_id)
+    product_rating = (rating_summary.average, rating_summary.rating_count)
+    
+    reviews_page = clamp_reviews_page(request.args.get('reviews_page', 1, type=int), rating_summary.rating_count)
+    reviews, more_reviews = load_product_reviews(product_id, reviews_page)
     
     return render_template('product.html', product=product, 
                          product_images=product_images, 
                          similar_products=similar_products,
-                         product_rating=product_rating)
+                         product_rating=product_rating,
+                         rating_distribution=rating_summary.distribution(),
+                         reviews=reviews, reviews_page=reviews_page, more_reviews=more_reviews)
 
 # Kategori Sayfası
 @app.route('/category/<category_name>')
+@cached_page
 def category_page(category_name):
-    products = Product.query.filter(Product.category.ilike(f'%{category_name}%')).all()
-    return render_template('category.html', products=products, category_name=category_name)
+    category = Category.query.filter_by(slug=category_name).first_or_404()
+    price = request.args.get('price', '')
+    sort = request.args.get('sort', 'newest')
+    if sort not in LISTING_SORTS:
+        sort = 'newest'
+    
+    base_query = Product.query.filter(Product.category_id == category.id)
+    facets = listing_facets(base_query, price=price)
+    products, next_cursor = paginate_listing(filter_listing(base_query, price=price), sort,
+                                             request.args.get('after'))
+    
+    return render_template('category.html', products=products, category=category,
+                         category_name=category.slug, price=price, sort=sort, facets=facets,
+                         next_cursor=next_cursor, args=listing_args(price=price, sort=sort))
 
 # Ürün Yorumları
 @app.route('/product/<int:product_id>/reviews')
 def product_reviews(product_id):
     product = Product.query.get_or_404(product_id)
-    reviews = Review.query.filter_by(product_id=product_id, is_approved=True).order_by(Review.created_at.desc()).all()
     product_rating = calculate_product_rating(product_id)
-    return render_template('reviews.html', product=product, reviews=reviews, product_rating=product_rating)
+    page = clamp_reviews_page(request.args.get('page', 1, type=int), product_rating[1])
+    reviews, more_reviews = load_product_reviews(product_id, page)
+    return render_template('reviews.html', product=product, reviews=reviews, product_rating=product_rating,
+                         page=page, more_reviews=more_reviews)
 
 # Yorum Ekleme
 @app.route('/product/<int:product_id>/add_review', methods=['POST'])
@@ -256,6 +2314,9 @@ def add_review(product_id):
     )
     
     db.session.add(review)
+    db.session.flush()
+    if review.is_approved:
+        update_product_rating(product_id, rating, 1, review.created_at)
     db.session.commit()
     
     flash('Thank you for your review! It will be visible after approval.', 'success')
@@ -275,6 +2336,14 @@ def edit_review(review_id):
         rating = int(request.form['rating'])
         comment = request.form['comment'].strip()
         
+        if not 1 <= rating <= 5:
+            flash('Rating must be between 1 and 5 stars!', 'danger')
+            return redirect(url_for('edit_review', review_id=review_id))
+        
+        if review.is_approved and review.rating != rating:
+            update_product_rating(review.product_id, review.rating, -1, review.created_at)
+            update_product_rating(review.product_id, rating, 1, review.created_at)
+        
         review.rating = rating
         review.comment = comment
         db.session.commit()
@@ -295,6 +2364,8 @@ def delete_review(review_id):
         flash('You can only delete your own reviews!', 'danger')
         return redirect(url_for('product_detail', product_id=product_id))
     
+    if review.is_approved:
+        update_product_rating(product_id, review.rating, -1, review.created_at)
     db.session.delete(review)
     db.session.commit()
     
@@ -332,7 +2403,11 @@ def register():
             first_name=first_name,
             last_name=last_name
         )
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except PasswordHasherBusy:
+            flash('Registration is busy right now. Please try again in a moment.', 'warning')
+            return redirect(url_for('register'))
         
         db.session.add(new_user)
         db.session.commit()
@@ -349,14 +2424,33 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
+        if not login_allowed(username):
+            flash('Too many login attempts. Please wait a moment and try again.', 'danger')
+            return render_template('login.html'), 429
+        
         # Hem username hem email ile deneme
         user = User.query.filter((User.username == username) | (User.email == username)).first()
         
         if user:
-            if user.check_password(password):
+            try:
+                password_ok = user.check_password(password)
+            except PasswordHasherBusy:
+                flash('Login is busy right now. Please try again in a moment.', 'warning')
+                return render_template('login.html'), 503
+            
+            if password_ok:
+                # Eski parametrelerle hash'lenmiş parola sessizce yenilenir
+                if password_needs_rehash(user.password_hash):
+                    try:
+                        user.set_password(password)
+                        db.session.commit()
+                    except PasswordHasherBusy:
+                        pass
+                
                 session['user_id'] = user.id
                 session['username'] = user.username
                 session['email'] = user.email
+                refresh_cart_count()
                 
                 flash('Welcome back, {user.username}!', 'success')
                 return redirect(url_for('index'))
@@ -385,25 +2479,18 @@ def account():
     return render_template('account.html', user=user)
 
 # SEPET İŞLEMLERİ - MİSAFİR DESTEKLİ
+MAX_CART_QUANTITY = 10  # sepet satırı başına en fazla adet (rezervasyon da bu kadar)
+
 @app.route('/cart')
 def cart():
     if 'user_id' in session:
         # Giriş yapmış kullanıcı
-        cart_items = Cart.query.filter_by(user_id=session['user_id']).all()
+        cart_items = load_user_cart(session['user_id'])
         total = sum(item.product.price * item.quantity for item in cart_items)
         cart_type = 'user'
     else:
         # Misafir kullanıcı
-        cart_items = []
-        guest_cart = session.get('guest_cart', {})
-        for product_id, quantity in guest_cart.items():
-            product = Product.query.get(int(product_id))
-            if product:
-                cart_items.append({
-                    'product': product,
-                    'quantity': quantity,
-                    'id': product_id
-                })
+        cart_items = load_guest_cart(get_guest_cart())
         total = sum(item['product'].price * item['quantity'] for item in cart_items)
         cart_type = 'guest'
     
@@ -412,51 +2499,42 @@ def cart():
 @app.route('/add_to_cart/<int:product_id>', methods=['POST'])
 def add_to_cart(product_id):
     product = Product.query.get_or_404(product_id)
-    quantity = int(request.form.get('quantity', 1))
+    try:
+        quantity = int(request.form.get('quantity', 1))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Quantity must be a number'}), 400
+    quantity = min(max(quantity, 1), MAX_CART_QUANTITY)
     
     if 'user_id' in session:
         # Giriş yapmış kullanıcı
-        cart_item = Cart.query.filter_by(
-            user_id=session['user_id'], 
-            product_id=product_id
-        ).first()
-        
-        if cart_item:
-            cart_item.quantity += quantity
-        else:
-            cart_item = Cart(
-                user_id=session['user_id'],
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.session.add(cart_item)
-        
-        db.session.commit()
-        return jsonify({'success': True, 'message': f'{product.name} added to cart!', 'type': 'user'})
+        upsert_cart_items(session['user_id'], [(product_id, quantity)])
+        in_cart = db.session.query(Cart.quantity).filter_by(user_id=session['user_id'], product_id=product_id).scalar()
+        cart_type = 'user'
     else:
         # Misafir kullanıcı
-        guest_cart = session.get('guest_cart', {})
-        product_id_str = str(product_id)
-        
-        if product_id_str in guest_cart:
-            guest_cart[product_id_str] += quantity
-        else:
-            guest_cart[product_id_str] = quantity
-        
-        session['guest_cart'] = guest_cart
-        session.modified = True
-        
-        return jsonify({'success': True, 'message': f'{product.name} added to cart!', 'type': 'guest'})
+        add_guest_cart_item(product_id, quantity)
+        in_cart = db.session.query(GuestCart.quantity).filter_by(token=get_guest_cart_token(),
+                                                                 product_id=product_id).scalar()
+        cart_type = 'guest'
+    
+    # Tekrarlanan eklemelerle de satır sınırı aşılamaz (tek istemci tüm stoğu ayıramaz)
+    if in_cart > MAX_CART_QUANTITY:
+        db.session.rollback()
+        return jsonify({'success': False,
+                        'message': f'You can have at most {MAX_CART_QUANTITY} of {product.name} in your cart.'})
+    
+    # Sepetteki toplam adet kadar stok ayrılır; yetmezse sepet de değişmez
+    if not set_reservation(cart_owner(), product_id, in_cart):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': stock_shortage_message([product])})
+    db.session.commit()
+    return jsonify({'success': True, 'message': f'{product.name} added to cart!', 'type': cart_type,
+                    'cart_count': refresh_cart_count()})
 
-# Sepet sayacı API
+# Sepet sayacı API (sorgu çalıştırmaz)
 @app.route('/api/cart_count')
 def api_cart_count():
-    if 'user_id' in session:
-        count = Cart.query.filter_by(user_id=session['user_id']).count()
-        return jsonify({'count': count})
-    else:
-        guest_cart = session.get('guest_cart', {})
-        return jsonify({'count': len(guest_cart)})
+    return jsonify({'count': session.get('cart_count', 0)})
 
 # Sepetten ürün silme
 @app.route('/remove_from_cart/<item_id>', methods=['POST'])
@@ -467,15 +2545,16 @@ def remove_from_cart(item_id):
             flash('Unauthorized action!', 'danger')
             return redirect(url_for('cart'))
         
+        set_reservation(cart_owner(), cart_item.product_id, 0)
         db.session.delete(cart_item)
         db.session.commit()
+        refresh_cart_count()
         flash('Item removed from cart!', 'success')
     else:
-        guest_cart = session.get('guest_cart', {})
-        if item_id in guest_cart:
-            del guest_cart[item_id]
-            session['guest_cart'] = guest_cart
-            session.modified = True
+        if item_id.isdigit() and remove_guest_cart_item(int(item_id)):
+            set_reservation(cart_owner(), int(item_id), 0)
+            db.session.commit()
+            refresh_cart_count()
             flash('Item removed from cart!', 'success')
         else:
             flash('Item not found in cart!', 'danger')
@@ -491,8 +2570,8 @@ def update_cart(item_id):
         quantity = int(quantity)
         if quantity < 1:
             quantity = 1
-        if quantity > 10:
-            quantity = 10
+        if quantity > MAX_CART_QUANTITY:
+            quantity = MAX_CART_QUANTITY
     except:
         quantity = 1
     
@@ -502,106 +2581,250 @@ def update_cart(item_id):
             return jsonify({'success': False, 'message': 'Unauthorized'})
         
         cart_item.quantity = quantity
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Cart updated'})
+        product_id = cart_item.product_id
+    elif item_id.isdigit() and set_guest_cart_quantity(int(item_id), quantity):
+        product_id = int(item_id)
     else:
-        guest_cart = session.get('guest_cart', {})
-        if item_id in guest_cart:
-            guest_cart[item_id] = quantity
-            session['guest_cart'] = guest_cart
-            session.modified = True
-            return jsonify({'success': True, 'message': 'Cart updated'})
-        else:
-            return jsonify({'success': False, 'message': 'Item not found'})
+        return jsonify({'success': False, 'message': 'Item not found'})
+    
+    if not set_reservation(cart_owner(), product_id, quantity):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': stock_shortage_message([db.session.get(Product, product_id)])})
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Cart updated', 'cart_count': refresh_cart_count()})
 
 # Misafir sepetini kullanıcı hesabına taşıma
 @app.route('/transfer_guest_cart')
 @login_required
 def transfer_guest_cart():
-    guest_cart = session.get('guest_cart', {})
-    
-    for product_id_str, quantity in guest_cart.items():
-        product_id = int(product_id_str)
-        
-        existing_item = Cart.query.filter_by(
-            user_id=session['user_id'],
-            product_id=product_id
-        ).first()
-        
-        if existing_item:
-            existing_item.quantity += quantity
-        else:
-            new_item = Cart(
-                user_id=session['user_id'],
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.session.add(new_item)
+    guest_cart = claim_guest_cart()
+    guest_token = get_guest_cart_token()
     
+    # Tüm misafir sepeti tek bir toplu upsert ile aktarılır; birleşen satırlar ve rezervasyonlar
+    # MAX_CART_QUANTITY'de kesilir
+    upsert_cart_items(session['user_id'], guest_cart.items(), MAX_CART_QUANTITY)
+    if guest_token:
+        transfer_reservations(f'guest:{guest_token}', cart_owner(), MAX_CART_QUANTITY)
     db.session.commit()
-    session.pop('guest_cart', None)
+    refresh_cart_count()
     flash('Your guest cart items have been transferred to your account!', 'success')
     return redirect(url_for('cart'))
 
 # Sepeti temizleme
 @app.route('/clear_cart', methods=['POST'])
 def clear_cart():
+    release_reservations(cart_owner())
     if 'user_id' in session:
         Cart.query.filter_by(user_id=session['user_id']).delete()
         db.session.commit()
+        refresh_cart_count()
         flash('Cart cleared successfully!', 'success')
     else:
-        session.pop('guest_cart', None)
+        clear_guest_cart()
+        db.session.commit()
+        refresh_cart_count()
         flash('Cart cleared successfully!', 'success')
     
     return redirect(url_for('cart'))
 
-# Session cart count güncelleme
-@app.route('/api/update_session_cart', methods=['POST'])
-def update_session_cart():
-    data = request.get_json()
-    if 'cart_count' in data:
-        session['cart_count'] = data['cart_count']
-    if 'guest_cart_count' in data:
-        session['guest_cart_count'] = data['guest_cart_count']
-    return jsonify({'success': True})
-
 # Ödeme Sayfası
 @app.route('/checkout')
 @login_required
 def checkout():
-    cart_items = Cart.query.filter_by(user_id=session['user_id']).all()
+    cart_items = load_user_cart(session['user_id'])
     if not cart_items:
         flash('Your cart is empty!', 'warning')
         return redirect(url_for('cart'))
     
+    # Ödeme formu doldurulurken ürünler ayrılı kalsın: rezervasyonlar sepetle eşitlenip uzatılır
+    owner = cart_owner()
+    short_ids = sync_reservations(owner, {item.product_id: item.quantity for item in cart_items})
+    short = [item.product for item in cart_items if item.product_id in short_ids]
+    db.session.commit()
+    if short:
+        flash(stock_shortage_message(short), 'warning')
+        return redirect(url_for('cart'))
+    
+    # Commit yüklenen nesneleri bayatlatır; satır satır yenilenmesin diye sepet tek sorguyla tekrar okunur
+    cart_items = load_user_cart(session['user_id'])
     total = sum(item.product.price * item.quantity for item in cart_items)
     return render_template('checkout.html', cart_items=cart_items, total=total)
 
-# Sipariş Oluşturma
+# Sipariş numarası: günlük sayaç tek bir atomik upsert ile artırılır.
+# Yazma kilidi transaction sonuna kadar tutulduğu için paralel
+# checkout'lar (farklı süreçler dahil) aynı numarayı alamaz.
+def allocate_order_number(day=None):
+    day = day or datetime.now().strftime('%Y%m%d')
+    table = OrderSequence.__table__
+    stmt = sqlite_insert(table).values(day=day, last_value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.day],
+        set_={'last_value': table.c.last_value + 1}
+    ).returning(table.c.last_value)
+    value = db.session.execute(stmt).scalar()
+    return f'OM{day}-{value:04d}'
+
+# Sayaç tablosundan önce oluşturulmuş siparişler için sayaçları başlatma
+def seed_order_sequences():
+    last_values = {}
+    for (order_number,) in db.session.query(Order.order_number).filter(Order.order_number.like('OM%-%')):
+        day, _, number = order_number[2:].partition('-')
+        if number.isdigit():
+            last_values[day] = max(last_values.get(day, 0), int(number))
+    
+    for day, last_value in last_values.items():
+        sequence = db.session.get(OrderSequence, day)
+        if sequence is None:
+            db.session.add(OrderSequence(day=day, last_value=last_value))
+        elif sequence.last_value < last_value:
+            sequence.last_value = last_value
+    db.session.commit()
+
+# İdempotency-Key başlığı: aynı kullanıcı aynı anahtarla isteği tekrarlarsa (çift tıklama,
+# istemci yeniden denemesi) işlem bir kez çalışır, sonraki istekler kayıtlı yanıtı alır.
+# Anahtar önce 'in_progress' olarak yazılıp commit edilir; eşzamanlı kopyalar onun bitmesini bekler.
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+def claim_idempotency_key(key, request_hash):
+    # None: anahtar bu isteğe ait; aksi halde mevcut kayıt (tamamlandıysa yanıtıyla)
+    now = datetime.utcnow()
+    table = IdempotencyKey.__table__
+    stale_cutoff = now - timedelta(seconds=app.config['IDEMPOTENCY_LOCK_TIMEOUT'])
+    db.session.execute(table.delete().where(
+        (table.c.key == key) &
+        ((table.c.expires_at < now) | ((table.c.status == 'in_progress') & (table.c.locked_at < stale_cutoff)))
+    ))
+    inserted = db.session.execute(sqlite_insert(table).values(
+        key=key, request_hash=request_hash, status='in_progress', locked_at=now,
+        expires_at=now + timedelta(seconds=app.config['IDEMPOTENCY_KEY_TTL'])
+    ).on_conflict_do_nothing()).rowcount
+    db.session.commit()
+    if inserted:
+        return None
+    
+    deadline = time.monotonic() + app.config['IDEMPOTENCY_WAIT']
+    while True:
+        record = db.session.get(IdempotencyKey, key, populate_existing=True)
+        if record is None:
+            # İlk istek hata verip anahtarı bıraktı: bu istek devralır
+            return claim_idempotency_key(key, request_hash)
+        if record.status == 'completed' or time.monotonic() >= deadline:
+            return record
+        time.sleep(0.05)
+
+def idempotent(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        client_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not client_key:
+            return f(*args, **kwargs)
+        if len(client_key) > 255:
+            return jsonify({'success': False, 'message': f'{IDEMPOTENCY_HEADER} is too long'}), 400
+        
+        key = f"{session['user_id']}:{client_key}"
+        request_hash = hashlib.sha256(json.dumps(
+            [request.method, request.path, sorted(request.form.items(multi=True))]
+        ).encode()).hexdigest()
+        record = claim_idempotency_key(key, request_hash)
+        if record is not None:
+            if record.request_hash != request_hash:
+                return jsonify({'success': False, 'message': f'{IDEMPOTENCY_HEADER} was used for a different request'}), 422
+            if record.status != 'completed':
+                response = jsonify({'success': False, 'message': 'A request with this key is still in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            # İdempotent uç noktalar JSON döner
+            response = Response(record.response_body, status=record.response_status, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(key=key).delete()
+            db.session.commit()
+            raise
+        if response.status_code >= 500:
+            # Sunucu hatası saklanmaz; aynı anahtarla yeniden deneme işlemi tekrar çalıştırır
+            IdempotencyKey.query.filter_by(key=key).delete()
+        else:
+            IdempotencyKey.query.filter_by(key=key).update({
+                'status': 'completed', 'response_status': response.status_code,
+                'response_body': response.get_data(as_text=True)
+            })
+        db.session.commit()
+        return response
+    return decorated_function
+
+def evict_idempotency_keys():
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.expires_at < datetime.utcnow()).delete()
+    db.session.commit()
+    return deleted
+
+@app.cli.command('evict-idempotency-keys')
+def evict_idempotency_keys_command():
+    """Süresi dolmuş idempotency anahtarlarını siler."""
+    click.echo(f'{evict_idempotency_keys()} anahtar silindi')
+
+# Sipariş Oluşturma: tek transaction. Sepet DELETE ... RETURNING ile alınır (ilk yazma, kilit burada
+# alınır); aynı sepetle eşzamanlı gelen ikinci istek boş sepet görür ve ikinci sipariş oluşmaz.
 @app.route('/create_order', methods=['POST'])
 @login_required
+@idempotent
 def create_order():
-    cart_items = Cart.query.filter_by(user_id=session['user_id']).all()
-    if not cart_items:
+    cart_table = Cart.__table__
+    lines = sorted(db.session.execute(
+        cart_table.delete().where(cart_table.c.user_id == session['user_id'])
+        .returning(cart_table.c.id, cart_table.c.product_id, cart_table.c.quantity)
+    ).all())
+    if not lines:
+        db.session.rollback()
         return jsonify({'success': False, 'message': 'Cart is empty'})
     
-    today = datetime.now().strftime('%Y%m%d')
-    last_order = Order.query.filter(Order.order_number.like(f'OM{today}-%')).order_by(Order.id.desc()).first()
+    # Fiyatlar tek sorguda, aynı transaction içinden okunur
+    products = {product.id: product for product in
+                Product.query.filter(Product.id.in_([line.product_id for line in lines]))}
+    lines = [line for line in lines if line.product_id in products]
+    if not lines:
+        # Sepetteki ürünlerin hepsi katalogdan kaldırılmış: sipariş oluşmaz, rezervasyonlar iade edilir
+        # ve artık karşılığı olmayan sepet satırları silinir
+        db.session.rollback()
+        release_reservations(cart_owner())
+        Cart.query.filter_by(user_id=session['user_id']).delete()
+        db.session.commit()
+        session['cart_count'] = 0
+        return jsonify({'success': False, 'message': 'Cart is empty'})
     
-    if last_order:
-        last_number = int(last_order.order_number.split('-')[-1])
-        new_number = f'OM{today}-{last_number + 1:04d}'
-    else:
-        new_number = f'OM{today}-0001'
+    # Stok: rezervasyonlar satışa çevrilir, rezervasyonu olmayan (süresi dolmuş) adetler koşullu
+    # UPDATE ile düşülür. Hepsi sipariş satırlarıyla aynı transaction'da: bir satır yetmezse hiçbiri uygulanmaz.
+    held = claim_reservations(cart_owner())
+    short = []
+    for line in lines:
+        missing = line.quantity - held.pop(line.product_id, 0)
+        if missing > 0 and not take_stock(line.product_id, missing):
+            short.append(products[line.product_id])
+        elif missing < 0:
+            held[line.product_id] = -missing
+    if short:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': stock_shortage_message(short)})
+    return_stock(held)  # sepette karşılığı kalmamış fazla rezervasyonlar
     
-    total_amount = sum(item.product.price * item.quantity for item in cart_items)
+    new_number = allocate_order_number()
+    
+    items = [{'product_id': line.product_id, 'quantity': line.quantity, 'price': products[line.product_id].price}
+             for line in lines]
+    first_product = products[lines[0].product_id]
     
     # Sadece isim ve adres zorunlu
     order = Order(
         order_number=new_number,
         user_id=session['user_id'],
-        total_amount=total_amount,
+        total_amount=sum(item['price'] * item['quantity'] for item in items),
+        item_count=sum(item['quantity'] for item in items),
+        first_item_name=first_product.name,
+        thumbnail_url=first_product.image_url,
         shipping_address=request.form['shipping_address'],
         billing_address=request.form.get('billing_address', ''),
         payment_method=request.form['payment_method']
@@ -609,18 +2832,9 @@ def create_order():
     
     db.session.add(order)
     db.session.flush()
-    
-    for item in cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.product.price
-        )
-        db.session.add(order_item)
-    
-    Cart.query.filter_by(user_id=session['user_id']).delete()
+    db.session.execute(OrderItem.__table__.insert(), [dict(item, order_id=order.id) for item in items])
     db.session.commit()
+    session['cart_count'] = 0
     
     return jsonify({
         'success': True, 
@@ -628,49 +2842,265 @@ def create_order():
         'order_number': order.order_number
     })
 
-# BLIK Ödeme
-@app.route('/pay_with_blik/<int:order_id>', methods=['POST'])
-@login_required
-def pay_with_blik(order_id):
-    order = Order.query.get_or_404(order_id)
-    if order.user_id != session['user_id']:
-        return jsonify({'success': False, 'message': 'Unauthorized'})
+# Arka plan iş kuyruğu
+JOB_HANDLERS = {}
+
+ORDER_STAGES = [
+    {'status': 'confirmed', 'message': 'Order confirmed', 'delay': 3},
+    {'status': 'processing', 'message': 'Preparing for shipment', 'delay': 5},
+    {'status': 'shipped', 'message': 'Shipped with DHL', 'delay': 8},
+    {'status': 'out_for_delivery', 'message': 'Out for delivery', 'delay': 12},
+    {'status': 'delivered', 'message': 'Delivered successfully', 'delay': 15}
+]
+
+def job_handler(kind):
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+def enqueue_job(kind, payload, order_id=None, delay=0, max_attempts=5):
+    job = Job(kind=kind, payload=payload, order_id=order_id, max_attempts=max_attempts,
+              run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    return job
+
+def claim_job():
+    # Sıradaki işi tek bir UPDATE ... RETURNING ile kilitle (yazma kilidi sayesinde atomik)
+    now = datetime.utcnow()
+    stale_cutoff = now - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'])
+    table = Job.__table__
+    next_job = db.select(table.c.id).where(
+        ((table.c.status == 'queued') & (table.c.run_at <= now)) |
+        ((table.c.status == 'running') & (table.c.locked_at < stale_cutoff))
+    ).order_by(table.c.run_at).limit(1).scalar_subquery()
+    stmt = table.update().where(table.c.id == next_job).values(
+        status='running', locked_at=now, attempts=table.c.attempts + 1
+    ).returning(table.c.id)
+    job_id = db.session.execute(stmt).scalar()
+    db.session.commit()
+    return db.session.get(Job, job_id) if job_id else None
+
+def run_job(job):
+    job_id = job.id
+    try:
+        result = JOB_HANDLERS[job.kind](job.payload)
+        job.status = 'done'
+        job.result = result
+        job.last_error = None
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = f'{type(e).__name__}: {e}'
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            # Yetkilendirme hiç sonuçlanmadıysa ödeme 'processing'de kalmaz, müşteri yeniden deneyebilir
+            if job.kind == 'authorize_payment' and job.order_id:
+                transition_payment(db.session.get(Order, job.order_id), 'processing', {'payment_status': 'failed'})
+        else:
+            backoff = app.config['JOB_RETRY_BASE_SECONDS'] * 2 ** (job.attempts - 1)
+            job.status = 'queued'
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff)
+    job.locked_at = None
+    db.session.commit()
     
-    blik_code = request.form.get('blik_code', '')
+    if job.order_id:
+        publish_order_update(db.session.get(Order, job.order_id))
+    return job
+
+def run_pending_jobs(limit=None):
+    # Kuyruktaki hazır işleri bu thread'de çalıştır (CLI ve testler için)
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+class JobWorkerPool:
+    def __init__(self, threads):
+        self.threads = threads
+        self.stopping = threading.Event()
+        self.workers = []
     
-    # BLIK kodu validasyonu (6 haneli rakam)
-    if not blik_code.isdigit() or len(blik_code) != 6:
-        return jsonify({'success': False, 'message': 'Invalid BLIK code. Must be 6 digits.'})
+    def _loop(self):
+        while not self.stopping.is_set():
+            with app.app_context():
+                try:
+                    job = claim_job()
+                    if job is not None:
+                        run_job(job)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"İş kuyruğu hatası: {e}")
+                    job = None
+                finally:
+                    db.session.remove()
+            if job is None:
+                self.stopping.wait(app.config['JOB_POLL_INTERVAL'])
     
-    # Ödeme simülasyonu (her zaman başarılı)
-    order.payment_status = 'completed'
-    order.status = 'paid'
-    order.blik_code = blik_code
-    order.updated_at = datetime.utcnow()
+    def start(self):
+        for _ in range(self.threads):
+            worker = threading.Thread(target=self._loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        return self
+    
+    def stop(self):
+        self.stopping.set()
+        for worker in self.workers:
+            worker.join()
+
+@app.cli.command('run-worker')
+@click.option('--threads', default=4, show_default=True, help='Worker thread sayısı')
+def run_worker_command(threads):
+    """Arka plan iş kuyruğunu işler (ödeme, kargo etiketi, sipariş aşamaları)."""
+    pool = JobWorkerPool(threads).start()
+    sweeper = ReservationSweeper().start()
+    click.echo(f'{threads} worker çalışıyor, durdurmak için Ctrl+C')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
+        sweeper.stop()
+
+# Ödeme ağ geçidi (PAYMENT_GATEWAY_URL yoksa simülasyon: her zaman başarılı)
+def authorize_with_gateway(order, payment_method, details):
+    gateway_url = app.config['PAYMENT_GATEWAY_URL']
+    if not gateway_url:
+        return True
+    response = requests.post(gateway_url, json={
+        'order_number': order.order_number,
+        'amount': order.total_amount,
+        'currency': 'PLN',
+        'payment_method': payment_method,
+        'details': details
+    }, timeout=app.config['PAYMENT_GATEWAY_TIMEOUT'])
+    response.raise_for_status()
+    return bool(response.json().get('approved'))
+
+# Ödeme durumu geçişleri compare-and-set ile yapılır: UPDATE ... WHERE payment_status = <beklenen>.
+# 0 satır güncellenirse başka bir istek/iş geçişi zaten yapmıştır.
+PAYABLE_STATUSES = ('pending', 'failed')
+
+def transition_payment(order, expected, values):
+    expected = (expected,) if isinstance(expected, str) else expected
+    values = dict(values, updated_at=datetime.utcnow(), version=Order.version + 1)
+    return Order.query.filter(Order.id == order.id, Order.payment_status.in_(expected)) \
+        .update(values, synchronize_session='fetch') == 1
+
+@job_handler('authorize_payment')
+def authorize_payment_job(payload):
+    order = db.session.get(Order, payload['order_id'])
+    if order.payment_status != 'processing':
+        return {'approved': order.payment_status == 'completed', 'duplicate': True}
+    
+    if not authorize_with_gateway(order, payload['payment_method'], payload['details']):
+        if not transition_payment(order, 'processing', {'payment_status': 'failed'}):
+            return {'approved': False, 'duplicate': True}
+        return {'approved': False}
+    
+    values = {'payment_status': 'completed', 'status': 'paid'}
+    if payload['payment_method'] == 'blik':
+        values['blik_code'] = payload['details']['blik_code']
+    # Yarışan ikinci iş burada 0 satır görür: kargo etiketi bir kez oluşturulur
+    if not transition_payment(order, 'processing', values):
+        return {'approved': True, 'duplicate': True}
+    enqueue_job('create_tracking_label', {'order_id': order.id, 'payment_method': payload['payment_method']},
+                order_id=order.id)
+    return {'approved': True}
+
+@job_handler('create_tracking_label')
+def create_tracking_label_job(payload):
+    order = db.session.get(Order, payload['order_id'])
+    if order.tracking:
+        return {'tracking_number': order.tracking[0].tracking_number}
     
     # Kargo takip numarası oluştur
+    carrier, days = ('DHL', 3) if payload['payment_method'] == 'blik' else ('UPS', 2)
     tracking_number = f'TRK{random.randint(1000000000, 9999999999)}'
-    
     shipping = ShippingTracking(
         order_id=order.id,
         tracking_number=tracking_number,
-        carrier='DHL',
+        carrier=carrier,
         status='label_created',
-        estimated_delivery=datetime.utcnow().replace(hour=23, minute=59, second=59) + timedelta(days=3)
+        estimated_delivery=datetime.utcnow().replace(hour=23, minute=59, second=59) + timedelta(days=days)
     )
     db.session.add(shipping)
+    order.updated_at = datetime.utcnow()
+    order.version += 1
+    
+    first_stage = ORDER_STAGES[0]
+    enqueue_job('advance_order', {'order_id': order.id, 'status': first_stage['status']},
+                order_id=order.id, delay=first_stage['delay'])
+    return {'tracking_number': tracking_number}
+
+@job_handler('advance_order')
+def advance_order_job(payload):
+    order = db.session.get(Order, payload['order_id'])
+    statuses = [stage['status'] for stage in ORDER_STAGES]
+    target_index = statuses.index(payload['status'])
+    current_index = statuses.index(order.status) if order.status in statuses else -1
+    
+    # Sadece ileri gidilir; manuel simülasyon daha önce ilerlettiyse atlanır
+    if target_index > current_index:
+        order.status = payload['status']
+        order.updated_at = datetime.utcnow()
+        order.version += 1
+    
+    next_index = max(target_index, current_index) + 1
+    if next_index < len(ORDER_STAGES):
+        next_stage = ORDER_STAGES[next_index]
+        enqueue_job('advance_order', {'order_id': order.id, 'status': next_stage['status']},
+                    order_id=order.id, delay=next_stage['delay'])
+    return {'status': order.status}
+
+def start_payment(order, payment_method, details):
+    # Sadece bekleyen veya başarısız ödeme başlatılabilir; eşzamanlı ikinci istek 409 alır
+    if not transition_payment(order, PAYABLE_STATUSES, {'payment_method': payment_method,
+                                                        'payment_status': 'processing'}):
+        db.session.rollback()
+        message = 'Order is already paid.' if order.payment_status == 'completed' \
+            else 'Payment is already being processed.'
+        return jsonify({'success': False, 'message': message, 'payment_status': order.payment_status}), 409
+    job = enqueue_job('authorize_payment', {
+        'order_id': order.id, 'payment_method': payment_method, 'details': details
+    }, order_id=order.id)
     db.session.commit()
+    publish_order_update(order)
     
     return jsonify({
-        'success': True, 
-        'message': 'Payment successful!',
-        'tracking_number': tracking_number,
+        'success': True,
+        'message': 'Payment is being processed.',
+        'job_id': job.id,
         'order_number': order.order_number
-    })
+    }), 202
+
+# BLIK Ödeme
+@app.route('/pay_with_blik/<int:order_id>', methods=['POST'])
+@login_required
+@idempotent
+def pay_with_blik(order_id):
+    order = Order.query.get_or_404(order_id)
+    if order.user_id != session['user_id']:
+        return jsonify({'success': False, 'message': 'Unauthorized'})
+    
+    blik_code = request.form.get('blik_code', '')
+    
+    # BLIK kodu validasyonu (6 haneli rakam)
+    if not blik_code.isdigit() or len(blik_code) != 6:
+        return jsonify({'success': False, 'message': 'Invalid BLIK code. Must be 6 digits.'})
+    
+    # Yetkilendirme, kargo etiketi ve aşamalar arka planda işlenir
+    return start_payment(order, 'blik', {'blik_code': blik_code})
 
 # Kredi Kartı Ödeme - DÜZELTİLMİŞ
 @app.route('/pay_with_credit_card/<int:order_id>', methods=['POST'])
 @login_required
+@idempotent
 def pay_with_credit_card(order_id):
     order = Order.query.get_or_404(order_id)
     if order.user_id != session['user_id']:
@@ -678,52 +3108,128 @@ def pay_with_credit_card(order_id):
     
     # Kredi kartı bilgilerini al - request.form.get() kullan
     card_number = request.form.get('card_number', '').replace(' ', '')
-    expiry_date = request.form.get('expiry_date', '')
-    cvv = request.form.get('cvv', '')
     card_holder = request.form.get('card_holder', '')
     
     # Sadece 16 hane kontrolü (diğer alanlar zorunlu değil)
     if not card_number or len(card_number) != 16 or not card_number.isdigit():
         return jsonify({'success': False, 'message': 'Invalid card number. Must be 16 digits.'})
     
-    # Ödeme simülasyonu (HER ZAMAN BAŞARILI)
-    order.payment_status = 'completed'
-    order.status = 'paid'
-    order.updated_at = datetime.utcnow()
-    
-    # Kargo takip numarası oluştur
-    tracking_number = f'TRK{random.randint(1000000000, 9999999999)}'
-    
-    shipping = ShippingTracking(
-        order_id=order.id,
-        tracking_number=tracking_number,
-        carrier='UPS',
-        status='label_created',
-        estimated_delivery=datetime.utcnow().replace(hour=23, minute=59, second=59) + timedelta(days=2)
-    )
-    db.session.add(shipping)
-    db.session.commit()
-    
+    # Kart numarasının tamamı kuyruğa (veritabanına) yazılmaz
+    return start_payment(order, 'credit_card', {'card_last4': card_number[-4:], 'card_holder': card_holder})
+
+# İş durumu API
+@app.route('/api/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = Job.query.join(Order, Job.order_id == Order.id) \
+        .filter(Job.id == job_id, Order.user_id == session['user_id']).first_or_404()
     return jsonify({
-        'success': True, 
-        'message': 'Payment successful!',
-        'tracking_number': tracking_number,
-        'order_number': order.order_number
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': job.result,
+        'error': job.last_error
     })
 
 # Sipariş Takip
 @app.route('/order/<order_number>')
 @login_required
 def order_tracking(order_number):
-    order = Order.query.filter_by(order_number=order_number, user_id=session['user_id']).first_or_404()
+    order = load_order_detail(order_number, session['user_id'])
     return render_template('order_tracking.html', order=order)
 
+# Sipariş durum olayları (Server-Sent Events)
+class OrderEventBroker:
+    # Sipariş başına bir Condition; bekleyen bağlantılar CPU harcamadan uyur
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}  # order_number -> [condition, bekleyen sayısı, son payload]
+    
+    def publish(self, order_number, payload):
+        with self.lock:
+            channel = self.channels.get(order_number)
+            if channel is not None:
+                channel[2] = payload
+                channel[0].notify_all()
+    
+    def wait(self, order_number, version, timeout):
+        with self.lock:
+            channel = self.channels.setdefault(order_number, [threading.Condition(self.lock), 0, None])
+            channel[1] += 1
+            try:
+                channel[0].wait_for(lambda: channel[2] is not None and channel[2]['version'] > version, timeout)
+                return channel[2]
+            finally:
+                channel[1] -= 1
+                if channel[1] == 0:
+                    del self.channels[order_number]
+
+order_events = OrderEventBroker()
+
+def order_status_payload(order):
+    tracking = order.tracking[0] if order.tracking else None
+    return {
+        'version': order.version,
+        'status': order.status,
+        'payment_status': order.payment_status,
+        'tracking': {
+            'tracking_number': tracking.tracking_number,
+            'carrier': tracking.carrier,
+            'status': tracking.status,
+            'estimated_delivery': tracking.estimated_delivery.strftime('%B %d, %Y') if tracking.estimated_delivery else None
+        } if tracking else None
+    }
+
+def publish_order_update(order):
+    order_events.publish(order.order_number, order_status_payload(order))
+
+def format_order_event(payload):
+    return f"id: {payload['version']}\nevent: status\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/orders/<order_number>/events')
+@login_required
+def order_events_stream(order_number):
+    order = Order.query.filter_by(order_number=order_number, user_id=session['user_id']).first_or_404()
+    order_id = order.id
+    payload = order_status_payload(order)
+    version = request.args.get('version', type=int) or request.headers.get('Last-Event-ID', 0, type=int)
+    db.session.close()  # bekleme sırasında bağlantı tutulmaz
+    if payload['status'] == 'delivered' and payload['version'] <= version:
+        # Son durum istemcide: 204 EventSource'un yeniden bağlanmasını da durdurur
+        return '', 204
+    
+    def generate():
+        current = version
+        latest = payload
+        while True:
+            if latest is not None and latest['version'] > current:
+                current = latest['version']
+                yield format_order_event(latest)
+                if latest['status'] == 'delivered':
+                    return
+            else:
+                yield ': keepalive\n\n'
+            
+            latest = order_events.wait(order_number, current, app.config['ORDER_EVENTS_POLL_SECONDS'])
+            if latest is None or latest['version'] <= current:
+                # Başka bir worker süreci güncellemiş olabilir: tek indeksli sorgu
+                stored_version = db.session.query(Order.version).filter_by(id=order_id).scalar()
+                if stored_version is not None and stored_version > current:
+                    latest = order_status_payload(db.session.get(Order, order_id))
+                db.session.close()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Sipariş Geçmişi
 @app.route('/orders')
 @login_required
 def order_history():
-    orders = Order.query.filter_by(user_id=session['user_id']).order_by(Order.created_at.desc()).all()
-    return render_template('order_history.html', orders=orders)
+    orders, next_cursor = load_order_history(session['user_id'], request.args.get('after'))
+    return render_template('order_history.html', orders=orders, next_cursor=next_cursor)
 
 # Sipariş Simülasyon API
 @app.route('/api/simulate_order/<order_number>')
@@ -732,13 +3238,7 @@ def simulate_order(order_number):
     order = Order.query.filter_by(order_number=order_number, user_id=session['user_id']).first_or_404()
     
     # Sipariş durumunu güncelle (simülasyon)
-    stages = [
-        {'status': 'confirmed', 'message': 'Order confirmed', 'delay': 3},
-        {'status': 'processing', 'message': 'Preparing for shipment', 'delay': 5},
-        {'status': 'shipped', 'message': 'Shipped with DHL', 'delay': 8},
-        {'status': 'out_for_delivery', 'message': 'Out for delivery', 'delay': 12},
-        {'status': 'delivered', 'message': 'Delivered successfully', 'delay': 15}
-    ]
+    stages = ORDER_STAGES
     
     current_status = order.status
     current_index = next((i for i, stage in enumerate(stages) if stage['status'] == current_status), 0)
@@ -747,7 +3247,9 @@ def simulate_order(order_number):
         next_stage = stages[current_index + 1]
         order.status = next_stage['status']
         order.updated_at = datetime.utcnow()
+        order.version += 1
         db.session.commit()
+        publish_order_update(order)
     
     return jsonify({
         'success': True,
@@ -755,23 +3257,373 @@ def simulate_order(order_number):
         'message': f'Order status updated to {order.status}'
     })
 
+# Analitik: günlük özetler (kategori cirosu, ürün adetleri, ödeme yöntemi dağılımı,
+# puan trendi, sipariş durum hunisi). Sipariş özetleri (updated_at, id) değişiklik imleciyle
+# artımlı güncellenir: her siparişin özetlere yansıyan son hali AnalyticsOrderState'te
+# tutulur, değişen siparişin eski katkısı çıkarılıp yenisi eklenir. Aynı siparişi tekrar
+# işlemek sonucu değiştirmez; bu yüzden imleç her turda ANALYTICS_CURSOR_LAG kadar geriden başlar.
+ANALYTICS_ORDER_CURSOR = 'orders'
+ANALYTICS_EPOCH = datetime(1970, 1, 1)
+ANALYTICS_DEFAULT_DAYS = 30
+ANALYTICS_MAX_DAYS = 366
+ANALYTICS_TOP_PRODUCTS = 20
+ANALYTICS_FUNNEL = ['pending', 'paid'] + [stage['status'] for stage in ORDER_STAGES]
+analytics_lock = threading.Lock()
+
+def add_rollup_delta(deltas, key, **values):
+    entry = deltas.setdefault(key, dict.fromkeys(values, 0))
+    for name, value in values.items():
+        entry[name] += value
+
+# Artışlar tek bir executemany upsert ile yazılır (deltas: {birincil anahtar: {kolon: artış}})
+def apply_rollup_deltas(model, deltas):
+    if not deltas:
+        return
+    table = model.__table__
+    keys = [column.name for column in table.primary_key.columns]
+    rows = [dict(zip(keys, key), **values) for key, values in deltas.items()]
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: table.c[name] + stmt.excluded[name] for name in rows[0] if name not in keys}
+    )
+    db.session.execute(stmt, rows)
+
+def analytics_order_batch(position, limit):
+    query = db.session.query(Order.id, Order.created_at, Order.updated_at, Order.status,
+                             Order.payment_method, Order.payment_status, Order.total_amount)
+    return query.filter(tuple_(Order.updated_at, Order.id) > position) \
+        .order_by(Order.updated_at, Order.id).limit(limit).all()
+
+def apply_order_changes(orders):
+    state_table = AnalyticsOrderState.__table__
+    states = {row.order_id: row for row in db.session.execute(
+        select(state_table).where(state_table.c.order_id.in_([order.id for order in orders]))
+    )}
+    
+    status_deltas, payment_deltas, state_rows, paid_changes = {}, {}, [], {}
+    for order in orders:
+        new = {'order_id': order.id, 'day': order.created_at.date(), 'status': order.status or 'pending',
+               'payment_method': order.payment_method or 'unknown',
+               'paid': order.payment_status == 'completed', 'total': order.total_amount}
+        old = states.get(order.id)
+        if old is not None:
+            if (old.status, old.payment_method, old.paid, old.total) == \
+                    (new['status'], new['payment_method'], new['paid'], new['total']):
+                continue
+            add_rollup_delta(status_deltas, (old.day, old.status), orders=-1)
+            add_rollup_delta(payment_deltas, (old.day, old.payment_method), orders=-1,
+                             paid_orders=-int(old.paid), revenue=-old.total if old.paid else 0.0)
+        add_rollup_delta(status_deltas, (new['day'], new['status']), orders=1)
+        add_rollup_delta(payment_deltas, (new['day'], new['payment_method']), orders=1,
+                         paid_orders=int(new['paid']), revenue=new['total'] if new['paid'] else 0.0)
+        # Kalem bazlı özetler (kategori/ürün) sadece ödendi bilgisi değişince etkilenir
+        was_paid = old is not None and old.paid
+        if new['paid'] != was_paid:
+            paid_changes[order.id] = (new['day'], 1 if new['paid'] else -1)
+        state_rows.append(new)
+    
+    category_deltas, product_deltas = {}, {}
+    if paid_changes:
+        items = db.session.execute(
+            select(OrderItem.order_id, OrderItem.product_id, Product.category_id, OrderItem.quantity, OrderItem.price)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id.in_(list(paid_changes)))
+        )
+        for order_id, product_id, category_id, quantity, price in items:
+            day, sign = paid_changes[order_id]
+            add_rollup_delta(category_deltas, (day, category_id or 0),
+                             revenue=sign * price * quantity, units=sign * quantity)
+            add_rollup_delta(product_deltas, (day, product_id),
+                             revenue=sign * price * quantity, units=sign * quantity)
+    
+    apply_rollup_deltas(OrderDailyStatus, status_deltas)
+    apply_rollup_deltas(SalesDailyPayment, payment_deltas)
+    apply_rollup_deltas(SalesDailyCategory, category_deltas)
+    apply_rollup_deltas(SalesDailyProduct, product_deltas)
+    if state_rows:
+        stmt = sqlite_insert(state_table)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['order_id'],
+            set_={name: stmt.excluded[name] for name in ('day', 'status', 'payment_method', 'paid', 'total')}
+        ), state_rows)
+    return len(state_rows)
+
+# Tüm özetleri ham tablolardan küme bazlı SQL ile yeniden oluşturma (ilk kurulum / onarım)
+ANALYTICS_REBUILD_SQL = [
+    "INSERT INTO analytics_order_state (order_id, day, status, payment_method, paid, total) "
+    "SELECT id, date(created_at), coalesce(status, 'pending'), coalesce(payment_method, 'unknown'), "
+    "payment_status IS 'completed', total_amount FROM \"order\"",
+    "INSERT INTO order_daily_status (day, status, orders) "
+    "SELECT day, status, count(*) FROM analytics_order_state GROUP BY day, status",
+    "INSERT INTO sales_daily_payment (day, payment_method, orders, paid_orders, revenue) "
+    "SELECT day, payment_method, count(*), sum(paid), sum(CASE WHEN paid THEN total ELSE 0 END) "
+    "FROM analytics_order_state GROUP BY day, payment_method",
+    "INSERT INTO sales_daily_category (day, category_id, revenue, units) "
+    "SELECT s.day, coalesce(p.category_id, 0), sum(i.price * i.quantity), sum(i.quantity) "
+    "FROM analytics_order_state s JOIN order_item i ON i.order_id = s.order_id "
+    "JOIN product p ON p.id = i.product_id WHERE s.paid GROUP BY s.day, coalesce(p.category_id, 0)",
+    "INSERT INTO sales_daily_product (day, product_id, revenue, units) "
+    "SELECT s.day, i.product_id, sum(i.price * i.quantity), sum(i.quantity) "
+    "FROM analytics_order_state s JOIN order_item i ON i.order_id = s.order_id "
+    "WHERE s.paid GROUP BY s.day, i.product_id",
+    "INSERT INTO review_daily_rating (day, rating_count, rating_sum) "
+    "SELECT date(created_at), count(*), sum(rating) FROM review WHERE is_approved GROUP BY date(created_at)"
+]
+
+def rebuild_analytics():
+    started = time.perf_counter()
+    with analytics_lock:
+        # Önce silme: yazma kilidi alınır, okunan anlık görüntü ile imleç tutarlı kalır
+        for model in (AnalyticsCursor, AnalyticsOrderState, OrderDailyStatus, SalesDailyPayment,
+                      SalesDailyCategory, SalesDailyProduct, ReviewDailyRating):
+            db.session.execute(model.__table__.delete())
+        for statement in ANALYTICS_REBUILD_SQL:
+            db.session.execute(text(statement))
+        
+        last = db.session.query(Order.updated_at, Order.id) \
+            .order_by(Order.updated_at.desc(), Order.id.desc()).first()
+        db.session.add(AnalyticsCursor(name=ANALYTICS_ORDER_CURSOR, updated_at=last[0] if last else ANALYTICS_EPOCH,
+                                       last_id=last[1] if last else 0))
+        orders = db.session.query(func.count(AnalyticsOrderState.order_id)).scalar()
+        db.session.commit()
+    return {'mode': 'rebuild', 'orders': orders, 'seconds': round(time.perf_counter() - started, 3)}
+
+def refresh_analytics(batch_size=None):
+    batch_size = batch_size or app.config['ANALYTICS_BATCH_SIZE']
+    if db.session.get(AnalyticsCursor, ANALYTICS_ORDER_CURSOR) is None:
+        return rebuild_analytics()
+    
+    started = time.perf_counter()
+    scanned = changed = 0
+    with analytics_lock:
+        cursor = db.session.get(AnalyticsCursor, ANALYTICS_ORDER_CURSOR)
+        position = (max(cursor.updated_at - timedelta(seconds=app.config['ANALYTICS_CURSOR_LAG']),
+                        ANALYTICS_EPOCH), 0)
+        while True:
+            orders = analytics_order_batch(position, batch_size)
+            if not orders:
+                break
+            changed += apply_order_changes(orders)
+            scanned += len(orders)
+            position = (orders[-1].updated_at, orders[-1].id)
+            # Özet satırları ile imleç aynı transaction'da yazılır
+            if position > (cursor.updated_at, cursor.last_id):
+                cursor.updated_at, cursor.last_id = position
+            db.session.commit()
+    return {'mode': 'incremental', 'scanned': scanned, 'changed': changed,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+@app.cli.command('refresh-analytics')
+@click.option('--rebuild', is_flag=True, help='Özetleri ham tablolardan baştan oluştur')
+def refresh_analytics_command(rebuild):
+    """Analitik günlük özetlerini sipariş değişiklik imlecinden günceller (cron ile çalıştırılır)."""
+    click.echo(json.dumps(rebuild_analytics() if rebuild else refresh_analytics()))
+
+# Analitik raporları (yalnızca özet tablolarından okunur)
+def report_category_revenue(start, end):
+    rows = db.session.query(SalesDailyCategory.day, Category.slug, SalesDailyCategory.revenue, SalesDailyCategory.units) \
+        .outerjoin(Category, Category.id == SalesDailyCategory.category_id) \
+        .filter(SalesDailyCategory.day.between(start, end), SalesDailyCategory.units != 0) \
+        .order_by(SalesDailyCategory.day, SalesDailyCategory.category_id).all()
+    return [{'day': day.isoformat(), 'category': slug, 'revenue': round(revenue, 2), 'units': units}
+            for day, slug, revenue, units in rows]
+
+def report_product_units(start, end):
+    product_id = request.args.get('product_id', type=int)
+    if product_id:
+        # Tek ürünün günlük serisi
+        rows = db.session.query(SalesDailyProduct.day, SalesDailyProduct.units, SalesDailyProduct.revenue) \
+            .filter(SalesDailyProduct.product_id == product_id, SalesDailyProduct.day.between(start, end)) \
+            .order_by(SalesDailyProduct.day).all()
+        return [{'day': day.isoformat(), 'product_id': product_id, 'units': units, 'revenue': round(revenue, 2)}
+                for day, units, revenue in rows]
+    
+    limit = min(max(request.args.get('limit', ANALYTICS_TOP_PRODUCTS, type=int), 1), API_MAX_LIMIT)
+    units = func.sum(SalesDailyProduct.units).label('units')
+    rows = db.session.query(SalesDailyProduct.product_id, units, func.sum(SalesDailyProduct.revenue)) \
+        .filter(SalesDailyProduct.day.between(start, end)) \
+        .group_by(SalesDailyProduct.product_id).having(units > 0) \
+        .order_by(units.desc(), SalesDailyProduct.product_id).limit(limit).all()
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_([row[0] for row in rows])))
+    return [{'product_id': product_id, 'name': names.get(product_id), 'units': units, 'revenue': round(revenue, 2)}
+            for product_id, units, revenue in rows]
+
+def report_payment_mix(start, end):
+    rows = SalesDailyPayment.query.filter(SalesDailyPayment.day.between(start, end), SalesDailyPayment.orders != 0) \
+        .order_by(SalesDailyPayment.day, SalesDailyPayment.payment_method).all()
+    return [{'day': row.day.isoformat(), 'payment_method': row.payment_method, 'orders': row.orders,
+             'paid_orders': row.paid_orders, 'revenue': round(row.revenue, 2)} for row in rows]
+
+def report_rating_trend(start, end):
+    rows = ReviewDailyRating.query.filter(ReviewDailyRating.day.between(start, end), ReviewDailyRating.rating_count > 0) \
+        .order_by(ReviewDailyRating.day).all()
+    return [{'day': row.day.isoformat(), 'reviews': row.rating_count,
+             'average': round(row.rating_sum / row.rating_count, 2)} for row in rows]
+
+def report_order_funnel(start, end):
+    # Huni: seçili günlerde oluşturulan siparişlerin şu anki durumuna göre her aşamaya ulaşan sayı
+    counts = dict(db.session.query(OrderDailyStatus.status, func.sum(OrderDailyStatus.orders))
+                  .filter(OrderDailyStatus.day.between(start, end)).group_by(OrderDailyStatus.status))
+    rows, reached = [], 0
+    for status in reversed(ANALYTICS_FUNNEL):
+        reached += counts.pop(status, 0)
+        rows.append({'status': status, 'orders': reached})
+    rows.reverse()
+    return rows + [{'status': status, 'orders': orders} for status, orders in sorted(counts.items()) if orders]
+
+ANALYTICS_REPORTS = {
+    'category-revenue': report_category_revenue,
+    'product-units': report_product_units,
+    'payment-mix': report_payment_mix,
+    'ratings': report_rating_trend,
+    'funnel': report_order_funnel
+}
+
+# ANALYTICS_API_TOKEN tanımlı değilse API kapalıdır (Authorization: Bearer <token>)
+def analytics_token_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = app.config['ANALYTICS_API_TOKEN']
+        if not token:
+            abort(404)
+        supplied = request.headers.get('Authorization', '')
+        if not secrets.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return jsonify({'success': False, 'message': 'Invalid analytics token'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.route('/api/analytics/<report>')
+@analytics_token_required
+def api_analytics(report):
+    if report not in ANALYTICS_REPORTS:
+        abort(404)
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') \
+            else end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    if start > end or (end - start).days >= ANALYTICS_MAX_DAYS:
+        return jsonify({'success': False, 'message': f'Range must be 1-{ANALYTICS_MAX_DAYS} days'}), 400
+    
+    cursor = db.session.get(AnalyticsCursor, ANALYTICS_ORDER_CURSOR)
+    return jsonify({
+        'report': report,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        # Sipariş özetleri bu ana kadarki değişiklikleri içerir
+        'refreshed_through': cursor.updated_at.isoformat() + 'Z' if cursor else None,
+        'rows': ANALYTICS_REPORTS[report](start, end)
+    })
+
 # API Endpoint - Ürün Listesi
+API_PRODUCT_FIELDS = ('id', 'name', 'price', 'currency', 'image_url', 'images', 'category', 'description')
+API_DEFAULT_FIELDS = ('id', 'name', 'price', 'currency', 'image_url', 'category')
+API_MAX_LIMIT = 200
+API_EXPORT_BATCH = 1000
+
+def catalog_version():
+    # Katalog değiştiğinde ETag ve Last-Modified da değişir
+    count, max_id, last_modified = db.session.query(
+        func.count(Product.id),
+        func.max(Product.id),
+        func.max(func.coalesce(Product.updated_at, Product.created_at))
+    ).one()
+    if isinstance(last_modified, str):
+        last_modified = datetime.fromisoformat(last_modified)
+    return f'{count}-{max_id}-{last_modified}', last_modified
+
+def fetch_product_rows(fields, after=0, limit=API_EXPORT_BATCH):
+    columns = [getattr(Product, field) for field in fields]
+    if 'id' not in fields:
+        columns.append(Product.id)
+    rows = db.session.query(*columns).filter(Product.id > after) \
+        .order_by(Product.id).limit(limit).all()
+    return rows
+
+def stream_products_json(fields):
+    # Tüm katalog, id üzerinden parça parça (keyset) okunur; bellek sabit kalır
+    yield '['
+    after = 0
+    first = True
+    while True:
+        rows = fetch_product_rows(fields, after)
+        if not rows:
+            break
+        for row in rows:
+            yield ('' if first else ',') + json.dumps({field: getattr(row, field) for field in fields})
+            first = False
+        after = rows[-1].id
+    yield ']'
+
 @app.route('/api/products')
 def api_products():
-    products = Product.query.all()
-    return jsonify([{
-        'id': p.id,
-        'name': p.name,
-        'price': p.price,
-        'currency': p.currency,
-        'image_url': p.image_url,
-        'category': p.category
-    } for p in products])
+    fields = API_DEFAULT_FIELDS
+    if request.args.get('fields'):
+        fields = tuple(field.strip() for field in request.args['fields'].split(',') if field.strip())
+        unknown = [field for field in fields if field not in API_PRODUCT_FIELDS]
+        if unknown or not fields:
+            return jsonify({'success': False, 'message': f'Unknown fields: {", ".join(unknown)}'}), 400
+    
+    version, last_modified = catalog_version()
+    etag = hashlib.sha1(f'{version}|{request.query_string.decode()}'.encode()).hexdigest()
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    elif 'limit' in request.args or 'after' in request.args:
+        # Sayfalı mod: ?after=<son id>&limit=50
+        limit = min(max(request.args.get('limit', 50, type=int), 1), API_MAX_LIMIT)
+        after = request.args.get('after', 0, type=int)
+        rows = fetch_product_rows(fields, after, limit)
+        response = jsonify({
+            'products': [{field: getattr(row, field) for field in fields} for row in rows],
+            'next_after': rows[-1].id if len(rows) == limit else None
+        })
+    else:
+        # Tam dışa aktarım: akış (streaming) JSON
+        response = Response(stream_with_context(stream_products_json(fields)),
+                            mimetype='application/json')
+    
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+# Eski str(list) formatındaki resim listelerini JSON'a taşıma (tek seferlik)
+def migrate_product_images():
+    rows = db.session.execute(
+        text("SELECT id, images FROM product WHERE images IS NOT NULL AND NOT json_valid(images)")
+    ).fetchall()
+    
+    updates = []
+    for product_id, images in rows:
+        try:
+            image_list = [str(image) for image in ast.literal_eval(images)]
+        except (ValueError, SyntaxError):
+            image_list = []
+        updates.append({'id': product_id, 'images': json.dumps(image_list)})
+    
+    if updates:
+        db.session.execute(text("UPDATE product SET images = :images WHERE id = :id"), updates)
+        db.session.commit()
+        invalidate_page_cache()
+    return len(updates)
 
 # Veritabanı init fonksiyonu
 def init_database():
     with app.app_context():
         db.create_all()
+        added = ensure_columns()
+        if added:
+            print(f"Eksik sütunlar eklendi: {', '.join(added)}")
+            if 'product.stock' in added:
+                print("Mevcut ürünlerin stoğu 0: 'flask --app app restock PRODUCT_ID QUANTITY' ile stok girin.")
+        merge_duplicate_cart_rows()
+        ensure_indexes()
+        
+        migrated = migrate_product_images()
+        if migrated:
+            print(f"{migrated} ürünün resim listesi JSON formatına taşındı.")
         
         categories = [
             'smartphones', 'laptops', 'fragrances', 'skincare', 
@@ -786,9 +3638,38 @@ def init_database():
             if not Category.query.filter_by(slug=cat).first():
                 category = Category(name=cat.replace('-', ' ').title(), slug=cat)
                 db.session.add(category)
+        # Arama indeksi ayrı bağlantıyla yazılır: oturumun yazma kilidi burada bırakılmalı
+        db.session.commit()
         
         if Product.query.count() == 0:
             fetch_products_from_api()
+        elif db.engine.dialect.name == 'sqlite' and \
+                db.session.execute(text("SELECT count(*) FROM product_search")).scalar() == 0:
+            # Eski veritabanı: mevcut ürünleri indekse al
+            rebuild_search_index()
+        
+        sync_product_categories()
+        
+        if ProductRating.query.count() == 0 and Review.query.count() > 0:
+            rebuild_product_ratings()
+        
+        if OrderSequence.query.count() == 0 and Order.query.count() > 0:
+            seed_order_sequences()
+        
+        summarized = backfill_order_summaries()
+        if summarized:
+            print(f"{summarized} sipariş için geçmiş özeti oluşturuldu.")
+        
+        if AnalyticsCursor.query.first() is None:
+            stats = rebuild_analytics()
+            print(f"{stats['orders']} sipariş analitik özetlerine işlendi.")
+        
+        evict_guest_carts()
+        evict_idempotency_keys()
+        
+        if np is not None and ProductRecommendation.query.first() is None and Product.query.first() is not None:
+            stats = build_recommendations()
+            print(f"{stats['products']} ürün için öneriler derlendi ({stats['seconds']} sn).")
         
         if User.query.count() == 0:
             admin = User(username='admin', email='admin@omimas.pl', first_name='Admin', last_name='User')
@@ -801,4 +3682,12 @@ def init_database():
 
 if __name__ == '__main__':
     init_database()
-    app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
+    debug = True
+    # Debug modunda reloader ana süreci yalnızca izler, uygulamayı çocuk süreç (WERKZEUG_RUN_MAIN) çalıştırır;
+    # arka plan thread'leri ana süreçte de başlarsa işler ve rezervasyonlar iki kez işlenir
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if app.config['JOB_WORKER_THREADS']:
+            JobWorkerPool(app.config['JOB_WORKER_THREADS']).start()
+        if app.config['RESERVATION_SWEEP_INTERVAL']:
+            ReservationSweeper().start()
+    app.run(debug=debug, port=5000, host='0.0.0.0')
\ No newline at end of file
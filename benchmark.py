@@ -0,0 +1,804 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+try:
+    import resource  # isteğe bağlı: yoksa (Windows) öneri derlemesinin RSS artışı raporlanmaz
+except ImportError:
+    resource = None
+
+# Benchmark her zaman geçici bir SQLite dosyası üzerinde çalışır (database.db'ye dokunulmaz)
+parser = argparse.ArgumentParser(description='Omimas mağaza ve ödeme akışları için yük testi')
+parser.add_argument('--products', type=int, default=1000, help='Sentetik ürün sayısı (1k - 1M)')
+parser.add_argument('--users', type=int, default=100, help='Sentetik kullanıcı sayısı')
+parser.add_argument('--reviews', type=int, default=5000, help='Sentetik yorum sayısı')
+parser.add_argument('--orders', type=int, default=2000, help='Geçmiş sipariş sayısı')
+parser.add_argument('--heavy-user-orders', type=int, default=5000,
+                    help='Sipariş geçmişi senaryosu için tek bir kullanıcıya ait sipariş sayısı')
+parser.add_argument('--analytics-samples', type=int, default=20,
+                    help='Analitik raporu başına ölçüm tekrarı (özet tablosu ve ham satırlar)')
+parser.add_argument('--search-samples', type=int, default=50,
+                    help='Arama karşılaştırmasında (FTS5 ve eski ilike taraması) sorgu başına ölçüm tekrarı')
+parser.add_argument('--api-rows', type=int, nargs='*', default=[10000, 100000, 1000000],
+                    help='/api/products ölçümü için katalog boyutları (katalog sırayla bu boyutlara büyütülür; '
+                         'boş bırakılırsa ölçülmez)')
+parser.add_argument('--mix-seconds', type=float, default=10,
+                    help='Okuma/yazma karışımı (16 okuyucu + 4 sipariş yazıcısı) profil başına süre (sn); 0: ölçülmez')
+parser.add_argument('--image-parse-iterations', type=int, default=100000,
+                    help='Resim listesi ayrıştırma karşılaştırmasında (ast.literal_eval ve json.loads) tekrar sayısı; '
+                         '0: ölçülmez')
+parser.add_argument('--guest-cart-samples', type=int, default=20,
+                    help='Misafir sepeti başlık ölçümünde (1/20/100 kalem) sepet boyutu başına add_to_cart sayısı; '
+                         '0: ölçülmez')
+parser.add_argument('--metrics-samples', type=int, default=200,
+                    help='METRICS_ENABLED kapalı/açık karşılaştırmasında sayfa başına istek sayısı; 0: ölçülmez')
+parser.add_argument('--recommendation-order-lines', type=int, default=1000000,
+                    help='Öneri derlemesi ölçümünden önce sipariş kalemi tablosunun büyütüleceği satır sayısı; '
+                         '0: ölçülmez (numpy/scipy gerekir)')
+parser.add_argument('--iterations', type=int, default=50, help='Sanal kullanıcı başına senaryo tekrarı')
+parser.add_argument('--concurrency', type=int, default=1, help='Paralel sanal kullanıcı (thread) sayısı')
+parser.add_argument('--page-cache', choices=['memory', 'none'], default='memory', help='Sayfa önbelleği')
+parser.add_argument('--seed', type=int, default=42)
+parser.add_argument('--database', help='SQLite dosyası (varsayılan: geçici dosya)')
+parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+args = parser.parse_args()
+
+database_path = args.database or os.path.join(tempfile.mkdtemp(prefix='omimas-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database_path)
+
+import app as shop
+from app import app, db, Product, Category, User, Review, Order, OrderItem
+from flask import jsonify
+from sqlalchemy import func, or_, text
+from werkzeug.security import generate_password_hash
+
+app.config['TESTING'] = True
+app.config['SQL_QUERY_COUNT_HEADER'] = True
+app.config['PAYMENT_GATEWAY_URL'] = None
+# Tüm sanal kullanıcılar aynı IP'den ve aynı hesaplarla girer
+shop.login_ip_limiter = shop.login_user_limiter = None
+if args.page_cache == 'none':
+    shop.page_cache = None
+
+PRODUCTION_PRAGMAS = dict(app.config['SQLITE_PRAGMAS'])
+
+# DummyJSON'a hiçbir zaman gidilmez
+shop.fetch_catalog = lambda *a, **kw: []
+
+CATEGORIES = ['smartphones', 'laptops', 'fragrances', 'skincare', 'groceries', 'home-decoration',
+              'furniture', 'tops', 'womens-dresses', 'womens-shoes', 'mens-shirts', 'mens-shoes',
+              'mens-watches', 'womens-watches', 'womens-bags', 'womens-jewellery', 'sunglasses',
+              'automotive', 'motorcycle', 'lighting']
+WORDS = ['lampa', 'telefon', 'zegarek', 'koszula', 'buty', 'torba', 'perfumy', 'krem', 'stół', 'krzesło',
+         'żółty', 'czerwony', 'niebieski', 'skórzany', 'bawełniany', 'łazienka', 'ogród', 'kuchnia',
+         'sport', 'klasyczny', 'nowoczesny', 'mały', 'duży', 'premium', 'eko']
+USER_PASSWORD = 'benchpass'
+HEAVY_USER_ID = args.users + 1
+HEAVY_HISTORY_PAGES = 5
+SETTLED_STATUSES = ['paid'] + [stage['status'] for stage in shop.ORDER_STAGES]
+ANALYTICS_TOKEN = 'bench-analytics'
+ANALYTICS_RANGE_DAYS = 30
+ANALYTICS_CHANGED_ORDERS = 1000
+# Aynı rakamların ham satırlardan hesaplanması (özet tablolarıyla karşılaştırma için)
+RAW_ANALYTICS_SQL = {
+    'category-revenue':
+        "SELECT date(o.created_at), p.category_id, sum(i.price * i.quantity), sum(i.quantity) "
+        "FROM \"order\" o JOIN order_item i ON i.order_id = o.id JOIN product p ON p.id = i.product_id "
+        "WHERE o.payment_status = 'completed' AND o.created_at >= :start AND o.created_at < :end "
+        "GROUP BY date(o.created_at), p.category_id",
+    'product-units':
+        "SELECT i.product_id, sum(i.quantity) AS units, sum(i.price * i.quantity) "
+        "FROM \"order\" o JOIN order_item i ON i.order_id = o.id "
+        "WHERE o.payment_status = 'completed' AND o.created_at >= :start AND o.created_at < :end "
+        "GROUP BY i.product_id ORDER BY units DESC, i.product_id LIMIT 20",
+    'payment-mix':
+        "SELECT date(created_at), payment_method, count(*), sum(payment_status = 'completed'), "
+        "sum(CASE WHEN payment_status = 'completed' THEN total_amount ELSE 0 END) FROM \"order\" "
+        "WHERE created_at >= :start AND created_at < :end GROUP BY date(created_at), payment_method",
+    'ratings':
+        "SELECT date(created_at), count(*), avg(rating) FROM review "
+        "WHERE is_approved AND created_at >= :start AND created_at < :end GROUP BY date(created_at)",
+    'funnel':
+        "SELECT status, count(*) FROM \"order\" WHERE created_at >= :start AND created_at < :end GROUP BY status"
+}
+# Arama karşılaştırması: önek, tam kelime, iki kelime ve aksansız yazım (FTS katlar, ilike katlamaz)
+SEARCH_TERMS = ['lamp', 'tele', 'zegarek', 'krem stół', 'zolty', 'skórzany buty']
+# Eski /api/products (Product.query.all() + tek JSON listesi) bu boyuta kadar ölçülür; 1M satırda ORM
+# nesneleri birkaç GB bellek ister
+LEGACY_API_MAX_ROWS = 100000
+API_PAGE_LIMIT = 50
+# Okuma/yazma karışımı: SQLite varsayılanları ve ikincil indeks yok (önce) ile SQLITE_PRAGMAS ve
+# modeldeki indeksler (sonra). busy_timeout verilmezse pysqlite'ın 5 sn'lik beklemesi geçerlidir.
+MIX_READERS = 16
+MIX_WRITERS = 4
+BASELINE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+BATCH = 5000
+# Misafir sepeti sunucu tablosunda: çerez ve Set-Cookie kalem sayısıyla büyümemeli (eski sepet imzalı
+# oturum çerezinin içindeydi, karşılaştırma için o çerezin boyutu da hesaplanır)
+GUEST_CART_SIZES = (1, 20, 100)
+# Öneri derlemesi: büyütme siparişleri ve artımlı derlemeden önce gelen yeni siparişler (3'er kalem)
+RECOMMENDATION_ORDER_LINES = 3
+RECOMMENDATION_NEW_ORDERS = 100
+METRICS_PAGES = {'index': '/', 'product_detail': '/product/1', 'category': f'/category/{CATEGORIES[0]}',
+                 'search': '/search?q=lamp'}
+# DummyJSON ürünlerindeki gibi bir resim listesi; eski şema str(list), yeni JSON sütunu json.dumps ile saklar
+IMAGE_LIST = [f'https://cdn.dummyjson.com/products/images/{CATEGORIES[0]}/Product%20Name/{i}.png' for i in range(1, 5)]
+
+
+def batched(rows):
+    for start in range(0, len(rows), BATCH):
+        yield rows[start:start + BATCH]
+
+
+def seed_database(rng):
+    started = time.perf_counter()
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(Category.__table__.insert(), [
+        {'name': cat.replace('-', ' ').title(), 'slug': cat} for cat in CATEGORIES
+    ])
+
+    now = datetime.utcnow()
+    for start in range(0, args.products, BATCH):
+        products, search_rows = [], []
+        for product_id in range(start + 1, min(start + BATCH, args.products) + 1):
+            name = ' '.join(rng.sample(WORDS, 3)).capitalize() + f' {product_id}'
+            description = ' '.join(rng.choices(WORDS, k=12))
+            products.append({
+                'id': product_id, 'name': name, 'price': round(rng.uniform(5, 5000), 2),
+                'currency': 'PLN', 'image_url': f'https://cdn.example.com/{product_id}.jpg', 'stock': 10 ** 6,
+                'category': rng.choice(CATEGORIES), 'description': description,
+                'images': [f'https://cdn.example.com/{product_id}-{i}.jpg' for i in range(3)],
+                'created_at': now - timedelta(minutes=product_id), 'updated_at': now
+            })
+            search_rows.append({'id': product_id, 'name': shop.fold_search_text(name),
+                                'description': shop.fold_search_text(description)})
+        db.session.execute(Product.__table__.insert(), products)
+        db.session.execute(text(
+            "INSERT INTO product_search (rowid, name, description) VALUES (:id, :name, :description)"
+        ), search_rows)
+
+    shop.sync_product_categories()
+
+    password_hash = generate_password_hash(USER_PASSWORD, app.config['PASSWORD_HASH_METHOD'])
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@omimas.pl',
+         'password_hash': password_hash, 'created_at': now, 'is_active': True}
+        for i in range(1, args.users + 1)
+    ])
+
+    reviews = [{'product_id': rng.randint(1, args.products), 'user_id': rng.randint(1, args.users),
+                'rating': rng.randint(1, 5), 'comment': 'Synthetic benchmark review.',
+                'created_at': now - timedelta(days=rng.randint(0, 364)), 'is_approved': True}
+               for _ in range(args.reviews)]
+    for chunk in batched(reviews):
+        db.session.execute(Review.__table__.insert(), chunk)
+
+    # Çok siparişli müşteri (sipariş geçmişi sayfalaması için)
+    db.session.execute(User.__table__.insert(), [
+        {'id': HEAVY_USER_ID, 'username': 'bench-heavy', 'email': 'bench-heavy@omimas.pl',
+         'password_hash': password_hash, 'created_at': now, 'is_active': True}
+    ])
+
+    # Siparişler parça parça yazılır (10M kalem bellekte tutulmaz); durum ve ödeme
+    # dağılımı analitik özetleri için gerçekçi tutulur
+    last_order_id = args.orders + args.heavy_user_orders
+    for start in range(1, last_order_id + 1, BATCH):
+        orders, items = [], []
+        for order_id in range(start, min(start + BATCH, last_order_id + 1)):
+            created_at = now - timedelta(days=order_id % 365)
+            user_id = rng.randint(1, args.users) if order_id <= args.orders else HEAVY_USER_ID
+            order_items = [{'order_id': order_id, 'product_id': rng.randint(1, args.products),
+                            'quantity': rng.randint(1, 3), 'price': round(rng.uniform(5, 500), 2)}
+                           for _ in range(rng.randint(1, 4))]
+            payment_status = rng.choices(['completed', 'failed', 'pending'], [85, 5, 10])[0]
+            status = rng.choice(SETTLED_STATUSES) if payment_status == 'completed' else 'pending'
+            orders.append({'id': order_id, 'order_number': f'BM{created_at:%Y%m%d}-{order_id:06d}',
+                           'user_id': user_id,
+                           'total_amount': round(sum(item['price'] * item['quantity'] for item in order_items), 2),
+                           'status': status, 'payment_method': rng.choice(['blik', 'credit_card']),
+                           'payment_status': payment_status, 'shipping_address': 'Warsaw',
+                           'created_at': created_at, 'updated_at': created_at, 'version': 1})
+            items.extend(order_items)
+        db.session.execute(Order.__table__.insert(), orders)
+        db.session.execute(OrderItem.__table__.insert(), items)
+
+    db.session.commit()
+    shop.backfill_order_summaries()
+    shop.rebuild_product_ratings()
+    shop.rebuild_analytics()
+    if shop.np is not None:
+        shop.build_recommendations()
+    shop.invalidate_page_cache()
+    return time.perf_counter() - started
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, elapsed, response):
+        sql_count = int(response.headers.get('X-SQL-Query-Count', 0))
+        failed = response.status_code >= 400 or (response.is_json and response.json.get('success') is False)
+        with self.lock:
+            self.samples.setdefault(name, []).append((elapsed, sql_count, failed))
+
+
+def timed(recorder, name, call, *a, **kw):
+    started = time.perf_counter()
+    response = call(*a, **kw)
+    recorder.record(name, time.perf_counter() - started, response)
+    return response
+
+
+def run_virtual_user(worker_id, recorder, rng):
+    for iteration in range(args.iterations):
+        client = app.test_client()
+        user_id = rng.randint(1, args.users)
+        product_ids = [rng.randint(1, args.products) for _ in range(3)]
+
+        # Misafir gezinme
+        timed(recorder, 'index', client.get, '/')
+        timed(recorder, 'search', client.get, '/search', query_string={'q': rng.choice(WORDS)[:4]})
+        timed(recorder, 'category', client.get, f'/category/{rng.choice(CATEGORIES)}',
+              query_string={'sort': rng.choice(list(shop.LISTING_SORTS))})
+        timed(recorder, 'product_detail', client.get, f'/product/{product_ids[0]}')
+        for product_id in product_ids[:2]:
+            timed(recorder, 'add_to_cart_guest', client.post, f'/add_to_cart/{product_id}', data={'quantity': 1})
+        timed(recorder, 'cart_guest', client.get, '/cart')
+
+        # Giriş ve ödeme
+        timed(recorder, 'login', client.post, '/login',
+              data={'username': f'bench{user_id}', 'password': USER_PASSWORD})
+        timed(recorder, 'transfer_guest_cart', client.get, '/transfer_guest_cart')
+        timed(recorder, 'checkout', client.get, '/checkout')
+
+        payment_method = 'blik' if iteration % 2 == 0 else 'credit_card'
+        response = timed(recorder, 'create_order', client.post, '/create_order',
+                         data={'shipping_address': 'Warsaw', 'payment_method': payment_method})
+        if response.is_json and response.json.get('success'):
+            order_id = response.json['order_id']
+            if payment_method == 'blik':
+                timed(recorder, 'pay_with_blik', client.post, f'/pay_with_blik/{order_id}',
+                      data={'blik_code': '123456'})
+            else:
+                timed(recorder, 'pay_with_credit_card', client.post, f'/pay_with_credit_card/{order_id}',
+                      data={'card_number': '4111111111111111'})
+        timed(recorder, 'order_history', client.get, '/orders')
+
+
+def run_heavy_history(recorder):
+    # bench-heavy'nin sipariş geçmişi: ilk sayfa ve imleçle birkaç eski sayfa
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = HEAVY_USER_ID
+        session['username'] = 'bench-heavy'
+    for _ in range(args.iterations):
+        response = timed(recorder, 'order_history_heavy', client.get, '/orders')
+        for _ in range(HEAVY_HISTORY_PAGES):
+            match = re.search(r'after=([^"&]+)', response.get_data(as_text=True))
+            if not match:
+                break
+            response = timed(recorder, 'order_history_heavy_next', client.get, '/orders',
+                             query_string={'after': match.group(1)})
+
+
+def measure_page_weight():
+    # Sayfa başına aktarılan bayt: ilk ziyaret (HTML + yerel CSS/JS, sıkıştırılmış) ve
+    # tekrar ziyaret (immutable olmayan dosyalar 304 ile doğrulanır, gövde yok)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'bench1'
+    with app.app_context():
+        order_number = Order.query.filter_by(user_id=1).with_entities(Order.order_number).first()
+    pages = {'index': '/', 'product_detail': '/product/1', 'category': f'/category/{CATEGORIES[0]}',
+             'search': '/search?q=lamp', 'cart': '/cart', 'order_history': '/orders', 'account': '/account'}
+    if order_number:
+        pages['order_tracking'] = f'/order/{order_number[0]}'
+
+    report = {}
+    for name, page in pages.items():
+        response = client.get(page)
+        html_bytes = len(response.get_data())
+        asset_bytes = 0
+        for url in re.findall(r'(?:href|src)="(/(?:static|assets)/[^"]+)"', response.get_data(as_text=True)):
+            asset_bytes += len(client.get(url, headers={'Accept-Encoding': 'br, gzip'}).get_data())
+        report[name] = {
+            'html_bytes': html_bytes, 'first_view_bytes': html_bytes + asset_bytes, 'repeat_view_bytes': html_bytes
+        }
+    return report
+
+
+def measure_analytics(rng):
+    # Özet tablolarının yenilenme süresi ve rapor gecikmesi; karşılaştırma için aynı rakamlar
+    # ham sipariş/kalem satırlarından da hesaplanır
+    app.config['ANALYTICS_API_TOKEN'] = ANALYTICS_TOKEN
+    report = {}
+    with app.app_context():
+        report['order_items'] = db.session.query(func.count(OrderItem.id)).scalar()
+        report['rebuild'] = shop.rebuild_analytics()
+
+        # Ödeme ve kargo ilerlemeleri ORM üzerinden (updated_at imleci ilerler)
+        changed_ids = rng.sample(range(1, args.orders + 1), min(ANALYTICS_CHANGED_ORDERS, args.orders))
+        for order in Order.query.filter(Order.id.in_(changed_ids)):
+            if order.payment_status == 'completed':
+                order.status = 'delivered'
+            else:
+                order.payment_status, order.status = 'completed', 'paid'
+        db.session.commit()
+        report['refresh'] = shop.refresh_analytics()
+        report['refresh_idle'] = shop.refresh_analytics()
+
+        end = datetime.utcnow().date()
+        start = end - timedelta(days=ANALYTICS_RANGE_DAYS - 1)
+        bounds = {'start': start.isoformat(), 'end': (end + timedelta(days=1)).isoformat()}
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {ANALYTICS_TOKEN}'}
+        queries = {}
+        for name, raw_sql in RAW_ANALYTICS_SQL.items():
+            rollup_samples, raw_samples = [], []
+            for _ in range(args.analytics_samples):
+                started = time.perf_counter()
+                response = client.get(f'/api/analytics/{name}', headers=headers,
+                                      query_string={'from': start.isoformat(), 'to': end.isoformat()})
+                rollup_samples.append(time.perf_counter() - started)
+            for _ in range(args.analytics_samples):
+                started = time.perf_counter()
+                raw_rows = db.session.execute(text(raw_sql), bounds).all()
+                raw_samples.append(time.perf_counter() - started)
+            rollup_samples.sort()
+            raw_samples.sort()
+            queries[name] = {
+                'rollup_api_p50_ms': round(percentile(rollup_samples, 0.5) * 1000, 3),
+                'raw_sql_p50_ms': round(percentile(raw_samples, 0.5) * 1000, 3),
+                'rollup_rows': len(response.json['rows']) if response.status_code == 200 else None,
+                'raw_rows': len(raw_rows)
+            }
+        report['queries'] = queries
+    return report
+
+
+def measure_search():
+    # Aynı katalogda FTS5 yolu (/search'ün yaptığı gibi ilk sayfa + toplam sayı) ile
+    # eski ilike taraması (LIKE '%q%', sıralamasız, tüm sonuçlar) karşılaştırılır
+    report = {}
+    with app.app_context():
+        for term in SEARCH_TERMS:
+            fts_samples, ilike_samples = [], []
+            for _ in range(args.search_samples):
+                started = time.perf_counter()
+                products_query, fts = shop.search_base_query(term)
+                fts_page = shop.search_by_relevance(products_query, fts)
+                fts_total = products_query.count()
+                fts_samples.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                ilike_rows = Product.query.filter(or_(Product.name.ilike(f'%{term}%'),
+                                                      Product.description.ilike(f'%{term}%'))).all()
+                ilike_samples.append(time.perf_counter() - started)
+                db.session.expunge_all()
+            fts_samples.sort()
+            ilike_samples.sort()
+            report[term] = {
+                'fts_p50_ms': round(percentile(fts_samples, 0.5) * 1000, 3),
+                'fts_p99_ms': round(percentile(fts_samples, 0.99) * 1000, 3),
+                'ilike_p50_ms': round(percentile(ilike_samples, 0.5) * 1000, 3),
+                'ilike_p99_ms': round(percentile(ilike_samples, 0.99) * 1000, 3),
+                'fts_matches': fts_total, 'fts_page_rows': len(fts_page), 'ilike_matches': len(ilike_rows)
+            }
+    return report
+
+
+def measure_image_list_parsing():
+    # Ürün detayının eski yolu (her istekte ast.literal_eval) ile JSON sütununun yükleme anındaki
+    # json.loads'u aynı listeyi N kez ayrıştırarak karşılaştırır
+    report = {'images': len(IMAGE_LIST), 'iterations': args.image_parse_iterations}
+    for name, parse, stored in (('literal_eval', ast.literal_eval, str(IMAGE_LIST)),
+                                ('json_loads', json.loads, json.dumps(IMAGE_LIST))):
+        assert parse(stored) == IMAGE_LIST
+        started = time.perf_counter()
+        for _ in range(args.image_parse_iterations):
+            parse(stored)
+        elapsed = time.perf_counter() - started
+        report[f'{name}_total_ms'] = round(elapsed * 1000, 3)
+        report[f'{name}_per_parse_us'] = round(elapsed / args.image_parse_iterations * 10 ** 6, 3)
+    report['speedup'] = round(report['literal_eval_total_ms'] / report['json_loads_total_ms'], 1) \
+        if report['json_loads_total_ms'] else None
+    return report
+
+
+def measure_guest_cart_headers():
+    # Sepette n-1 kalem varken n. kalemin eklenmesi: istek Cookie ve yanıt Set-Cookie baytları ile süre
+    serializer = app.session_interface.get_signing_serializer(app)
+    report = {}
+    for size in GUEST_CART_SIZES:
+        if size > args.products:
+            continue
+        cookie_bytes, set_cookie_bytes, samples = [], [], []
+        for _ in range(args.guest_cart_samples):
+            client = app.test_client()
+            for product_id in range(1, size):
+                client.post(f'/add_to_cart/{product_id}', data={'quantity': 1})
+            started = time.perf_counter()
+            response = client.post(f'/add_to_cart/{size}', data={'quantity': 1})
+            samples.append(time.perf_counter() - started)
+            cookie_bytes.append(len(response.request.environ.get('HTTP_COOKIE', '')))
+            set_cookie_bytes.append(sum(len(value) for value in response.headers.getlist('Set-Cookie')))
+            client.post('/clear_cart')
+        samples.sort()
+        legacy_session = {'guest_cart': {str(product_id): 1 for product_id in range(1, size + 1)}, 'cart_count': size}
+        report[str(size)] = {
+            'cookie_bytes': max(cookie_bytes), 'set_cookie_bytes': max(set_cookie_bytes),
+            'legacy_cookie_bytes': len('session=' + serializer.dumps(legacy_session)),
+            'add_to_cart_p50_ms': round(percentile(samples, 0.5) * 1000, 3),
+            'add_to_cart_p99_ms': round(percentile(samples, 0.99) * 1000, 3)
+        }
+    return report
+
+
+def measure_metrics_overhead():
+    # Aynı sayfalar METRICS_ENABLED kapalı ve açıkken, sayfa önbelleği kapalı ölçülür; sapma iki tarafa
+    # eşit dağılsın diye istekler sırayla bir kapalı bir açık gönderilir
+    cache, shop.page_cache = shop.page_cache, None
+    enabled = app.config['METRICS_ENABLED']
+    client = app.test_client()
+    report = {}
+    for name, page in METRICS_PAGES.items():
+        samples = {False: [], True: []}
+        for metrics_enabled in (False, True):
+            app.config['METRICS_ENABLED'] = metrics_enabled
+            client.get(page)  # ısınma
+        for _ in range(args.metrics_samples):
+            for metrics_enabled in (False, True):
+                app.config['METRICS_ENABLED'] = metrics_enabled
+                started = time.perf_counter()
+                client.get(page)
+                samples[metrics_enabled].append(time.perf_counter() - started)
+        off, on = sorted(samples[False]), sorted(samples[True])
+        report[name] = {
+            'off_p50_ms': round(percentile(off, 0.5) * 1000, 3), 'on_p50_ms': round(percentile(on, 0.5) * 1000, 3),
+            'off_p99_ms': round(percentile(off, 0.99) * 1000, 3), 'on_p99_ms': round(percentile(on, 0.99) * 1000, 3),
+            'overhead_p50_ms': round((percentile(on, 0.5) - percentile(off, 0.5)) * 1000, 3),
+            'overhead_p50_percent': round((percentile(on, 0.5) / percentile(off, 0.5) - 1) * 100, 1)
+        }
+    app.config['METRICS_ENABLED'] = enabled
+    shop.page_cache = cache
+    return report
+
+
+def apply_database_profile(name):
+    # Pragmalar bağlantı açılırken uygulanır: havuz boşaltılır, sonraki bağlantılar yeni profille açılır
+    production = name == 'after'
+    app.config['SQLITE_PRAGMAS'] = PRODUCTION_PRAGMAS if production else BASELINE_PRAGMAS
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+        if production:
+            shop.ensure_indexes()
+        else:
+            # Benzersiz indeksler kısıt olduğu için (sepet upsert'i onlara dayanır) bırakılır
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    if not index.unique:
+                        index.drop(db.engine, checkfirst=True)
+        with db.engine.connect() as connection:
+            return connection.execute(text('PRAGMA journal_mode')).scalar()
+
+
+def run_mix_reader(recorder, rng, deadline):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = rng.randint(MIX_WRITERS + 1, args.users)
+        session['username'] = 'bench-reader'
+    while time.perf_counter() < deadline:
+        page = rng.choice([f'/product/{rng.randint(1, args.products)}', f'/category/{rng.choice(CATEGORIES)}',
+                           '/orders', '/search?q=' + rng.choice(WORDS)[:4]])
+        timed_mix(recorder, 'read', client.get, page)
+
+
+def run_mix_writer(recorder, rng, user_id, deadline):
+    # Her yazıcı ayrı bir kullanıcı: sepete ekleme ve sipariş (stok düşümü, sipariş kalemleri, iş kuyruğu)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = f'bench{user_id}'
+    while time.perf_counter() < deadline:
+        timed_mix(recorder, 'write', client.post, f'/add_to_cart/{rng.randint(1, args.products)}',
+                  data={'quantity': 1})
+        timed_mix(recorder, 'write', client.post, '/create_order',
+                  data={'shipping_address': 'Warsaw', 'payment_method': 'blik'})
+
+
+def timed_mix(recorder, name, call, *a, **kw):
+    # "database is locked" gibi hatalar yanıt değil istisna olarak gelir; hata sayılır
+    started = time.perf_counter()
+    try:
+        response = call(*a, **kw)
+    except Exception:
+        with recorder.lock:
+            recorder.samples.setdefault(name, []).append((time.perf_counter() - started, 0, True))
+        return
+    recorder.record(name, time.perf_counter() - started, response)
+
+
+def measure_read_write_mix(rng):
+    # Aynı veride önce/sonra: eşzamanlı okuyucular (ürün, kategori, sipariş geçmişi, arama) ve
+    # sipariş yazan yazıcılar; sayfa önbelleği kapalı, her istek veritabanına gider
+    cache, shop.page_cache = shop.page_cache, None
+    report = {}
+    for profile in ('before', 'after'):
+        journal_mode = apply_database_profile(profile)
+        recorder = Recorder()
+        deadline = time.perf_counter() + args.mix_seconds
+        threads = [threading.Thread(target=run_mix_reader, args=(recorder, random.Random(rng.random()), deadline))
+                   for _ in range(MIX_READERS)]
+        threads += [threading.Thread(target=run_mix_writer,
+                                     args=(recorder, random.Random(rng.random()), user_id, deadline))
+                    for user_id in range(1, MIX_WRITERS + 1)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report[profile] = {'journal_mode': journal_mode, **summarize(recorder, time.perf_counter() - started)}
+    shop.page_cache = cache
+    with app.app_context():
+        shop.invalidate_page_cache()
+    return report
+
+
+def grow_order_lines(rng, rows, created_at=None):
+    # Sipariş kalemi tablosu en az `rows` satıra büyütülür (analitik özetleri güncellenmez)
+    with app.app_context():
+        current = db.session.query(func.count(OrderItem.id)).scalar()
+        order_id = db.session.query(func.max(Order.id)).scalar() or 0
+        now = datetime.utcnow()
+        while current < rows:
+            orders, items = [], []
+            for _ in range(min(BATCH, -(-(rows - current) // RECOMMENDATION_ORDER_LINES))):
+                order_id += 1
+                placed_at = created_at or now - timedelta(days=order_id % 365)
+                orders.append({'id': order_id, 'order_number': f'BR{placed_at:%Y%m%d}-{order_id:07d}',
+                               'user_id': rng.randint(1, args.users), 'total_amount': 30.0, 'status': 'paid',
+                               'payment_method': 'blik', 'payment_status': 'completed',
+                               'shipping_address': 'Warsaw', 'created_at': placed_at, 'updated_at': placed_at,
+                               'version': 1})
+                items.extend({'order_id': order_id, 'product_id': product_id, 'quantity': 1, 'price': 10.0}
+                             for product_id in rng.sample(range(1, args.products + 1),
+                                                          min(RECOMMENDATION_ORDER_LINES, args.products)))
+            db.session.execute(Order.__table__.insert(), orders)
+            db.session.execute(OrderItem.__table__.insert(), items)
+            current += len(items)
+        db.session.commit()
+        return current
+
+
+def max_rss_mb():
+    # Sürecin şimdiye kadarki en yüksek RSS'i (Linux'ta KB, macOS'ta bayt)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def measure_recommendations(rng):
+    # Tam derleme (süre, tracemalloc ile en yüksek Python/NumPy belleği, RSS artışı) ve
+    # RECOMMENDATION_NEW_ORDERS yeni siparişten sonra artımlı derleme
+    if shop.np is None:
+        return {'skipped': 'numpy/scipy kurulu değil'}
+    report = {'order_lines': grow_order_lines(rng, args.recommendation_order_lines), 'products': args.products}
+    with app.app_context():
+        rss_before = max_rss_mb() if resource else None
+        report['full'] = shop.build_recommendations()
+        if resource:
+            # Süreç zirvesi daha önce (ör. tohumlamada) daha yüksekse artış 0 görünür
+            report['full']['peak_rss_increase_mb'] = round(max_rss_mb() - rss_before, 1)
+        report['full']['traced_peak_mb'] = round(traced_peak(shop.build_recommendations) / 2 ** 20, 1)
+        db.session.remove()
+    grow_order_lines(rng, report['order_lines'] + RECOMMENDATION_NEW_ORDERS * RECOMMENDATION_ORDER_LINES,
+                     created_at=datetime.utcnow())
+    with app.app_context():
+        report['incremental'] = shop.build_recommendations(incremental=True)
+        db.session.remove()
+    return report
+
+
+def grow_catalog(rng, rows):
+    # API ölçümü için katalog en az `rows` ürüne büyütülür (arama indeksi ve öneriler güncellenmez)
+    with app.app_context():
+        current = db.session.query(func.max(Product.id)).scalar() or 0
+        now = datetime.utcnow()
+        for start in range(current + 1, rows + 1, BATCH):
+            db.session.execute(Product.__table__.insert(), [
+                {'id': product_id, 'name': ' '.join(rng.sample(WORDS, 3)).capitalize() + f' {product_id}',
+                 'price': round(rng.uniform(5, 5000), 2), 'currency': 'PLN', 'stock': 10 ** 6,
+                 'image_url': f'https://cdn.example.com/{product_id}.jpg', 'category': rng.choice(CATEGORIES),
+                 'description': ' '.join(rng.choices(WORDS, k=12)), 'images': [],
+                 'created_at': now, 'updated_at': now}
+                for product_id in range(start, min(start + BATCH, rows + 1))
+            ])
+        db.session.commit()
+        if rows > current:
+            shop.sync_product_categories()
+        return db.session.query(func.count(Product.id)).scalar()
+
+
+def stream_export(client):
+    # Tam dışa aktarım: ilk bayta kadar geçen süre, toplam süre ve bayt
+    started = time.perf_counter()
+    response = client.get('/api/products', buffered=False)
+    ttfb, total_bytes = None, 0
+    for chunk in response.iter_encoded():
+        if ttfb is None and chunk:
+            ttfb = time.perf_counter() - started
+        total_bytes += len(chunk)
+    response.close()
+    return ttfb, time.perf_counter() - started, total_bytes, response.headers.get('ETag')
+
+
+def legacy_export():
+    # Eski uç noktanın yaptığı: tüm ORM nesneleri ve tek bir JSON listesi bellekte
+    with app.test_request_context():
+        started = time.perf_counter()
+        body = jsonify([{'id': p.id, 'name': p.name, 'price': p.price, 'currency': p.currency,
+                              'image_url': p.image_url, 'category': p.category}
+                             for p in Product.query.all()]).get_data()
+        elapsed = time.perf_counter() - started
+        db.session.remove()
+    return elapsed, len(body)
+
+
+def traced_peak(call):
+    # Python yığınındaki en yüksek ek bellek (tracemalloc yavaşlattığı için süreler ayrı ölçülür)
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure_api_products(rng):
+    # /api/products: akış halinde tam dışa aktarım (TTFB, süre, bellek), sayfalı mod ve 304 yanıtı
+    client = app.test_client()
+    report = {}
+    for rows in sorted(args.api_rows):
+        actual_rows = grow_catalog(rng, rows)
+        ttfb, elapsed, total_bytes, etag = stream_export(client)
+        entry = {
+            'rows': actual_rows,
+            'stream_ttfb_ms': round(ttfb * 1000, 3),
+            'stream_total_ms': round(elapsed * 1000, 3),
+            'stream_bytes': total_bytes,
+            'stream_peak_mb': round(traced_peak(lambda: stream_export(client)) / 2 ** 20, 2)
+        }
+        started = time.perf_counter()
+        client.get('/api/products', query_string={'limit': API_PAGE_LIMIT})
+        entry['page_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        started = time.perf_counter()
+        not_modified = client.get('/api/products', headers={'If-None-Match': etag})
+        entry['not_modified_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        entry['not_modified_status'] = not_modified.status_code
+        if actual_rows <= LEGACY_API_MAX_ROWS:
+            legacy_seconds, legacy_bytes = legacy_export()
+            entry['legacy_total_ms'] = round(legacy_seconds * 1000, 3)
+            entry['legacy_bytes'] = legacy_bytes
+            entry['legacy_peak_mb'] = round(traced_peak(legacy_export) / 2 ** 20, 2)
+        report[str(rows)] = entry
+    return report
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder, wall_time):
+    endpoints = {}
+    for name, samples in sorted(recorder.samples.items()):
+        latencies = sorted(elapsed for elapsed, _, _ in samples)
+        sql_counts = [sql_count for _, sql_count, _ in samples]
+        endpoints[name] = {
+            'requests': len(samples),
+            'errors': sum(1 for _, _, failed in samples if failed),
+            'throughput_rps': round(len(samples) / wall_time, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'sql_mean': round(sum(sql_counts) / len(sql_counts), 2),
+            'sql_max': max(sql_counts)
+        }
+    return endpoints
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    with app.app_context():
+        seed_seconds = seed_database(random.Random(args.seed))
+
+    page_weight = measure_page_weight()
+    analytics = measure_analytics(random.Random(args.seed))
+    search = measure_search()
+    image_list_parsing = measure_image_list_parsing() if args.image_parse_iterations > 0 else None
+    guest_cart_headers = measure_guest_cart_headers() if args.guest_cart_samples > 0 else None
+    metrics_overhead = measure_metrics_overhead() if args.metrics_samples > 0 else None
+    recorder = Recorder()
+    threads = [threading.Thread(target=run_virtual_user, args=(i, recorder, random.Random(args.seed + i)))
+               for i in range(args.concurrency)]
+    if args.heavy_user_orders:
+        threads.append(threading.Thread(target=run_heavy_history, args=(recorder,)))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+    read_write_mix = measure_read_write_mix(random.Random(args.seed)) if args.mix_seconds > 0 else None
+    # Sipariş ve katalog tabloları büyütüldüğü için yük testinden sonra
+    recommendations = measure_recommendations(random.Random(args.seed)) if args.recommendation_order_lines > 0 \
+        else None
+    api_products = measure_api_products(random.Random(args.seed))
+
+    total_requests = sum(len(samples) for samples in recorder.samples.values())
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'products': args.products, 'users': args.users, 'reviews': args.reviews, 'orders': args.orders,
+            'heavy_user_orders': args.heavy_user_orders, 'search_samples': args.search_samples,
+            'api_rows': sorted(args.api_rows), 'mix_seconds': args.mix_seconds,
+            'image_parse_iterations': args.image_parse_iterations, 'guest_cart_samples': args.guest_cart_samples,
+            'metrics_samples': args.metrics_samples,
+            'recommendation_order_lines': args.recommendation_order_lines,
+            'iterations': args.iterations, 'concurrency': args.concurrency, 'page_cache': args.page_cache,
+            'seed_seconds': round(seed_seconds, 3),
+            'wall_seconds': round(wall_time, 3),
+            'total_requests': total_requests,
+            'throughput_rps': round(total_requests / wall_time, 2)
+        },
+        'endpoints': summarize(recorder, wall_time),
+        'page_weight': page_weight,
+        'analytics': analytics,
+        'search': search,
+        'image_list_parsing': image_list_parsing,
+        'guest_cart_headers': guest_cart_headers,
+        'metrics_overhead': metrics_overhead,
+        'read_write_mix': read_write_mix,
+        'recommendations': recommendations,
+        'api_products': api_products
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Sonuçlar {args.output} dosyasına yazıldı ({total_requests} istek, "
+              f"{report['meta']['throughput_rps']} istek/sn)", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
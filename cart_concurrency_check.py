@@ -0,0 +1,199 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Sepet eşzamanlılık testi: aynı kullanıcı (ve aynı misafir sepeti) için paralel add_to_cart istekleri
+# süreç x thread olarak aynı anda gönderilir. Ürün başına tek satır kalmalı, miktarlar başarılı
+# eklemelerin toplamına eşit olmalı ve satır sınırı (MAX_CART_QUANTITY) aşılmamalıdır. Aynı misafir
+# sepetinin eşzamanlı tekrar aktarımı sepeti bir kez birleştirmeli; birleşen satır ve rezervasyon sınırda
+# kesilmeli, fazlası stoğa dönmelidir.
+USER_ID = 1
+TRANSFER_USER_ID = 2
+GUEST_COOKIE = 'cart-check-guest'
+TRANSFER_COOKIE = 'cart-check-transfer'
+PRODUCT_STOCK = 1000
+# Aktarım senaryosu: kullanıcının mevcut sepeti ve misafir sepeti {product_id: quantity}; ürün 4'ün
+# toplamı MAX_CART_QUANTITY'yi (10) aşar
+TRANSFER_USER_CART = {1: 2, 2: 1, 4: 7}
+TRANSFER_GUEST_CART = {1: 3, 3: 4, 4: 6}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='add_to_cart upsert ve misafir sepeti aktarımı için eşzamanlılık testi')
+    parser.add_argument('--products', type=int, default=6, help='Aynı anda eklenen farklı ürün sayısı')
+    parser.add_argument('--extra', type=int, default=3,
+                        help='Ürün başına satır sınırını aşan (reddedilmesi gereken) ek istek sayısı')
+    parser.add_argument('--transfers', type=int, default=20, help='Aynı misafir sepeti için eşzamanlı aktarım isteği')
+    parser.add_argument('--processes', type=int, default=4, help='İstekleri gönderen süreç sayısı')
+    parser.add_argument('--database', help='SQLite dosyası (varsayılan: geçici dosya)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def load_app(database_url, threads):
+    # app modülü DATABASE_URL ve DB_POOL_SIZE'ı import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['DB_POOL_SIZE'] = str(threads)
+    import app as shop
+    shop.app.config['TESTING'] = True
+    return shop
+
+
+def make_client(shop, user_id=None, guest_token=None):
+    client = shop.app.test_client()
+    if user_id:
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = f'cart{user_id}'
+    if guest_token:
+        client.set_cookie(shop.app.config['GUEST_CART_COOKIE'], guest_token)
+    return client
+
+
+def fire(database_url, requests_to_send, start_at):
+    # requests_to_send: [(yöntem, yol, kullanıcı id veya None, misafir token'ı veya None)]
+    shop = load_app(database_url, len(requests_to_send))
+
+    def send(request_spec):
+        method, path, user_id, guest_token = request_spec
+        client = make_client(shop, user_id, guest_token)
+        try:
+            if method == 'POST':
+                response = client.post(path, data={'quantity': 1})
+                return path, 'added' if response.json['success'] else 'rejected'
+            return path, 'ok' if client.get(path).status_code < 400 else 'failed'
+        except Exception as error:
+            return path, f'error: {type(error).__name__}'
+
+    with ThreadPoolExecutor(max_workers=len(requests_to_send)) as pool:
+        time.sleep(max(start_at - time.time(), 0))
+        return list(pool.map(send, requests_to_send))
+
+
+def replay(pool, args, database_url, requests_to_send):
+    start_at = time.time() + 1.0
+    chunks = [requests_to_send[i::args.processes] for i in range(args.processes)]
+    started = time.perf_counter()
+    results = pool.starmap(fire, [(database_url, chunk, start_at) for chunk in chunks if chunk])
+    return [result for chunk in results for result in chunk], time.perf_counter() - started - 1.0
+
+
+def main():
+    args = parse_args()
+    database_path = args.database or os.path.join(tempfile.mkdtemp(prefix='omimas-cart-'), 'cart.db')
+    database_url = 'sqlite:///' + os.path.abspath(database_path)
+    shop = load_app(database_url, 8)
+    app, db = shop.app, shop.db
+    limit = shop.MAX_CART_QUANTITY
+    product_ids = range(1, max(args.products, *TRANSFER_USER_CART, *TRANSFER_GUEST_CART) + 1)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(shop.Product.__table__.insert(), [
+            {'id': product_id, 'name': f'Cart item {product_id}', 'price': 10.0, 'currency': 'PLN',
+             'stock': PRODUCT_STOCK} for product_id in product_ids
+        ])
+        db.session.execute(shop.User.__table__.insert(), [
+            {'id': user_id, 'username': f'cart{user_id}', 'email': f'cart{user_id}@omimas.pl',
+             'password_hash': 'x', 'is_active': True} for user_id in (USER_ID, TRANSFER_USER_ID)
+        ])
+        db.session.commit()
+
+    def state(owner, user_id=None, guest_token=None):
+        # {product_id: (sepet miktarı, sepet satırı sayısı, rezervasyon)} ve toplam stok
+        with app.app_context():
+            if user_id:
+                rows = db.session.query(shop.Cart.product_id, shop.Cart.quantity).filter_by(user_id=user_id).all()
+            else:
+                rows = db.session.query(shop.GuestCart.product_id, shop.GuestCart.quantity) \
+                    .filter_by(token=guest_token).all()
+            reserved = dict(db.session.query(shop.StockReservation.product_id, shop.StockReservation.quantity)
+                            .filter_by(owner=owner).all())
+            stock = db.session.query(shop.func.sum(shop.Product.stock)).scalar()
+            db.session.remove()
+        quantities, row_counts = Counter(), Counter()
+        for product_id, quantity in rows:
+            quantities[product_id] += quantity
+            row_counts[product_id] += 1
+        return {product_id: (quantities[product_id], row_counts[product_id], reserved.get(product_id, 0))
+                for product_id in set(quantities) | set(reserved)}, stock
+
+    report, failures = {}, []
+
+    def check(name, condition, detail):
+        report[name]['passed'] = condition
+        if not condition:
+            failures.append(f'{name}: {detail}')
+
+    def outcome_summary(results):
+        outcomes = Counter(outcome for _, outcome in results)
+        return {outcome: count for outcome, count in sorted(outcomes.items())}
+
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        # 1-2) Ürün başına sınır kadar tekli ekleme + sınırı aşan ek istekler, kullanıcı ve misafir için
+        for name, owner, user_id, guest_token in (('add_to_cart_user', f'user:{USER_ID}', USER_ID, None),
+                                                  ('add_to_cart_guest', f'guest:{GUEST_COOKIE}', None, GUEST_COOKIE)):
+            stock_before = state(owner, user_id, guest_token)[1]
+            requests_to_send = [('POST', f'/add_to_cart/{product_id}', user_id, guest_token)
+                                for _ in range(limit + args.extra) for product_id in range(1, args.products + 1)]
+            results, wall_time = replay(pool, args, database_url, requests_to_send)
+            per_product, stock_after = state(owner, user_id, guest_token)
+            added = Counter(path for path, outcome in results if outcome == 'added')
+            expected = {product_id: (limit, 1, limit) for product_id in range(1, args.products + 1)}
+            report[name] = {'requests': len(results), 'outcomes': outcome_summary(results),
+                            'wall_ms': round(wall_time * 1000, 1),
+                            'cart': {str(product_id): dict(zip(('quantity', 'rows', 'reserved'), values))
+                                     for product_id, values in sorted(per_product.items())}}
+            check(name, per_product == expected
+                  and all(added[f'/add_to_cart/{product_id}'] == limit for product_id in expected)
+                  and stock_before - stock_after == limit * args.products,
+                  f'sepet {per_product}, başarılı eklemeler {dict(added)}, stok farkı {stock_before - stock_after}')
+
+        # 3) Aynı misafir sepeti, dolu bir kullanıcı sepetine eşzamanlı tekrar aktarılır
+        with app.app_context():
+            user_client = make_client(shop, TRANSFER_USER_ID)
+            guest_client = make_client(shop, guest_token=TRANSFER_COOKIE)
+        for client, cart in ((user_client, TRANSFER_USER_CART), (guest_client, TRANSFER_GUEST_CART)):
+            for product_id, quantity in cart.items():
+                client.post(f'/add_to_cart/{product_id}', data={'quantity': quantity})
+        stock_before = state(f'user:{TRANSFER_USER_ID}', TRANSFER_USER_ID)[1]
+        results, wall_time = replay(pool, args, database_url,
+                                    [('GET', '/transfer_guest_cart', TRANSFER_USER_ID, TRANSFER_COOKIE)] * args.transfers)
+        per_product, stock_after = state(f'user:{TRANSFER_USER_ID}', TRANSFER_USER_ID)
+        guest_left, _ = state(f'guest:{TRANSFER_COOKIE}', guest_token=TRANSFER_COOKIE)
+        merged = Counter(TRANSFER_USER_CART) + Counter(TRANSFER_GUEST_CART)
+        expected = {product_id: (min(quantity, limit), 1, min(quantity, limit)) for product_id, quantity in merged.items()}
+        returned = sum(max(quantity - limit, 0) for quantity in merged.values())
+        report['transfer_guest_cart_concurrent'] = {
+            'requests': len(results), 'outcomes': outcome_summary(results), 'wall_ms': round(wall_time * 1000, 1),
+            'cart': {str(product_id): dict(zip(('quantity', 'rows', 'reserved'), values))
+                     for product_id, values in sorted(per_product.items())},
+            'guest_rows_left': len(guest_left)
+        }
+        check('transfer_guest_cart_concurrent',
+              per_product == expected and not guest_left and stock_after - stock_before == returned
+              and all(outcome == 'ok' for _, outcome in results),
+              f'sepet {per_product} (beklenen {expected}), kalan misafir satırı {guest_left}, '
+              f'stoğa dönen {stock_after - stock_before} (beklenen {returned})')
+
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
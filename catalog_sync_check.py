@@ -0,0 +1,162 @@
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Katalog senkronizasyonu testi: yerel sahte bir DummyJSON sunucusu /products'ı limit/skip ile sayfalı
+# verir. İlk senkronizasyonda tüm ürünler eklenmeli; ikincisinde yalnızca fiyatı değişen ürünler
+# güncellenmeli, yeni ürünler eklenmeli, geri kalanı 'değişmeyen' sayılmalıdır. Yerelde değişen stok
+# senkronizasyonda ezilmemeli ve her sayfa tam bir kez istenmelidir.
+LOCAL_STOCK = 7
+SERVER_REQUESTS = Counter()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='sync_catalog testi (yerel sahte DummyJSON sunucusu ile)')
+    parser.add_argument('--products', type=int, default=1000, help='Sahte katalogdaki ürün sayısı')
+    parser.add_argument('--changed', type=int, default=50, help='İkinci senkronizasyondan önce fiyatı değişen ürün')
+    parser.add_argument('--added', type=int, default=10, help='İkinci senkronizasyondan önce eklenen ürün')
+    parser.add_argument('--page-size', type=int, default=100, help='Sayfa başına ürün (limit)')
+    parser.add_argument('--workers', type=int, default=4, help='Paralel istek sayısı')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def make_product(external_id, price):
+    # DummyJSON /products yanıtındaki alanlar (CATALOG_API_SELECT)
+    return {'id': external_id, 'title': f'Sync item {external_id}', 'price': price,
+            'thumbnail': f'https://cdn.example.com/{external_id}/thumbnail.jpg',
+            'category': ('beauty', 'groceries', 'furniture')[external_id % 3],
+            'description': f'Catalog sync item {external_id}',
+            'images': [f'https://cdn.example.com/{external_id}/1.jpg'], 'stock': 100}
+
+
+def start_catalog_server(catalog):
+    class CatalogHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            limit, skip = int(query['limit'][0]), int(query['skip'][0])
+            SERVER_REQUESTS[skip] += 1
+            products = list(catalog.values())
+            body = json.dumps({'products': products[skip:skip + limit], 'total': len(products),
+                               'skip': skip, 'limit': limit}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CatalogHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/products'
+
+
+def load_app(database_url):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    return shop
+
+
+def main():
+    args = parse_args()
+    database_path = os.path.join(tempfile.mkdtemp(prefix='omimas-catalog-'), 'catalog.db')
+    shop = load_app('sqlite:///' + database_path)
+    app, db = shop.app, shop.db
+    catalog = {external_id: make_product(external_id, 10.0 + external_id % 50)
+               for external_id in range(1, args.products + 1)}
+    server, catalog_url = start_catalog_server(catalog)
+    app.config['CATALOG_API_URL'] = catalog_url
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.remove()
+
+    def sync():
+        SERVER_REQUESTS.clear()
+        with app.app_context():
+            stats = shop.sync_catalog(args.workers, args.page_size)
+            db.session.remove()
+        pages = math.ceil(len(catalog) / args.page_size)
+        stats['pages_requested'] = sum(SERVER_REQUESTS.values())
+        stats['pages_requested_once'] = sorted(SERVER_REQUESTS) == list(range(0, pages * args.page_size, args.page_size)) \
+            and set(SERVER_REQUESTS.values()) == {1}
+        return stats
+
+    def local_products(external_ids):
+        with app.app_context():
+            rows = {product.external_id: (product.price, product.stock)
+                    for product in shop.Product.query.filter(shop.Product.external_id.in_(external_ids))}
+            total = shop.Product.query.count()
+            db.session.remove()
+        return rows, total
+
+    report, failures = {'meta': vars(args).copy()}, []
+    report['meta'].pop('output')
+
+    def check(name, condition, detail):
+        report[name]['passed'] = condition
+        if not condition:
+            failures.append(f'{name}: {detail}')
+
+    # 1) Boş veritabanı: her ürün yeni
+    report['first_sync'] = sync()
+    stats = report['first_sync']
+    check('first_sync', (stats['fetched'], stats['inserted'], stats['updated'], stats['unchanged'])
+          == (args.products, args.products, 0, 0) and stats['pages_requested_once'], stats)
+
+    # 2) Fiyat değişikliği, yeni ürünler ve yerelde satılmış stok (senkronizasyon stoğu ezmemeli)
+    changed_ids = list(range(1, args.changed + 1))
+    for external_id in changed_ids:
+        catalog[external_id]['price'] += 1
+    added_ids = list(range(args.products + 1, args.products + args.added + 1))
+    catalog.update((external_id, make_product(external_id, 99.0)) for external_id in added_ids)
+    with app.app_context():
+        shop.Product.query.filter(shop.Product.external_id.in_(changed_ids)).update(
+            {shop.Product.stock: LOCAL_STOCK}, synchronize_session=False)
+        db.session.commit()
+        db.session.remove()
+
+    report['second_sync'] = sync()
+    stats = report['second_sync']
+    rows, total = local_products(changed_ids + added_ids)
+    wrong = {external_id: rows.get(external_id) for external_id in changed_ids + added_ids
+             if rows.get(external_id) != (round(catalog[external_id]['price'] * 4, 2),
+                                          LOCAL_STOCK if external_id in changed_ids else 100)}
+    stats['products_in_database'] = total
+    check('second_sync', (stats['fetched'], stats['inserted'], stats['updated'], stats['unchanged'])
+          == (len(catalog), args.added, args.changed, args.products - args.changed)
+          and stats['pages_requested_once'] and total == len(catalog) and not wrong,
+          f'{stats}, hatalı satırlar (fiyat, stok) {dict(list(wrong.items())[:5])}')
+
+    # 3) Hiçbir şey değişmedi: yazma yok
+    report['unchanged_sync'] = sync()
+    stats = report['unchanged_sync']
+    check('unchanged_sync', (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 0, len(catalog)), stats)
+
+    server.shutdown()
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,4 @@
-from app import app, db, Product, Category
-import requests
-from datetime import datetime
+from app import app, db, Product, Category, fetch_products_from_api
 
 def init_database():
     with app.app_context():
@@ -27,31 +25,8 @@ def init_database():
         print("Kategoriler eklendi!")
         
         print("Ürünler API'den çekiliyor...")
-        # API'den ürünleri çek
-        try:
-            response = requests.get('https://dummyjson.com/products?limit=20')
-            products_data = response.json()['products']
-            
-            for product_data in products_data:
-                price_pln = product_data['price'] * 4
-                
-                product = Product(
-                    name=product_data['title'],
-                    price=round(price_pln, 2),
-                    currency='PLN',
-                    image_url=product_data['thumbnail'],
-                    category=product_data['category'],
-                    description=product_data['description'],
-                    images=str(product_data['images']),
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(product)
-            
-            db.session.commit()
-            print(f"{len(products_data)} ürün eklendi!")
-            
-        except Exception as e:
-            print(f"API hatası: {e}")
+        # API'den ürünleri çek (toplu, paralel senkronizasyon)
+        fetch_products_from_api()
         
         print("Veritabanı hazır!")
         print(f"Toplam {Product.query.count()} ürün")
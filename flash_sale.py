@@ -0,0 +1,170 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter
+
+# Flaş indirim yük testi: çok sayıda süreç aynı ürünü (tek sıcak SKU) aynı anda sepete ekleyip
+# sipariş verir. Sonunda satılan adet başlangıç stoğunu aşmamalı ve
+# satılan + kalan stok + açık rezervasyonlar = başlangıç stoğu olmalıdır.
+HOT_PRODUCT_ID = 1
+USER_PASSWORD_HASH = 'flash-sale-no-login'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Tek ürün üzerinde çok süreçli flaş indirim testi (stok aşımı kontrolü)')
+    parser.add_argument('--stock', type=int, default=200, help='Sıcak ürünün başlangıç stoğu')
+    parser.add_argument('--buyers', type=int, default=2000, help='Alıcı (kullanıcı) sayısı')
+    parser.add_argument('--processes', type=int, default=8, help='Paralel süreç sayısı')
+    parser.add_argument('--max-quantity', type=int, default=2, help='Alıcı başına 1..N adet')
+    parser.add_argument('--abandon-rate', type=float, default=0.2,
+                        help='Sepete ekleyip ödemeye geçmeyen alıcı oranı (rezervasyonları süresi dolunca iade edilir)')
+    parser.add_argument('--reservation-ttl', type=float, default=2, help='Test için sepet rezervasyon süresi (sn)')
+    parser.add_argument('--sweep-interval', type=float, default=0.5, help='Süresi dolan rezervasyonları iade aralığı (sn)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='SQLite dosyası (varsayılan: geçici dosya)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def load_app(database_url, reservation_ttl):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['PAYMENT_GATEWAY_URL'] = None
+    shop.app.config['CART_RESERVATION_TTL'] = reservation_ttl
+    return shop
+
+
+def run_buyers(database_url, reservation_ttl, buyer_ids, max_quantity, abandon_rate, seed):
+    shop = load_app(database_url, reservation_ttl)
+    rng = random.Random(seed)
+    outcomes = Counter()
+    checkouts = []  # (başlangıç, bitiş) duvar saati; süreçler arası satış penceresi için
+    for user_id in buyer_ids:
+        client = shop.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = f'buyer{user_id}'
+        try:
+            response = client.post(f'/add_to_cart/{HOT_PRODUCT_ID}',
+                                   data={'quantity': rng.randint(1, max_quantity)})
+            if not response.json['success']:
+                outcomes['sold_out_at_cart'] += 1
+                continue
+            if rng.random() < abandon_rate:
+                outcomes['abandoned'] += 1
+                continue
+            started = time.time()
+            response = client.post('/create_order', data={'shipping_address': 'Warsaw', 'payment_method': 'blik'})
+            checkouts.append((started, time.time()))
+            outcomes['orders' if response.json['success'] else 'sold_out_at_checkout'] += 1
+        except Exception:
+            outcomes['errors'] += 1
+            traceback.print_exc(limit=1)
+    return outcomes, checkouts
+
+
+def seed_database(shop, args):
+    with shop.app.app_context():
+        shop.db.drop_all()
+        shop.db.create_all()
+        shop.db.session.execute(shop.Product.__table__.insert(), [
+            {'id': HOT_PRODUCT_ID, 'name': 'Flash sale item', 'price': 99.0, 'currency': 'PLN', 'stock': args.stock}
+        ])
+        shop.db.session.execute(shop.User.__table__.insert(), [
+            {'id': user_id, 'username': f'buyer{user_id}', 'email': f'buyer{user_id}@omimas.pl',
+             'password_hash': USER_PASSWORD_HASH, 'is_active': True}
+            for user_id in range(1, args.buyers + 1)
+        ])
+        shop.db.session.commit()
+
+
+def collect_results(shop):
+    with shop.app.app_context():
+        session = shop.db.session
+        units_sold = session.query(shop.func.coalesce(shop.func.sum(shop.OrderItem.quantity), 0)) \
+            .filter(shop.OrderItem.product_id == HOT_PRODUCT_ID).scalar()
+        reserved = session.query(shop.func.coalesce(shop.func.sum(shop.StockReservation.quantity), 0)) \
+            .filter(shop.StockReservation.product_id == HOT_PRODUCT_ID).scalar()
+        stock = session.get(shop.Product, HOT_PRODUCT_ID).stock
+        orders = session.query(shop.func.count(shop.Order.id)).scalar()
+        shop.db.session.remove()
+    return units_sold, reserved, stock, orders
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)]
+
+
+def main():
+    args = parse_args()
+    database_path = args.database or os.path.join(tempfile.mkdtemp(prefix='omimas-flash-'), 'flash.db')
+    database_url = 'sqlite:///' + os.path.abspath(database_path)
+    shop = load_app(database_url, args.reservation_ttl)
+    seed_database(shop, args)
+
+    # Alıcılar süreçlere dağıtılır; ana süreç süresi dolan rezervasyonları iade eder
+    buyer_ids = list(range(1, args.buyers + 1))
+    random.Random(args.seed).shuffle(buyer_ids)
+    chunks = [buyer_ids[i::args.processes] for i in range(args.processes)]
+    sweeper = shop.ReservationSweeper(args.sweep_interval).start()
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        results = pool.starmap(run_buyers, [
+            (database_url, args.reservation_ttl, chunk, args.max_quantity, args.abandon_rate, args.seed + i)
+            for i, chunk in enumerate(chunks)
+        ])
+    wall_time = time.perf_counter() - started
+    sweeper.stop()
+
+    outcomes, checkouts = Counter(), []
+    for worker_outcomes, worker_checkouts in results:
+        outcomes.update(worker_outcomes)
+        checkouts.extend(worker_checkouts)
+    latencies = sorted(finished - started for started, finished in checkouts)
+    # Süreç başlatma süresi hariç: ilk checkout'un başlangıcından son checkout'un bitişine
+    sale_window = max(finished for _, finished in checkouts) - min(started for started, _ in checkouts) \
+        if checkouts else wall_time
+    units_sold, reserved, stock, orders = collect_results(shop)
+
+    report = {
+        'meta': {'stock': args.stock, 'buyers': args.buyers, 'processes': args.processes,
+                 'max_quantity': args.max_quantity, 'abandon_rate': args.abandon_rate,
+                 'reservation_ttl': args.reservation_ttl, 'wall_seconds': round(wall_time, 3),
+                 'sale_window_seconds': round(sale_window, 3)},
+        'outcomes': dict(outcomes),
+        'orders': orders,
+        'units_sold': units_sold,
+        'stock_left': stock,
+        'reserved_left': reserved,
+        'oversold': max(units_sold - args.stock, 0),
+        'conserved': units_sold + stock + reserved == args.stock,
+        'orders_per_second': round(orders / sale_window, 2),
+        'checkouts_per_second': round(len(latencies) / sale_window, 2),
+        'checkout_p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'checkout_p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'checkout_p99_ms': round(percentile(latencies, 0.99) * 1000, 3)
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if report['oversold'] or not report['conserved'] or outcomes['errors']:
+        print('HATA: stok aşımı, stok tutarsızlığı veya istek hatası', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Tekrar (replay) testi: her istek aynı anda N kez gönderilir (süreç x thread) ve
+# her senaryoda tam olarak bir etki (sipariş, ödeme işi, kargo etiketi) oluştuğu doğrulanır.
+USER_ID = 1
+PRODUCT_IDS = (1, 2)
+BLIK_FORM = {'payment_method': 'blik', 'blik_code': '123456'}
+CARD_FORM = {'payment_method': 'credit_card', 'card_number': '4111111111111111'}
+ORDER_FORM = {'shipping_address': 'Warsaw', 'payment_method': 'blik'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='create_order ve ödeme uç noktaları için eşzamanlı tekrar testi')
+    parser.add_argument('--replays', type=int, default=100, help='Senaryo başına eşzamanlı istek sayısı')
+    parser.add_argument('--processes', type=int, default=4, help='İstekleri gönderen süreç sayısı')
+    parser.add_argument('--database', help='SQLite dosyası (varsayılan: geçici dosya)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def load_app(database_url, threads):
+    # app modülü DATABASE_URL ve DB_POOL_SIZE'ı import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['DB_POOL_SIZE'] = str(threads)
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['PAYMENT_GATEWAY_URL'] = None
+    return shop
+
+
+def fire(database_url, requests_to_send, start_at):
+    # requests_to_send: [(yol, form, Idempotency-Key veya None)]; hepsi start_at anında başlar
+    shop = load_app(database_url, len(requests_to_send))
+
+    def send(request_spec):
+        path, form, key = request_spec
+        client = shop.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = USER_ID
+            session['username'] = 'replay'
+        headers = {'Idempotency-Key': key} if key else {}
+        response = client.post(path, data=form, headers=headers)
+        return response.status_code, response.headers.get('Idempotent-Replayed') == 'true', response.get_json()
+
+    def run_jobs(_):
+        with shop.app.app_context():
+            try:
+                return shop.run_pending_jobs()
+            finally:
+                shop.db.session.remove()
+
+    work = run_jobs if requests_to_send and requests_to_send[0] == 'jobs' else send
+    with ThreadPoolExecutor(max_workers=len(requests_to_send)) as pool:
+        time.sleep(max(start_at - time.time(), 0))
+        return list(pool.map(work, requests_to_send))
+
+
+def replay(pool, args, database_url, requests_to_send):
+    start_at = time.time() + 1.0
+    chunks = [requests_to_send[i::args.processes] for i in range(args.processes)]
+    started = time.perf_counter()
+    results = pool.starmap(fire, [(database_url, chunk, start_at) for chunk in chunks if chunk])
+    return [result for chunk in results for result in chunk], time.perf_counter() - started - 1.0
+
+
+def summarize(results, wall_time):
+    statuses = Counter(status for status, _, _ in results)
+    return {'requests': len(results), 'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'replayed': sum(1 for _, replayed, _ in results if replayed), 'wall_ms': round(wall_time * 1000, 1)}
+
+
+def main():
+    args = parse_args()
+    database_path = args.database or os.path.join(tempfile.mkdtemp(prefix='omimas-replay-'), 'replay.db')
+    database_url = 'sqlite:///' + os.path.abspath(database_path)
+    shop = load_app(database_url, 8)
+    app, db = shop.app, shop.db
+
+    def fill_cart():
+        with app.app_context():
+            db.session.execute(shop.Cart.__table__.insert(), [
+                {'user_id': USER_ID, 'product_id': product_id, 'quantity': 2} for product_id in PRODUCT_IDS
+            ])
+            db.session.commit()
+
+    def count(model, **filters):
+        with app.app_context():
+            result = model.query.filter_by(**filters).count()
+            db.session.remove()
+            return result
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(shop.Product.__table__.insert(), [
+            {'id': product_id, 'name': f'Replay item {product_id}', 'price': 10.0 * product_id,
+             'currency': 'PLN', 'stock': 1000} for product_id in PRODUCT_IDS
+        ])
+        db.session.execute(shop.User.__table__.insert(), [
+            {'id': USER_ID, 'username': 'replay', 'email': 'replay@omimas.pl', 'password_hash': 'x', 'is_active': True}
+        ])
+        db.session.commit()
+
+    report, failures = {}, []
+
+    def check(name, condition, detail):
+        report[name]['passed'] = condition
+        if not condition:
+            failures.append(f'{name}: {detail}')
+
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        # 1) Aynı anahtarla create_order: tek sipariş, herkes aynı sipariş numarasını görür
+        fill_cart()
+        results, wall_time = replay(pool, args, database_url, [('/create_order', ORDER_FORM, 'order-key')] * args.replays)
+        report['create_order_same_key'] = summarize(results, wall_time)
+        order_ids = {body['order_id'] for status, _, body in results if status == 200 and body.get('success')}
+        check('create_order_same_key', count(shop.Order) == 1 and len(order_ids) == 1,
+              f'{count(shop.Order)} sipariş, yanıtlarda {order_ids}')
+
+        # 2) Anahtarsız çift gönderim: sepet tek seferde alındığı için yine tek sipariş
+        fill_cart()
+        results, wall_time = replay(pool, args, database_url, [('/create_order', ORDER_FORM, None)] * args.replays)
+        report['create_order_no_key'] = summarize(results, wall_time)
+        check('create_order_no_key', count(shop.Order) == 2, f'{count(shop.Order) - 1} yeni sipariş')
+
+        # 3) Aynı anahtarla BLIK ödemesi: tek yetkilendirme işi
+        results, wall_time = replay(pool, args, database_url, [('/pay_with_blik/1', BLIK_FORM, 'blik-key')] * args.replays)
+        report['pay_with_blik_same_key'] = summarize(results, wall_time)
+        check('pay_with_blik_same_key', count(shop.Job, kind='authorize_payment', order_id=1) == 1,
+              f"{count(shop.Job, kind='authorize_payment', order_id=1)} ödeme işi")
+
+        # 4) Farklı anahtarlarla kart ödemesi: compare-and-set tek isteği geçirir
+        results, wall_time = replay(pool, args, database_url,
+                                    [('/pay_with_credit_card/2', CARD_FORM, f'card-{i}') for i in range(args.replays)])
+        report['pay_with_card_distinct_keys'] = summarize(results, wall_time)
+        check('pay_with_card_distinct_keys', count(shop.Job, kind='authorize_payment', order_id=2) == 1,
+              f"{count(shop.Job, kind='authorize_payment', order_id=2)} ödeme işi")
+
+        # 5) Aynı sipariş için N yetkilendirme işi eşzamanlı çalışır: tek kargo etiketi
+        with app.app_context():
+            for _ in range(args.replays - 1):
+                shop.enqueue_job('authorize_payment', {'order_id': 1, 'payment_method': 'blik',
+                                                       'details': {'blik_code': '123456'}}, order_id=1)
+            db.session.commit()
+        _, wall_time = replay(pool, args, database_url, ['jobs'] * args.processes)
+        report['authorize_jobs_concurrent'] = {'jobs': args.replays, 'wall_ms': round(wall_time * 1000, 1),
+                                               'tracking_labels': count(shop.ShippingTracking, order_id=1)}
+        with app.app_context():
+            payment_status = db.session.get(shop.Order, 1).payment_status
+        check('authorize_jobs_concurrent',
+              count(shop.ShippingTracking, order_id=1) == 1 and payment_status == 'completed',
+              f'{count(shop.ShippingTracking, order_id=1)} kargo etiketi, ödeme durumu {payment_status}')
+
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Görsel proxy'si testi: yerel bir sahte origin (DummyJSON CDN yerine) görselleri sunar ve her yolun
+# kaç kez çekildiğini sayar. Varyant boyutları/biçimleri, önbellek başlıkları, eşzamanlı isteklerde
+# origin'in tek kez çağrılması ve boyut sınırlı LRU silme doğrulanır.
+WEBP_ACCEPT = 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'
+JPEG_ACCEPT = 'image/png,image/*;q=0.8,*/*;q=0.5'
+ORIGIN_HITS = Counter()
+ORIGIN_IMAGES = {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Ürün görseli proxy/önbellek testi (yerel sahte origin ile)')
+    parser.add_argument('--images', type=int, default=40, help='LRU testi için farklı görsel sayısı')
+    parser.add_argument('--concurrency', type=int, default=16, help='Aynı görsele eşzamanlı istek sayısı')
+    parser.add_argument('--origin-delay', type=float, default=0.05, help='Sahte origin gecikmesi (sn)')
+    parser.add_argument('--cache-max-bytes', type=int, default=1024 * 1024, help='LRU testi için önbellek sınırı (bayt)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def make_image(Image, width, height, fmt, seed):
+    # Düz renk değil, sıkıştırılması gerçekçi olsun diye gürültülü gradyan
+    image = Image.effect_noise((width, height), 40 + seed % 30).convert('RGB')
+    overlay = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', (image.getchannel(0), overlay, image.getchannel(2)))
+    output = io.BytesIO()
+    if fmt == 'PNG':
+        image = image.convert('RGBA')
+        image.putalpha(overlay)
+    image.save(output, fmt, quality=92)
+    return output.getvalue()
+
+
+def start_origin(delay):
+    class OriginHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            ORIGIN_HITS[self.path] += 1
+            time.sleep(delay)
+            body = ORIGIN_IMAGES.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OriginHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def load_app(database_url, cache_dir):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['PAGE_CACHE_BACKEND'] = None
+    shop.app.config['IMAGE_CACHE_DIR'] = cache_dir
+    return shop
+
+
+def cache_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names if not name.startswith('.'))
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix='omimas-images-')
+    shop = load_app('sqlite:///' + os.path.join(work_dir, 'images.db'), os.path.join(work_dir, 'cache'))
+    if shop.Image is None:
+        sys.exit('Pillow kurulu değil: pip install Pillow')
+    Image = shop.Image
+    app, db = shop.app, shop.db
+    server, origin = start_origin(args.origin_delay)
+
+    ORIGIN_IMAGES['/large.jpg'] = make_image(Image, 2400, 1600, 'JPEG', 1)
+    ORIGIN_IMAGES['/alpha.png'] = make_image(Image, 900, 1200, 'PNG', 2)
+    ORIGIN_IMAGES['/small.jpg'] = make_image(Image, 200, 150, 'JPEG', 3)
+    ORIGIN_IMAGES['/concurrent.jpg'] = make_image(Image, 1600, 1600, 'JPEG', 4)
+    ORIGIN_IMAGES['/page.html'] = b'<html>not an image</html>'
+    for i in range(args.images):
+        ORIGIN_IMAGES[f'/lru-{i}.jpg'] = make_image(Image, 400, 400, 'JPEG', 10 + i)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(shop.Product.__table__.insert(), [
+            {'id': 1, 'name': 'Image item', 'price': 10.0, 'currency': 'PLN', 'stock': 5, 'category': 'beauty',
+             'image_url': origin + '/large.jpg', 'images': [origin + '/large.jpg', origin + '/alpha.png']}
+        ])
+        db.session.execute(shop.User.__table__.insert(), [
+            {'id': 1, 'username': 'images', 'email': 'images@omimas.pl', 'password_hash': 'x', 'is_active': True}
+        ])
+        db.session.execute(shop.Order.__table__.insert(), [
+            {'id': 1, 'order_number': 'IMG-0001', 'user_id': 1, 'total_amount': 10.0, 'status': 'paid',
+             'payment_status': 'completed', 'version': 1, 'item_count': 1, 'first_item_name': 'Image item',
+             'thumbnail_url': origin + '/large.jpg'}
+        ])
+        db.session.commit()
+
+    client = app.test_client()
+
+    def proxy_url(path, variant):
+        with app.test_request_context():
+            return shop.image_variant_url(origin + path, variant)
+
+    def get(url, accept=WEBP_ACCEPT, **headers):
+        return client.get(url, headers=dict(headers, Accept=accept))
+
+    report, failures = {'origin_bytes': {path: len(body) for path, body in ORIGIN_IMAGES.items()
+                                         if not path.startswith('/lru-')}}, []
+
+    def check(name, condition, detail):
+        report.setdefault('checks', {})[name] = condition
+        if not condition:
+            failures.append(f'{name}: {detail}')
+
+    # 1) Varyant boyutları ve biçimleri (Accept ile WebP/JPEG seçimi, büyütme yok)
+    variants = {}
+    for path, original_size in (('/large.jpg', (2400, 1600)), ('/alpha.png', (900, 1200)), ('/small.jpg', (200, 150))):
+        for variant, size in shop.IMAGE_VARIANTS.items():
+            for accept, fmt in ((WEBP_ACCEPT, 'WEBP'), (JPEG_ACCEPT, 'JPEG')):
+                response = get(proxy_url(path, variant), accept)
+                image = Image.open(io.BytesIO(response.data))
+                expected = min(size, max(original_size))
+                variants[f'{path} {variant} {fmt.lower()}'] = {'bytes': len(response.data), 'size': image.size}
+                check(f'variant {path} {variant} {fmt.lower()}',
+                      response.status_code == 200 and image.format == fmt and max(image.size) == expected,
+                      f'{response.status_code} {image.format} {image.size}, beklenen en uzun kenar {expected}')
+    report['variants'] = variants
+    check('origin fetched once per image', all(ORIGIN_HITS[path] == 1 for path in
+                                               ('/large.jpg', '/alpha.png', '/small.jpg')), dict(ORIGIN_HITS))
+
+    # 2) Önbellek başlıkları ve koşullu istek
+    response = get(proxy_url('/large.jpg', 'grid'))
+    check('immutable cache headers', bool('immutable' in response.headers.get('Cache-Control', '')
+          and response.headers.get('Vary') == 'Accept' and response.headers.get('ETag')), dict(response.headers))
+    revalidated = get(proxy_url('/large.jpg', 'grid'), **{'If-None-Match': response.headers['ETag']})
+    check('conditional request 304', revalidated.status_code == 304, revalidated.status_code)
+
+    # 3) Hatalar: imzasız/yanlış imzalı URL, bilinmeyen varyant, origin 404 (önbelleğe alınmaz), görsel olmayan yanıt
+    forged = client.get(f'/img/grid/0000000000000000?src={origin}/large.jpg')
+    check('bad signature 404', forged.status_code == 404, forged.status_code)
+    unknown = client.get(proxy_url('/large.jpg', 'grid').replace('/img/grid/', '/img/huge/'))
+    check('unknown variant 404', unknown.status_code == 404, unknown.status_code)
+    missing = [get(proxy_url('/missing.jpg', 'grid')).status_code for _ in range(2)]
+    check('origin 404 not cached', missing == [404, 404] and ORIGIN_HITS['/missing.jpg'] == 2,
+          f"{missing}, origin {ORIGIN_HITS['/missing.jpg']} kez çağrıldı")
+    not_image = get(proxy_url('/page.html', 'grid')).status_code
+    check('non-image origin 502', not_image == 502, not_image)
+
+    # 4) Eşzamanlı soğuk istekler: tüm varyant ve biçimler için origin tek kez çekilir
+    concurrent_urls = [(proxy_url('/concurrent.jpg', variant), accept)
+                       for variant in shop.IMAGE_VARIANTS for accept in (WEBP_ACCEPT, JPEG_ACCEPT)]
+
+    def fetch(request_spec):
+        url, accept = request_spec
+        started = time.perf_counter()
+        status = app.test_client().get(url, headers={'Accept': accept}).status_code
+        return status, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        cold = list(pool.map(fetch, concurrent_urls * (args.concurrency // len(concurrent_urls) + 1)))
+        warm = list(pool.map(fetch, concurrent_urls * (args.concurrency // len(concurrent_urls) + 1)))
+    check('concurrent cold requests share one origin fetch',
+          ORIGIN_HITS['/concurrent.jpg'] == 1 and all(status == 200 for status, _ in cold + warm),
+          f"origin {ORIGIN_HITS['/concurrent.jpg']} kez çağrıldı")
+    cold_ms, warm_ms = (sorted(elapsed * 1000 for _, elapsed in results) for results in (cold, warm))
+    report['latency_ms'] = {'cold_p50': round(cold_ms[len(cold_ms) // 2], 2),
+                            'warm_p50': round(warm_ms[len(warm_ms) // 2], 2)}
+
+    # 5) Şablonlar (sipariş geçmişi küçük resmi dahil) proxy URL'lerini kullanır ve hepsi çözülür
+    user_client = app.test_client()
+    with user_client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'images'
+    pages = {'/': client.get('/').get_data(as_text=True),
+             '/product/1': client.get('/product/1').get_data(as_text=True),
+             '/orders': user_client.get('/orders').get_data(as_text=True)}
+    proxied = {url.replace('&amp;', '&') for html in pages.values() for url in re.findall(r'(/img/[^"\' ]+)', html)}
+    direct = [url for html in pages.values() for url in re.findall(r'src="(http[^"]+)"', html) if origin in url]
+    check('templates use the image proxy', bool(proxied) and not direct and all(
+        client.get(url, headers={'Accept': WEBP_ACCEPT}).status_code == 200 for url in proxied),
+        f'{len(proxied)} proxy URL, {len(direct)} doğrudan origin URL')
+
+    # 6) Boyut sınırlı LRU: sınır aşılınca en uzun süredir kullanılmayanlar silinir, sıcak görsel kalır
+    shop.IMAGE_CACHE_TOUCH_INTERVAL = 0
+    app.config['IMAGE_CACHE_MAX_BYTES'] = args.cache_max_bytes
+    shop.image_cache = None
+    hot_url = proxy_url('/lru-0.jpg', 'grid')
+    for i in range(args.images):
+        get(proxy_url(f'/lru-{i}.jpg', 'grid'))
+        get(hot_url)
+        time.sleep(0.01)  # mtime çözünürlüğü
+    total = cache_bytes(app.config['IMAGE_CACHE_DIR'])
+    check('cache stays under size limit', total <= args.cache_max_bytes, f'{total} > {args.cache_max_bytes}')
+    check('hot image survives eviction', ORIGIN_HITS['/lru-0.jpg'] == 1, f"origin {ORIGIN_HITS['/lru-0.jpg']} kez çağrıldı")
+    refetch = get(proxy_url('/lru-1.jpg', 'grid'))
+    check('evicted image is rebuilt', refetch.status_code == 200 and ORIGIN_HITS['/lru-1.jpg'] == 2,
+          f"{refetch.status_code}, origin {ORIGIN_HITS['/lru-1.jpg']} kez çağrıldı")
+    report['lru'] = {'images': args.images, 'max_bytes': args.cache_max_bytes, 'cache_bytes': total}
+
+    server.shutdown()
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
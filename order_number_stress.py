@@ -0,0 +1,161 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter, defaultdict
+
+# Sipariş numarası stres testi: çok sayıda süreç aynı anda sepete ekleyip sipariş verir. Her sipariş
+# ilk denemede başarılı olmalı (create_order'da yeniden deneme yoktur, çakışma hata olarak görünür),
+# numaralar benzersiz ve gün başına 1..N boşluksuz olmalı, OrderSequence sayacı sipariş sayısına eşit olmalıdır.
+PRODUCT_ID = 1
+USER_PASSWORD_HASH = 'order-number-no-login'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Çok süreçli sipariş numarası benzersizlik testi (OrderSequence)')
+    parser.add_argument('--orders', type=int, default=2000, help='Verilecek sipariş (alıcı) sayısı')
+    parser.add_argument('--processes', type=int, default=8, help='Paralel süreç sayısı')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='SQLite dosyası (varsayılan: geçici dosya)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def load_app(database_url):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['PAYMENT_GATEWAY_URL'] = None
+    return shop
+
+
+def run_buyers(database_url, buyer_ids):
+    shop = load_app(database_url)
+    outcomes = Counter()
+    checkouts = []  # (başlangıç, bitiş) duvar saati
+    for user_id in buyer_ids:
+        client = shop.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = f'buyer{user_id}'
+        try:
+            client.post(f'/add_to_cart/{PRODUCT_ID}', data={'quantity': 1})
+            started = time.time()
+            response = client.post('/create_order', data={'shipping_address': 'Warsaw', 'payment_method': 'blik'})
+            checkouts.append((started, time.time()))
+            outcomes['orders' if response.json['success'] else 'failed'] += 1
+        except Exception:
+            # Benzersizlik ihlali (IntegrityError) veya kilit zaman aşımı buraya düşer
+            outcomes['errors'] += 1
+            traceback.print_exc(limit=1)
+    return outcomes, checkouts
+
+
+def seed_database(shop, args):
+    with shop.app.app_context():
+        shop.db.drop_all()
+        shop.db.create_all()
+        shop.db.session.execute(shop.Product.__table__.insert(), [
+            {'id': PRODUCT_ID, 'name': 'Order number item', 'price': 10.0, 'currency': 'PLN', 'stock': args.orders}
+        ])
+        shop.db.session.execute(shop.User.__table__.insert(), [
+            {'id': user_id, 'username': f'buyer{user_id}', 'email': f'buyer{user_id}@omimas.pl',
+             'password_hash': USER_PASSWORD_HASH, 'is_active': True}
+            for user_id in range(1, args.orders + 1)
+        ])
+        shop.db.session.commit()
+
+
+def collect_results(shop):
+    # Gün başına: sipariş sayısı, tekrar eden numaralar, 1..N'de eksik olanlar ve sayaç değeri
+    with shop.app.app_context():
+        numbers = [number for (number,) in shop.db.session.query(shop.Order.order_number)]
+        sequences = {row.day: row.last_value for row in shop.OrderSequence.query}
+        shop.db.session.remove()
+    by_day = defaultdict(list)
+    for number in numbers:
+        day, _, value = number[2:].partition('-')
+        by_day[day].append(int(value))
+    days = {}
+    for day, values in sorted(by_day.items()):
+        counts = Counter(values)
+        days[day] = {
+            'orders': len(values),
+            'duplicates': sorted(value for value, count in counts.items() if count > 1),
+            'gaps': sorted(set(range(1, max(values) + 1)) - set(values))[:20],
+            'sequence': sequences.get(day)
+        }
+    return numbers, days
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)]
+
+
+def main():
+    args = parse_args()
+    database_path = args.database or os.path.join(tempfile.mkdtemp(prefix='omimas-orderno-'), 'orderno.db')
+    database_url = 'sqlite:///' + os.path.abspath(database_path)
+    shop = load_app(database_url)
+    seed_database(shop, args)
+
+    buyer_ids = list(range(1, args.orders + 1))
+    random.Random(args.seed).shuffle(buyer_ids)
+    chunks = [buyer_ids[i::args.processes] for i in range(args.processes)]
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        results = pool.starmap(run_buyers, [(database_url, chunk) for chunk in chunks])
+    wall_time = time.perf_counter() - started
+
+    outcomes, checkouts = Counter(), []
+    for worker_outcomes, worker_checkouts in results:
+        outcomes.update(worker_outcomes)
+        checkouts.extend(worker_checkouts)
+    latencies = sorted(finished - started for started, finished in checkouts)
+    window = max(finished for _, finished in checkouts) - min(started for started, _ in checkouts) \
+        if checkouts else wall_time
+    numbers, days = collect_results(shop)
+
+    failures = []
+    if outcomes['orders'] != args.orders or outcomes['failed'] or outcomes['errors']:
+        failures.append(f"{outcomes['orders']}/{args.orders} sipariş ilk denemede verildi ({dict(outcomes)})")
+    if len(set(numbers)) != len(numbers):
+        failures.append(f'{len(numbers) - len(set(numbers))} tekrar eden sipariş numarası')
+    for day, state in days.items():
+        if state['duplicates'] or state['gaps'] or state['sequence'] != state['orders']:
+            failures.append(f'{day}: {state}')
+
+    report = {
+        'meta': {'orders': args.orders, 'processes': args.processes, 'wall_seconds': round(wall_time, 3),
+                 'checkout_window_seconds': round(window, 3)},
+        'outcomes': dict(outcomes),
+        'order_numbers': len(numbers),
+        'unique_order_numbers': len(set(numbers)),
+        'days': days,
+        'orders_per_second': round(len(latencies) / window, 2) if window else None,
+        'checkout_p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'checkout_p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'passed': not failures
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
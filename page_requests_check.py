@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from urllib.parse import urlsplit
+
+# Sayfa başına istek sayısı testi: her sayfa bir misafir ve bir kullanıcı olarak açılır; HTML'in
+# yüklettiği CSS/JS/görseller ve sayfa yüklenirken betiklerin açtığı bağlantılar (EventSource) sayılır.
+# Tekrar ziyarette yalnızca immutable olmayan yerel dosyalar yeniden istenir. Sepet rozeti HTML'e
+# yazıldığı için sayfalar sepet sayısını sorgulamamalı, sonucu geri yazmamalı ve zamanlayıcıyla
+# yoklama yapmamalıdır; görüntülemeler oturum çerezini de yeniden yazmamalıdır.
+USER_ID = 1
+PRODUCT_IDS = (1, 2)
+ORDER_NUMBER = 'PR-0001'
+# Sepet rozetinin eski yoklama/geri yazma yolları ve zamanlayıcı
+POLLING_PATTERNS = ('/api/cart_count', '/api/update_session_cart', 'setInterval(')
+SUBRESOURCE_PATTERN = re.compile(r'<(?:link[^>]+rel="stylesheet"[^>]*href|script[^>]+src|img[^>]+src)="([^"]+)"')
+INLINE_SCRIPT_PATTERN = re.compile(r'<script(?![^>]*\bsrc=)[^>]*>(.*?)</script>', re.S)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Sayfa görüntüleme başına istek sayısı testi (sepet rozeti yoklaması yok)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def load_app(database_url):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['PAYMENT_GATEWAY_URL'] = None
+    return shop
+
+
+def seed_database(shop):
+    app, db = shop.app, shop.db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(shop.Product.__table__.insert(), [
+            {'id': product_id, 'name': f'Request item {product_id}', 'price': 10.0, 'currency': 'PLN', 'stock': 100,
+             'category': 'beauty', 'image_url': f'https://cdn.example.com/{product_id}.jpg', 'images': []}
+            for product_id in PRODUCT_IDS
+        ])
+        db.session.execute(shop.User.__table__.insert(), [
+            {'id': USER_ID, 'username': 'requests', 'email': 'requests@omimas.pl', 'password_hash': 'x',
+             'is_active': True}
+        ])
+        db.session.execute(shop.Order.__table__.insert(), [
+            {'id': 1, 'order_number': ORDER_NUMBER, 'user_id': USER_ID, 'total_amount': 10.0, 'status': 'paid',
+             'payment_method': 'blik', 'payment_status': 'completed', 'shipping_address': 'Warsaw', 'version': 1}
+        ])
+        db.session.execute(shop.OrderItem.__table__.insert(), [
+            {'order_id': 1, 'product_id': PRODUCT_IDS[0], 'quantity': 1, 'price': 10.0}
+        ])
+        db.session.commit()
+        shop.sync_product_categories()
+        db.session.commit()
+        shop.backfill_order_summaries()
+        db.session.remove()
+
+
+def page_requests(client, path):
+    # Bir sayfa görüntülemesinin yol açtığı istekler: belge, alt kaynaklar ve yüklemede açılan bağlantılar
+    response = client.get(path, headers={'Accept-Encoding': 'br, gzip'})
+    html = response.get_data(as_text=True)
+    local, external, immutable = [], [], []
+    scripts = INLINE_SCRIPT_PATTERN.findall(html)
+    for url in dict.fromkeys(url.replace('&amp;', '&') for url in SUBRESOURCE_PATTERN.findall(html)):
+        if urlsplit(url).netloc:
+            external.append(url)
+            continue
+        local.append(url)
+        if url.startswith('/img/'):
+            # Görsel proxy'si yanıtları immutable (image_proxy_check.py); origin'e gitmemek için istenmez
+            immutable.append(url)
+            continue
+        asset = client.get(url, headers={'Accept-Encoding': 'identity'})
+        if 'immutable' in asset.headers.get('Cache-Control', ''):
+            immutable.append(url)
+        if url.endswith('.js'):
+            scripts.append(asset.get_data(as_text=True))
+    script_text = '\n'.join(scripts)
+    connections = script_text.count('new EventSource(')
+    return {
+        'status': response.status_code,
+        'first_view_requests': 1 + len(local) + len(external) + connections,
+        'repeat_view_requests': 1 + len(local) - len(immutable) + connections,
+        'local_subresources': len(local),
+        'external_subresources': len(external),
+        'on_load_connections': connections,
+        'polling': [pattern for pattern in POLLING_PATTERNS if pattern in script_text],
+        'sets_cookie': 'Set-Cookie' in response.headers
+    }
+
+
+def main():
+    args = parse_args()
+    database_path = os.path.join(tempfile.mkdtemp(prefix='omimas-requests-'), 'requests.db')
+    shop = load_app('sqlite:///' + database_path)
+    seed_database(shop)
+    app = shop.app
+
+    guest = app.test_client()
+    user = app.test_client()
+    with user.session_transaction() as session:
+        session['user_id'] = USER_ID
+        session['username'] = 'requests'
+
+    report, failures = {}, []
+
+    def check(name, condition, detail):
+        report.setdefault('checks', {})[name] = condition
+        if not condition:
+            failures.append(f'{name}: {detail}')
+
+    # Sepete ekleme yanıtı rozet sayısını taşır (ayrı sayım isteği gerekmez)
+    added = [user.post(f'/add_to_cart/{product_id}', data={'quantity': 1}).json for product_id in PRODUCT_IDS]
+    check('add_to_cart returns cart_count', [body.get('cart_count') for body in added] == [1, 2],
+          [body.get('cart_count') for body in added])
+
+    pages = {
+        'guest': (guest, ['/', f'/product/{PRODUCT_IDS[0]}', '/category/beauty', '/search?q=request', '/cart']),
+        'user': (user, ['/', f'/product/{PRODUCT_IDS[0]}', '/cart', '/checkout', '/orders', f'/order/{ORDER_NUMBER}',
+                        '/account'])
+    }
+    for visitor, (client, paths) in pages.items():
+        report[visitor] = {}
+        for path in paths:
+            result = page_requests(client, path)
+            report[visitor][path] = result
+            check(f'{visitor} {path}',
+                  result['status'] == 200 and not result['polling'] and not result['sets_cookie']
+                  and result['repeat_view_requests'] == 1 + result['on_load_connections'],
+                  result)
+
+    # Rozet sunucuda hesaplanmış olarak gelir; geri yazma uç noktası yok
+    badge = re.search(r'class="cart-count">\((\d+)\)', user.get('/').get_data(as_text=True))
+    check('cart badge rendered', badge is not None and badge.group(1) == str(len(PRODUCT_IDS)),
+          badge.group(0) if badge else 'rozet yok')
+    write_back = user.post('/api/update_session_cart', json={'count': 0}).status_code
+    check('write-back endpoint removed', write_back == 404, write_back)
+
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Ödeme ağ geçidi testi: yerel sahte bir ağ geçidi her sipariş numarası için senaryodaki yanıtları sırayla
+# verir (onay, ret, 503, yavaş yanıt). Arka plan işleri bu süreçte çalıştırılır ve siparişin ödeme
+# durumu, iş denemeleri ve kargo etiketi doğrulanır. Yeniden deneme sınırı dolan yetkilendirmede ödeme
+# 'processing'de takılı kalmamalı, müşteri tekrar ödeyebilmelidir.
+USER_ID = 1
+BLIK_FORM = {'blik_code': '123456'}
+SCENARIOS = {
+    'approved': ['approve'],
+    'declined': ['decline'],
+    'transient_errors': ['503', '503', 'approve'],
+    'gateway_down': ['503'],  # son yanıt tekrar eder: hiç düzelmez
+    'timeout_then_approved': ['slow', 'approve'],
+}
+GATEWAY_CALLS = Counter()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Ödeme ağ geçidi ve yetkilendirme işi testi (yerel sahte ağ geçidi ile)')
+    parser.add_argument('--timeout', type=float, default=0.5, help='Ağ geçidi zaman aşımı (sn)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def start_gateway(scripts, slow_seconds):
+    class GatewayHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            script = scripts[payload['order_number']]
+            action = script[min(GATEWAY_CALLS[payload['order_number']], len(script) - 1)]
+            GATEWAY_CALLS[payload['order_number']] += 1
+            if action == 'slow':
+                time.sleep(slow_seconds)
+            if action == '503':
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = json.dumps({'approved': action != 'decline'}).encode()
+            try:
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except BrokenPipeError:
+                pass  # 'slow': istemci zaman aşımıyla bağlantıyı kapattı
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GatewayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/authorize'
+
+
+def load_app(database_url):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['JOB_RETRY_BASE_SECONDS'] = 0  # yeniden denemeler beklemeden çalışır
+    return shop
+
+
+def main():
+    args = parse_args()
+    database_path = os.path.join(tempfile.mkdtemp(prefix='omimas-gateway-'), 'gateway.db')
+    shop = load_app('sqlite:///' + database_path)
+    app, db = shop.app, shop.db
+    order_numbers = {name: f'OMGW-{i}' for i, name in enumerate(SCENARIOS, 1)}
+    server, gateway_url = start_gateway({order_numbers[name]: script for name, script in SCENARIOS.items()},
+                                        args.timeout * 2)
+    app.config['PAYMENT_GATEWAY_URL'] = gateway_url
+    app.config['PAYMENT_GATEWAY_TIMEOUT'] = args.timeout
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(shop.User.__table__.insert(), [
+            {'id': USER_ID, 'username': 'gateway', 'email': 'gateway@omimas.pl', 'password_hash': 'x', 'is_active': True}
+        ])
+        db.session.execute(shop.Order.__table__.insert(), [
+            {'id': i, 'order_number': order_numbers[name], 'user_id': USER_ID, 'total_amount': 100.0,
+             'status': 'pending', 'payment_status': 'pending', 'version': 1}
+            for i, name in enumerate(SCENARIOS, 1)
+        ])
+        db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = USER_ID
+        session['username'] = 'gateway'
+
+    def pay(order_id):
+        return client.post(f'/pay_with_blik/{order_id}', data=BLIK_FORM)
+
+    def run_jobs():
+        # Yeniden denemeler dahil kuyruk boşalana kadar (kargo aşamaları gecikmeli olduğu için beklemez)
+        with app.app_context():
+            processed = shop.run_pending_jobs()
+            db.session.remove()
+            return processed
+
+    def order_state(order_id):
+        with app.app_context():
+            order = db.session.get(shop.Order, order_id)
+            jobs = shop.Job.query.filter_by(order_id=order_id, kind='authorize_payment').all()
+            state = {'payment_status': order.payment_status, 'status': order.status,
+                     'tracking_labels': shop.ShippingTracking.query.filter_by(order_id=order_id).count(),
+                     'authorize_jobs': [{'status': job.status, 'attempts': job.attempts} for job in jobs]}
+            db.session.remove()
+            return state
+
+    report, failures = {}, []
+
+    def check(name, condition, detail):
+        report[name]['passed'] = condition
+        if not condition:
+            failures.append(f'{name}: {detail}')
+
+    for order_id, name in enumerate(SCENARIOS, 1):
+        first = pay(order_id)
+        run_jobs()
+        report[name] = {'pay_status': first.status_code, 'gateway_calls': GATEWAY_CALLS[order_numbers[name]],
+                        **order_state(order_id)}
+        # Sonuçlanan ödemeden sonra tekrar ödeme denemesi: ödenmişse 409, başarısızsa yeni ödeme (202)
+        report[name]['retry_pay_status'] = pay(order_id).status_code
+
+    state = report['approved']
+    check('approved', state['payment_status'] == 'completed' and state['tracking_labels'] == 1
+          and state['retry_pay_status'] == 409, state)
+    state = report['declined']
+    check('declined', state['payment_status'] == 'failed' and state['tracking_labels'] == 0
+          and state['retry_pay_status'] == 202, state)
+    state = report['transient_errors']
+    check('transient_errors', state['payment_status'] == 'completed' and state['authorize_jobs'][0]['attempts'] == 3,
+          state)
+    state = report['timeout_then_approved']
+    check('timeout_then_approved', state['payment_status'] == 'completed' and state['gateway_calls'] == 2, state)
+
+    # Deneme sınırı doldu: iş 'failed', ödeme de 'failed' olmalı ve müşteri tekrar ödeyebilmeli (409 değil)
+    state = report['gateway_down']
+    check('gateway_down', state['payment_status'] == 'failed'
+          and [(job['status'], job['attempts']) for job in state['authorize_jobs']] == [('failed', 5)]
+          and state['retry_pay_status'] == 202, state)
+
+    server.shutdown()
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
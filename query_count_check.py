@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Sorgu sayısı testi: her sayfa az veriyle (1 ürün/sipariş/yorum) ve çok veriyle (50 kalemlik sepet,
+# 100 siparişlik geçmiş, 30 yorum, dolu kategori ve arama) açılır. X-SQL-Query-Count iki durumda
+# aynı olmalıdır; satır başına ek sorgu (N+1) varsa sayı veriyle birlikte büyür.
+SMALL_USER_ID = 1
+LARGE_USER_ID = 2
+SMALL_PRODUCT_ID = 1
+REVIEWS = 30
+ITEMS_PER_ORDER = 3
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Sepet, ödeme, sipariş ve liste sayfaları için sabit sorgu sayısı testi')
+    parser.add_argument('--items', type=int, default=50, help='Büyük sepetteki farklı ürün sayısı')
+    parser.add_argument('--orders', type=int, default=100, help='Büyük sipariş geçmişindeki sipariş sayısı')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def load_app(database_url):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['SQL_QUERY_COUNT_HEADER'] = True
+    shop.page_cache = None  # her istek veritabanına gitsin
+    return shop
+
+
+def seed_database(shop, args):
+    # Ürün 1 tek başına 'beauty' kategorisinde ve tek yorumlu; diğerleri 'groceries'de
+    app, db = shop.app, shop.db
+    now = datetime.utcnow()
+    product_count = max(args.items, shop.LISTING_PAGE_SIZE) + 1
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(shop.Category.__table__.insert(), [
+            {'name': 'Beauty', 'slug': 'beauty'}, {'name': 'Groceries', 'slug': 'groceries'}
+        ])
+        db.session.execute(shop.Product.__table__.insert(), [
+            {'id': product_id, 'name': f'Lampa {product_id}' + (' unikat' if product_id == SMALL_PRODUCT_ID else ''),
+             'price': 10.0 + product_id, 'currency': 'PLN', 'stock': 1000,
+             'category': 'beauty' if product_id == SMALL_PRODUCT_ID else 'groceries',
+             'image_url': f'https://cdn.example.com/{product_id}.jpg', 'images': [],
+             'created_at': now - timedelta(minutes=product_id)}
+            for product_id in range(1, product_count + 1)
+        ])
+        # Yorumlar farklı kullanıcılardan: aynı kullanıcı kimlik haritasından gelir, N+1'i gizler
+        db.session.execute(shop.User.__table__.insert(), [
+            {'id': user_id, 'username': f'query{user_id}', 'email': f'query{user_id}@omimas.pl',
+             'password_hash': 'x', 'is_active': True}
+            for user_id in range(1, REVIEWS + 3)
+        ])
+        db.session.execute(shop.Review.__table__.insert(), [
+            {'product_id': SMALL_PRODUCT_ID, 'user_id': SMALL_USER_ID, 'rating': 5, 'comment': 'Solo',
+             'is_approved': True, 'created_at': now}
+        ] + [
+            {'product_id': 2, 'user_id': user_id, 'rating': 4, 'comment': f'Review {user_id}', 'is_approved': True,
+             'created_at': now - timedelta(minutes=user_id)}
+            for user_id in range(3, REVIEWS + 3)
+        ])
+
+        # Küçük kullanıcı: tek kalemli bir sipariş; büyük kullanıcı: ilki sepet kadar kalemli olmak üzere
+        # args.orders sipariş
+        orders, items = [], []
+        for order_id in range(1, args.orders + 2):
+            user_id = SMALL_USER_ID if order_id == 1 else LARGE_USER_ID
+            product_ids = [SMALL_PRODUCT_ID] if order_id == 1 else \
+                range(1, args.items + 1) if order_id == 2 else range(order_id % 10 + 1, order_id % 10 + 1 + ITEMS_PER_ORDER)
+            orders.append({'id': order_id, 'order_number': f'QC-{order_id:04d}', 'user_id': user_id,
+                           'total_amount': 10.0 * len(product_ids), 'status': 'paid', 'payment_method': 'blik',
+                           'payment_status': 'completed', 'shipping_address': 'Warsaw',
+                           'created_at': now - timedelta(hours=order_id), 'version': 1})
+            items.extend({'order_id': order_id, 'product_id': product_id, 'quantity': 1, 'price': 10.0}
+                         for product_id in product_ids)
+        db.session.execute(shop.Order.__table__.insert(), orders)
+        db.session.execute(shop.OrderItem.__table__.insert(), items)
+        db.session.commit()
+        shop.sync_product_categories()
+        db.session.commit()  # arama indeksi ayrı bağlantıdan yazılır
+        shop.rebuild_search_index()
+        shop.backfill_order_summaries()
+        shop.rebuild_product_ratings()
+        db.session.remove()
+    return product_count
+
+
+def make_client(shop, user_id=None):
+    client = shop.app.test_client()
+    if user_id:
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = f'query{user_id}'
+    return client
+
+
+def fill_cart(client, product_ids):
+    # Gerçek add_to_cart yolu (rezervasyonlar ve sepet sayacı dahil)
+    for product_id in product_ids:
+        response = client.post(f'/add_to_cart/{product_id}', data={'quantity': 1})
+        if not response.json['success']:
+            raise RuntimeError(f'add_to_cart {product_id}: {response.json}')
+
+
+def main():
+    args = parse_args()
+    database_path = os.path.join(tempfile.mkdtemp(prefix='omimas-queries-'), 'queries.db')
+    shop = load_app('sqlite:///' + database_path)
+    seed_database(shop, args)
+
+    clients = {'small': make_client(shop, SMALL_USER_ID), 'large': make_client(shop, LARGE_USER_ID),
+               'guest_small': make_client(shop), 'guest_large': make_client(shop)}
+    fill_cart(clients['small'], [SMALL_PRODUCT_ID])
+    fill_cart(clients['large'], range(1, args.items + 1))
+    fill_cart(clients['guest_small'], [SMALL_PRODUCT_ID])
+    fill_cart(clients['guest_large'], range(1, args.items + 1))
+
+    # sayfa -> (az veri, çok veri): (istemci, yol)
+    pages = {
+        'cart': (('small', '/cart'), ('large', '/cart')),
+        'cart_guest': (('guest_small', '/cart'), ('guest_large', '/cart')),
+        'checkout': (('small', '/checkout'), ('large', '/checkout')),
+        'order_history': (('small', '/orders'), ('large', '/orders')),
+        'order_tracking': (('small', '/order/QC-0001'), ('large', '/order/QC-0002')),
+        'product_detail': (('guest_small', f'/product/{SMALL_PRODUCT_ID}'), ('guest_small', '/product/2')),
+        'category': (('guest_small', '/category/beauty'), ('guest_small', '/category/groceries')),
+        'search': (('guest_small', '/search?q=unikat'), ('guest_small', '/search?q=lampa')),
+    }
+    report, failures = {'meta': {'items': args.items, 'orders': args.orders, 'reviews': REVIEWS}}, []
+    for name, cases in pages.items():
+        counts = []
+        for client_name, path in cases:
+            response = clients[client_name].get(path)
+            if response.status_code != 200:
+                failures.append(f'{name}: {path} -> {response.status_code}')
+            counts.append(int(response.headers.get('X-SQL-Query-Count', -1)))
+        report[name] = {'small': counts[0], 'large': counts[1], 'passed': counts[0] == counts[1]}
+        if counts[0] != counts[1]:
+            failures.append(f'{name}: {counts[0]} -> {counts[1]} sorgu')
+
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Payment method değişince formları göster/gizle
+    const paymentMethods = document.querySelectorAll('input[name="payment_method"]');
+    const creditCardForm = document.getElementById('creditCardForm');
+    const blikForm = document.getElementById('blikForm');
+
+    paymentMethods.forEach(method => {
+        method.addEventListener('change', function() {
+            if (this.value === 'credit_card') {
+                creditCardForm.style.display = 'block';
+                blikForm.style.display = 'none';
+            } else {
+                creditCardForm.style.display = 'none';
+                blikForm.style.display = 'block';
+            }
+        });
+    });
+
+    // Tekrar denemeler aynı Idempotency-Key ile gider: çift tıklama veya ağ hatası sonrası
+    // yeniden gönderim ikinci bir sipariş/ödeme oluşturmaz. Sunucu isteği reddederse yeni anahtar alınır.
+    let orderKey = newIdempotencyKey();
+    let paymentKey = newIdempotencyKey();
+    let orderData = null;
+    let submitting = false;
+
+    // Form submission
+    document.getElementById('checkoutForm').addEventListener('submit', async function(e) {
+        e.preventDefault();
+        if (submitting) {
+            return;
+        }
+        submitting = true;
+
+        const formData = new FormData(this);
+        const paymentMethod = formData.get('payment_method');
+
+        try {
+            // Önce sipariş oluştur (ödeme tekrar deneniyorsa mevcut sipariş kullanılır)
+            if (!orderData) {
+                const orderResponse = await fetch('/create_order', {
+                    method: 'POST',
+                    headers: {'Idempotency-Key': orderKey},
+                    body: formData
+                });
+
+                const createdOrder = await orderResponse.json();
+
+                if (!createdOrder.success) {
+                    orderKey = newIdempotencyKey();
+                    throw new Error(createdOrder.message);
+                }
+                orderData = createdOrder;
+            }
+
+            // Ödeme yap
+            const paymentUrl = paymentMethod === 'credit_card' ? '/pay_with_credit_card/' : '/pay_with_blik/';
+            const paymentResponse = await fetch(paymentUrl + orderData.order_id, {
+                method: 'POST',
+                headers: {'Idempotency-Key': paymentKey},
+                body: formData
+            });
+
+            const paymentData = await paymentResponse.json();
+
+            if (paymentData.success) {
+                alert('Payment is being processed. Order number: ' + orderData.order_number);
+                window.location.href = '/order/' + orderData.order_number;
+            } else {
+                paymentKey = newIdempotencyKey();
+                throw new Error(paymentData.message);
+            }
+
+        } catch (error) {
+            alert('Payment failed: ' + error.message);
+        } finally {
+            submitting = false;
+        }
+    });
+});
+
+function newIdempotencyKey() {
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    return Array.from(bytes, byte => byte.toString(16).padStart(2, '0')).join('');
+}
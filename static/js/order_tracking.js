@@ -0,0 +1,56 @@
+async function simulateOrder(orderNumber) {
+    try {
+        const response = await fetch('/api/simulate_order/' + orderNumber);
+        const data = await response.json();
+
+        if (data.success) {
+            showFlashMessage('Status updated: ' + data.message, 'success');
+        } else {
+            alert('Error: ' + data.message);
+        }
+    } catch (error) {
+        alert('Simulation error: ' + error.message);
+    }
+}
+
+// Durum değişiklikleri sunucudan gelir (SSE); sayfa yenilenmez, DOM yerinde güncellenir
+const ORDER_STEPS = ['confirmed', 'processing', 'shipped', 'out_for_delivery', 'delivered'];
+
+function titleCase(value) {
+    return value.replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase());
+}
+
+function applyOrderUpdate(data) {
+    const reached = ORDER_STEPS.indexOf(data.status);
+    document.querySelectorAll('.tracking-step').forEach(step => {
+        step.classList.toggle('completed', ORDER_STEPS.indexOf(step.dataset.step) <= reached && reached >= 0);
+    });
+
+    const status = document.getElementById('order-status');
+    status.className = 'status-' + data.status;
+    status.textContent = titleCase(data.status);
+
+    const paymentStatus = document.getElementById('payment-status');
+    paymentStatus.className = 'status-' + data.payment_status;
+    paymentStatus.textContent = titleCase(data.payment_status);
+
+    if (data.tracking) {
+        document.getElementById('tracking-number').textContent = data.tracking.tracking_number;
+        document.getElementById('tracking-carrier').textContent = data.tracking.carrier;
+        document.getElementById('tracking-delivery').textContent = data.tracking.estimated_delivery || '';
+        document.getElementById('tracking-info').hidden = false;
+    }
+}
+
+// Teslim edilmiş siparişlerde şablon olay adresi vermez, bağlantı açılmaz
+const trackingContainer = document.querySelector('.order-tracking-container');
+if (trackingContainer.dataset.eventsUrl) {
+    const orderEvents = new EventSource(trackingContainer.dataset.eventsUrl);
+    orderEvents.addEventListener('status', event => {
+        const data = JSON.parse(event.data);
+        applyOrderUpdate(data);
+        if (data.status === 'delivered') {
+            orderEvents.close();
+        }
+    });
+}
@@ -0,0 +1,87 @@
+function changeMainImage(imageUrl, zoomUrl) {
+    const image = document.getElementById('mainProductImage');
+    image.src = imageUrl;
+    image.srcset = zoomUrl ? zoomUrl + ' 2x' : '';
+}
+
+function increaseQuantity() {
+    const input = document.getElementById('quantity');
+    if (input.value < 10) input.value++;
+}
+
+function decreaseQuantity() {
+    const input = document.getElementById('quantity');
+    if (input.value > 1) input.value--;
+}
+
+function addToCartFromProductPage(productId) {
+    const quantity = document.getElementById('quantity').value;
+    addToCart(productId, parseInt(quantity));
+}
+
+function addToCart(productId, quantity = 1) {
+    const formData = new FormData();
+    formData.append('quantity', quantity);
+
+    fetch('/add_to_cart/' + productId, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            alert('Product added to cart: ' + data.message);
+            setCartCount(data.cart_count);
+        } else {
+            alert('Error: ' + data.message);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('An error occurred while adding to cart');
+    });
+}
+
+function buyNow(productId) {
+    const quantity = document.getElementById('quantity').value;
+    addToCart(productId, parseInt(quantity));
+
+    // Sepete ekledikten sonra checkout sayfasına yönlendir
+    setTimeout(() => {
+        window.location.href = '/checkout';
+    }, 1000);
+}
+
+// Star rating interaction
+document.addEventListener('DOMContentLoaded', function() {
+    const starInputs = document.querySelectorAll('.star-rating input');
+    const starLabels = document.querySelectorAll('.star-rating label');
+
+    starLabels.forEach((label, index) => {
+        label.addEventListener('mouseenter', function() {
+            for (let i = 0; i <= index; i++) {
+                starLabels[i].style.color = '#f39c12';
+            }
+        });
+
+        label.addEventListener('mouseleave', function() {
+            const checkedInput = document.querySelector('.star-rating input:checked');
+            if (checkedInput) {
+                const checkedIndex = Array.from(starInputs).indexOf(checkedInput);
+                starLabels.forEach((label, i) => {
+                    label.style.color = i <= checkedIndex ? '#f39c12' : '#ddd';
+                });
+            } else {
+                starLabels.forEach(label => label.style.color = '#ddd');
+            }
+        });
+    });
+
+    starInputs.forEach((input, index) => {
+        input.addEventListener('change', function() {
+            starLabels.forEach((label, i) => {
+                label.style.color = i <= index ? '#f39c12' : '#ddd';
+            });
+        });
+    });
+});
@@ -0,0 +1,189 @@
+// Sepet rozetini güncelle (sayı sunucudan gelir, ek istek yok)
+function setCartCount(count) {
+    document.querySelectorAll('.cart-count').forEach(element => {
+        element.textContent = '(' + count + ')';
+    });
+}
+
+// Sepete ekleme fonksiyonu
+function addToCart(productId, quantity = 1) {
+    const formData = new FormData();
+    formData.append('quantity', quantity);
+
+    showLoadingIndicator(true);
+
+    fetch('/add_to_cart/' + productId, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (data.success) {
+            // Sepet sayacını güncelle
+            setCartCount(data.cart_count);
+
+            // Başarı mesajı göster
+            showFlashMessage(data.message, 'success');
+
+            // Eğer misafir kullanıcıysa ve login önerisi göster
+            if (data.type === 'guest') {
+                setTimeout(() => {
+                    if (confirm('Would you like to login or register to save your cart permanently?')) {
+                        window.location.href = '/register?redirect=' + encodeURIComponent(window.location.pathname);
+                    }
+                }, 1500);
+            }
+        } else {
+            showFlashMessage(data.message, 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error adding to cart:', error);
+        showFlashMessage('An error occurred while adding to cart. Please try again.', 'error');
+    })
+    .finally(() => {
+        showLoadingIndicator(false);
+    });
+}
+
+// Flash mesajı gösterimi
+function showFlashMessage(message, type = 'info') {
+    // Mevcut flash mesajlarını temizle
+    const existingAlerts = document.querySelectorAll('.flash-message');
+    existingAlerts.forEach(alert => alert.remove());
+
+    // Yeni flash mesajı oluştur
+    const flashMessage = document.createElement('div');
+    flashMessage.className = `flash-message alert alert-${type}`;
+    flashMessage.textContent = message;
+    flashMessage.style.cssText = `
+        position: fixed;
+        top: 100px;
+        right: 20px;
+        z-index: 10000;
+        min-width: 300px;
+        max-width: 500px;
+        animation: slideIn 0.3s ease-out;
+    `;
+
+    document.body.appendChild(flashMessage);
+
+    // 5 saniye sonra otomatik kapat
+    setTimeout(() => {
+        if (flashMessage.parentNode) {
+            flashMessage.style.animation = 'slideOut 0.3s ease-in';
+            setTimeout(() => {
+                if (flashMessage.parentNode) {
+                    flashMessage.parentNode.removeChild(flashMessage);
+                }
+            }, 300);
+        }
+    }, 5000);
+
+    // Kapatma butonu ekle
+    const closeBtn = document.createElement('button');
+    closeBtn.innerHTML = '&times;';
+    closeBtn.style.cssText = `
+        position: absolute;
+        top: 5px;
+        right: 10px;
+        background: none;
+        border: none;
+        font-size: 20px;
+        cursor: pointer;
+        color: inherit;
+    `;
+    closeBtn.onclick = () => {
+        if (flashMessage.parentNode) {
+            flashMessage.parentNode.removeChild(flashMessage);
+        }
+    };
+    flashMessage.appendChild(closeBtn);
+}
+
+// Yükleniyor göstergesi
+function showLoadingIndicator(show) {
+    let loader = document.getElementById('global-loader');
+
+    if (show) {
+        if (!loader) {
+            loader = document.createElement('div');
+            loader.id = 'global-loader';
+            loader.style.cssText = `
+                position: fixed;
+                top: 0;
+                left: 0;
+                width: 100%;
+                height: 3px;
+                background: linear-gradient(90deg, #ff6b35, #ff8c35, #ff6b35);
+                background-size: 200% 100%;
+                animation: loading 1.5s infinite;
+                z-index: 9999;
+            `;
+            document.body.appendChild(loader);
+
+            // Animasyon için CSS ekle
+            const style = document.createElement('style');
+            style.textContent = `
+                @keyframes loading {
+                    0% { background-position: 200% 0; }
+                    100% { background-position: -200% 0; }
+                }
+                @keyframes slideIn {
+                    from { transform: translateX(100%); opacity: 0; }
+                    to { transform: translateX(0); opacity: 1; }
+                }
+                @keyframes slideOut {
+                    from { transform: translateX(0); opacity: 1; }
+                    to { transform: translateX(100%); opacity: 0; }
+                }
+            `;
+            document.head.appendChild(style);
+        }
+    } else {
+        if (loader) {
+            loader.remove();
+        }
+    }
+}
+
+// Sayfa yüklendiğinde
+document.addEventListener('DOMContentLoaded', function() {
+    // Form gönderimlerinde loading göster
+    const forms = document.querySelectorAll('form');
+    forms.forEach(form => {
+        form.addEventListener('submit', function() {
+            showLoadingIndicator(true);
+        });
+    });
+
+    // Link tıklamalarında loading göster
+    const links = document.querySelectorAll('a');
+    links.forEach(link => {
+        link.addEventListener('click', function(e) {
+            if (this.href && !this.href.includes('javascript:')) {
+                showLoadingIndicator(true);
+            }
+        });
+    });
+});
+
+// Global error handler
+window.addEventListener('error', function(e) {
+    console.error('Global error:', e.error);
+    showFlashMessage('An unexpected error occurred. Please refresh the page.', 'error');
+});
+
+// Online/offline durum takibi
+window.addEventListener('online', function() {
+    showFlashMessage('Connection restored!', 'success');
+});
+
+window.addEventListener('offline', function() {
+    showFlashMessage('You are currently offline. Some features may not work.', 'warning');
+});
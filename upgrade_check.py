@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+# Yükseltme testi: ilk sürümün şemasıyla (baseline) oluşturulmuş ve veri içeren bir veritabanında
+# init_database çalıştırılır. Eksik sütunlar eklenmeli, veriler korunmalı, geriye dönük doldurmalar
+# (resim listesi, kategori, puan özeti, arama indeksi, sipariş özeti, sayaçlar, analitik) çalışmalı
+# ve sayfalar açılmalıdır. İkinci çalıştırma hiçbir şey değiştirmemelidir.
+BASELINE_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+    password_hash VARCHAR(200) NOT NULL, first_name VARCHAR(100), last_name VARCHAR(100), phone VARCHAR(20),
+    created_at DATETIME, is_active BOOLEAN,
+    PRIMARY KEY (id), UNIQUE (username), UNIQUE (email)
+);
+CREATE TABLE product (
+    id INTEGER NOT NULL, name VARCHAR(200) NOT NULL, price FLOAT NOT NULL, currency VARCHAR(10),
+    image_url VARCHAR(500), category VARCHAR(100), description TEXT, images TEXT, created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE TABLE category (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, slug VARCHAR(100),
+    PRIMARY KEY (id), UNIQUE (slug)
+);
+CREATE TABLE cart (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER,
+    added_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id), FOREIGN KEY(product_id) REFERENCES product (id)
+);
+CREATE TABLE review (
+    id INTEGER NOT NULL, product_id INTEGER NOT NULL, user_id INTEGER NOT NULL, rating INTEGER NOT NULL,
+    comment TEXT NOT NULL, created_at DATETIME, is_approved BOOLEAN,
+    PRIMARY KEY (id), FOREIGN KEY(product_id) REFERENCES product (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE "order" (
+    id INTEGER NOT NULL, order_number VARCHAR(20) NOT NULL, user_id INTEGER NOT NULL, total_amount FLOAT NOT NULL,
+    status VARCHAR(50), payment_method VARCHAR(50), payment_status VARCHAR(50), blik_code VARCHAR(6),
+    shipping_address TEXT, billing_address TEXT, created_at DATETIME, updated_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (order_number), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE order_item (
+    id INTEGER NOT NULL, order_id INTEGER NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL,
+    price FLOAT NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(order_id) REFERENCES "order" (id), FOREIGN KEY(product_id) REFERENCES product (id)
+);
+CREATE TABLE shipping_tracking (
+    id INTEGER NOT NULL, order_id INTEGER NOT NULL, tracking_number VARCHAR(50), carrier VARCHAR(100),
+    status VARCHAR(100), estimated_delivery DATETIME, actual_delivery DATETIME, created_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(order_id) REFERENCES "order" (id), UNIQUE (tracking_number)
+);
+'''
+CATEGORIES = ['smartphones', 'laptops', 'fragrances']
+USER_PASSWORD = 'upgrade-pass'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Baseline şemalı veritabanında init_database yükseltme testi')
+    parser.add_argument('--products', type=int, default=60)
+    parser.add_argument('--orders', type=int, default=40)
+    parser.add_argument('--database', help='SQLite dosyası (varsayılan: geçici dosya)')
+    parser.add_argument('--output', help='JSON sonucun yazılacağı dosya (varsayılan: stdout)')
+    return parser.parse_args()
+
+
+def create_baseline_database(path, args):
+    # Baseline uygulamasının yazdığı biçimde veri: images Python repr'i, sipariş numarası OMYYYYMMDD-NNNN
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    now = datetime.utcnow()
+    connection.executemany('INSERT INTO user VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+        (user_id, f'user{user_id}', f'user{user_id}@omimas.pl', generate_password_hash(USER_PASSWORD),
+         'Test', 'User', None, now, True) for user_id in (1, 2, 3)
+    ])
+    connection.executemany('INSERT INTO category VALUES (?, ?, ?)', [
+        (i, slug.title(), slug) for i, slug in enumerate(CATEGORIES, 1)
+    ])
+    connection.executemany('INSERT INTO product VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+        (product_id, f'Upgrade phone {product_id}', 10.0 * product_id, 'PLN', f'https://cdn.example.com/{product_id}.jpg',
+         CATEGORIES[product_id % len(CATEGORIES)], f'Description of product {product_id}',
+         str([f'https://cdn.example.com/{product_id}-{i}.jpg' for i in range(2)]), now - timedelta(days=product_id))
+        for product_id in range(1, args.products + 1)
+    ])
+    # Benzersiz indeks öncesi tekrar eden sepet satırları
+    connection.executemany('INSERT INTO cart (user_id, product_id, quantity, added_at) VALUES (?, ?, ?, ?)', [
+        (1, 1, 1, now), (1, 1, 2, now), (1, 2, 1, now)
+    ])
+    connection.executemany(
+        'INSERT INTO review (product_id, user_id, rating, comment, created_at, is_approved) VALUES (?, ?, ?, ?, ?, ?)', [
+            (product_id, user_id, (product_id + user_id) % 5 + 1, 'Review text', now, True)
+            for product_id in range(1, 11) for user_id in (1, 2, 3)
+        ])
+    day = now.strftime('%Y%m%d')
+    for order_id in range(1, args.orders + 1):
+        product_id = order_id % args.products + 1
+        connection.execute('INSERT INTO "order" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            order_id, f'OM{day}-{order_id:04d}', order_id % 3 + 1, 20.0 * product_id,
+            'paid' if order_id % 2 else 'pending', 'blik', 'completed' if order_id % 2 else 'pending',
+            None, 'Warsaw', 'Warsaw', now - timedelta(hours=order_id), now - timedelta(hours=order_id)))
+        connection.execute('INSERT INTO order_item (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)',
+                           (order_id, product_id, 2, 10.0 * product_id))
+    connection.execute('INSERT INTO shipping_tracking (order_id, tracking_number, carrier, status, created_at) '
+                       'VALUES (1, ?, ?, ?, ?)', ('TRK0000000001', 'DHL', 'label_created', now))
+    connection.commit()
+    connection.close()
+
+
+def load_app(database_url):
+    # app modülü DATABASE_URL'i import anında okur
+    os.environ['DATABASE_URL'] = database_url
+    import app as shop
+    shop.app.config['TESTING'] = True
+    shop.app.config['PAGE_CACHE_BACKEND'] = None
+    return shop
+
+
+def main():
+    args = parse_args()
+    database_path = args.database or os.path.join(tempfile.mkdtemp(prefix='omimas-upgrade-'), 'upgrade.db')
+    create_baseline_database(database_path, args)
+    shop = load_app('sqlite:///' + os.path.abspath(database_path))
+    app, db = shop.app, shop.db
+
+    report, failures = {}, []
+
+    def check(name, condition, detail):
+        report[name] = condition
+        if not condition:
+            failures.append(f'{name}: {detail}')
+
+    def scalar(sql):
+        with app.app_context():
+            value = db.session.execute(shop.text(sql)).scalar()
+            db.session.remove()
+            return value
+
+    shop.init_database()
+
+    # Eksik sütun kalmadı, ikinci çalıştırma hiçbir sütun eklemez
+    with app.app_context():
+        missing = [f'{table.name}.{column.name}' for table in db.metadata.sorted_tables for column in table.columns
+                   if column.name not in {row[1] for row in db.session.execute(
+                       shop.text(f'PRAGMA table_info("{table.name}")'))}]
+        added_again = shop.ensure_columns()
+        db.session.remove()
+    check('all model columns exist', not missing, missing)
+    check('ensure_columns is idempotent', not added_again, added_again)
+    shop.init_database()
+
+    # Veriler korundu
+    counts = {table: scalar(f'SELECT count(*) FROM "{table}"')
+              for table in ('user', 'product', 'order', 'order_item', 'review', 'shipping_tracking')}
+    report['counts'] = counts
+    check('data preserved', counts == {'user': 3, 'product': args.products, 'order': args.orders,
+                                       'order_item': args.orders, 'review': 30, 'shipping_tracking': 1}, counts)
+    check('duplicate cart rows merged', scalar('SELECT quantity FROM cart WHERE user_id = 1 AND product_id = 1') == 3
+          and scalar('SELECT count(*) FROM cart') == 2, scalar('SELECT count(*) FROM cart'))
+
+    # Geriye dönük doldurmalar
+    check('images migrated to JSON', scalar('SELECT count(*) FROM product WHERE NOT json_valid(images)') == 0,
+          'geçersiz JSON resim listesi var')
+    check('category_id resolved', scalar('SELECT count(*) FROM product WHERE category_id IS NULL') == 0,
+          'category_id boş ürün var')
+    check('rating_avg backfilled', scalar(
+        'SELECT count(*) FROM product p WHERE p.rating_avg != coalesce((SELECT round(avg(rating), 1) FROM review r '
+        'WHERE r.product_id = p.id), 0)') == 0, 'rating_avg ortalamayla uyuşmuyor')
+    check('search index built', scalar('SELECT count(*) FROM product_search') == args.products,
+          scalar('SELECT count(*) FROM product_search'))
+    check('order summaries backfilled', scalar('SELECT count(*) FROM "order" WHERE item_count IS NULL') == 0,
+          'özetsiz sipariş var')
+    check('order sequence seeded', scalar('SELECT max(last_value) FROM order_sequence') == args.orders,
+          scalar('SELECT max(last_value) FROM order_sequence'))
+    check('analytics rebuilt', scalar('SELECT count(*) FROM analytics_order_state') == args.orders,
+          scalar('SELECT count(*) FROM analytics_order_state'))
+    check('external_id unique index', scalar(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'index' AND name = 'uq_product_external_id'") == 1,
+          'uq_product_external_id yok')
+
+    # Sayfalar, eski hash ile giriş ve yeni sipariş (stok girildikten sonra)
+    anonymous = app.test_client()
+    pages = {path: anonymous.get(path).status_code for path in
+             ('/', '/product/1', f'/category/{CATEGORIES[0]}', '/search?q=phone')}
+    customer = app.test_client()
+    login = customer.post('/login', data={'username': 'user2', 'password': USER_PASSWORD})
+    pages.update({path: customer.get(path).status_code for path in ('/orders', '/account', '/cart')})
+    report['pages'] = pages
+    check('pages render', all(status == 200 for status in pages.values()) and login.status_code == 302,
+          dict(pages, login=login.status_code))
+
+    with app.app_context():
+        shop.return_stock({1: 5})
+        db.session.commit()
+        db.session.remove()
+    added = customer.post('/add_to_cart/1', data={'quantity': 1}).get_json()
+    order = customer.post('/create_order', data={'shipping_address': 'Warsaw', 'payment_method': 'blik'}).get_json()
+    report['new_order'] = order
+    check('new order after upgrade', added['success'] and order.get('success')
+          and order['order_number'].endswith(f'-{args.orders + 1:04d}'), (added, order))
+
+    report['passed'] = not failures
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failures:
+        print('HATA: ' + '; '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()